@@ -1,93 +1,135 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import asyncio
 import aiohttp
-from typing import Dict, List, Any
+import hashlib
+from typing import Dict, List, Any, Optional, Tuple
 import logging
-from gql import gql, Client
-from gql.transport.aiohttp import AIOHTTPTransport
 from nlp_processor import NLPProcessor
+from driver_pool import DriverPool
+from executors import run_io, run_model, run_parse
+from render_detector import RenderDetector
+from html_document import ParsedDocument, parse_document
+from storage_fetch import storage_fetcher
+from graphql_client import graphql_client
+import os
 
 class AdvancedScraper:
     def __init__(self):
         self.nlp_processor = NLPProcessor()
+        self.render_detector = RenderDetector()
+        self.storage_fetcher = storage_fetcher
+        self.graphql_client = graphql_client
         self.setup_selenium()
         
     def setup_selenium(self):
-        """Setup Selenium for JavaScript rendering"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        self.driver = webdriver.Chrome(options=chrome_options)
+        """Setup the Chrome driver pool for JavaScript rendering (drivers start on first use)"""
+        self.driver_pool = DriverPool(remote_url=os.getenv('SELENIUM_REMOTE_URL'))
         
-    async def _fetch_graphql_data(self, endpoint: str, query: str) -> Dict[str, Any]:
-        """Fetch data from GraphQL endpoints"""
+    async def _fetch_graphql_data(self, endpoint: str, query: str, field: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fetch data from GraphQL endpoints over the shared client (cached schema, session
+        and results). With field, the query takes $first / $skip and every page of that
+        list field is fetched.
+        """
         try:
-            transport = AIOHTTPTransport(url=endpoint)
-            async with Client(
-                transport=transport,
-                fetch_schema_from_transport=True,
-            ) as client:
-                result = await client.execute(gql(query))
-                return result
+            if field:
+                return await self.graphql_client.paginate(endpoint, query, field)
+            return await self.graphql_client.execute(endpoint, query)
         except Exception as e:
             logging.error(f"GraphQL fetch error: {e}")
             return {}
 
-    def _process_js_rendered_content(self, url: str) -> Dict[str, Any]:
-        """Process JavaScript-rendered content"""
+    def _render_page(self, url: str) -> str:
+        """Load a page in a pooled Chrome driver and return the rendered HTML"""
         try:
-            self.driver.get(url)
-            # Wait for dynamic content
-            self.driver.implicitly_wait(5)
-            
-            # Get rendered content
-            content = self.driver.page_source
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Extract text content
-            text_content = ' '.join([
-                p.get_text() 
-                for p in soup.find_all(['p', 'div', 'section', 'article'])
-            ])
-            
-            # Process with NLP
-            return self.nlp_processor.analyze_text(text_content)
-            
+            with self.driver_pool.driver() as driver:
+                driver.get(url)
+                # Wait for dynamic content
+                driver.implicitly_wait(5)
+                return driver.page_source
         except Exception as e:
             logging.error(f"Selenium processing error: {e}")
-            return {}
+            return ""
+
+    def _analyze_contents(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """NLP analysis of the page text and its storage documents in one batch"""
+        try:
+            return self.nlp_processor.analyze_many(texts)
+        except Exception as e:
+            logging.error(f"Content analysis error: {e}")
+            return [{} for _ in texts]
+
+    async def render(self, project_url: str, static_document: Optional[ParsedDocument],
+                     decision: Optional[Tuple[bool, str]] = None) -> Dict[str, Any]:
+        """
+        The document to analyze: the static one, or Chrome's rendering when the static HTML
+        falls short. A rendered document's content_hash is the hash of the rendered HTML.
+        
+        Args:
+            project_url: Page to render
+            static_document: The page fetched without a browser, or None
+            decision: (needs_js, reason) already taken by the render detector
+        """
+        needs_js, reason = decision or self.render_detector.needs_js(project_url, static_document)
+        if not needs_js:
+            return {'render_path': 'static', 'render_reason': reason, 'document': static_document}
+        html = await run_io(self._render_page, project_url)
+        document = await run_parse(parse_document, html, project_url) if html else None
+        if document is not None:
+            document.content_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        return {'render_path': 'browser', 'render_reason': reason, 'document': document}
 
-    async def scrape_project(self, project_url: str) -> Dict[str, Any]:
-        """Comprehensive project scraping"""
+    async def scrape_project(self, project_url: str, static_html: Optional[str] = None,
+                             static_document: Optional[ParsedDocument] = None,
+                             rendered: Optional[Dict[str, Any]] = None,
+                             decision: Optional[Tuple[bool, str]] = None,
+                             session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """
+        Comprehensive project scraping
+        
+        Args:
+            project_url: Page to analyze
+            static_html: HTML already fetched without a browser; Chrome is only used if it is insufficient
+            static_document: The same page already parsed, so it is not parsed again
+            rendered: The result of render() when the caller already has it
+            decision: (needs_js, reason) already taken by the render detector
+            session: The caller's aiohttp session, reused for IPFS/Arweave gateway requests
+        """
+        if static_document is None and static_html:
+            static_document = parse_document(static_html, project_url)
+        
+        # Scrape web content, rendering JavaScript only when the static HTML falls short
+        rendered = rendered or await self.render(project_url, static_document, decision)
+        document = rendered['document']
         results = {
             'web_content': {},
             'graphql_data': {},
             'decentralized_storage': {},
-            'nlp_analysis': {}
+            'nlp_analysis': {},
+            'render_path': rendered['render_path'],
+            'render_reason': rendered['render_reason'],
+            'content_hash': document.content_hash if document else None
         }
         
-        # Scrape web content with JavaScript rendering
-        web_content = self._process_js_rendered_content(project_url)
-        results['web_content'] = web_content
-        
-        # Check for IPFS/Arweave links
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        for a in soup.find_all('a', href=True):
-            if 'ipfs://' in a['href'] or 'ar://' in a['href']:
-                storage_content = self.nlp_processor.process_decentralized_storage(
-                    a['href']
-                )
-                if storage_content:
-                    results['decentralized_storage'][a['href']] = storage_content
+        # Fetch IPFS/Arweave links concurrently, then analyze them with the page in one batch
+        storage_links = document.storage_uris[:self.storage_fetcher.max_documents] if document else []
+        try:
+            storage_contents = await self.storage_fetcher.fetch_many(storage_links, session)
+        except Exception as e:
+            logging.error(f"Storage fetch error: {e}")
+            storage_contents = [None] * len(storage_links)
+        fetched = [(link, content) for link, content in zip(storage_links, storage_contents) if content]
+        texts = ([document.text_content] if document else []) + [content for _, content in fetched]
+        analyses = await run_model(self._analyze_contents, texts) if texts else []
+        if document:
+            results['web_content'] = analyses.pop(0)
+        for (link, _), analysis in zip(fetched, analyses):
+            if analysis:
+                results['decentralized_storage'][link] = analysis
         
         # Fetch GraphQL data if available
         if 'graphql' in project_url or 'subgraph' in project_url:
             query = """
-            {
-              tokens {
+            query Tokens($first: Int!, $skip: Int!) {
+              tokens(first: $first, skip: $skip) {
                 id
                 name
                 symbol
@@ -96,12 +138,14 @@ class AdvancedScraper:
               # Add other relevant queries
             }
             """
-            graphql_data = await self._fetch_graphql_data(project_url, query)
+            graphql_data = await self._fetch_graphql_data(project_url, query, field='tokens')
             results['graphql_data'] = graphql_data
         
         return results
 
     def cleanup(self):
         """Cleanup resources"""
-        if hasattr(self, 'driver'):
-            self.driver.quit()
+        if hasattr(self, 'driver_pool'):
+            self.driver_pool.close()
+        if hasattr(self, 'graphql_client'):
+            self.graphql_client.close()
@@ -1,13 +1,26 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from scraper import CyberScraper
+from job_queue import JobQueue
+from data_cleaner import ENGINES
+from model_registry import registry
 import logging
 from dotenv import load_dotenv
 import os
+import json
 
 load_dotenv()
 
 app = Flask(__name__)
 scraper = CyberScraper()
+job_queue = JobQueue(scraper.scrape_site)
+
+# PRELOAD_MODELS loads every model while the app is imported. Under gunicorn with
+# preload_app this happens once in the master, and forked workers share the weights.
+# Otherwise MODEL_WARMUP=background loads them on a thread while requests are served.
+if os.getenv('PRELOAD_MODELS', 'false').lower() == 'true':
+    registry.warm_up()
+elif os.getenv('MODEL_WARMUP', 'background') == 'background':
+    registry.warm_up(background=True)
 
 @app.route('/')
 def index():
@@ -17,6 +30,21 @@ def index():
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    models = registry.status()
+    if registry.ready():
+        return jsonify({"status": "ready", "models": models}), 200
+    # A model that failed to load stays failed; the process needs a restart, not more time
+    failed = registry.failed()
+    if failed:
+        return jsonify({"status": "failed", "failed": failed, "models": models}), 503
+    return jsonify({"status": "loading", "models": models}), 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify(scraper.metrics()), 200
+
 @app.route('/scrape', methods=['POST'])
 def scrape_url():
     try:
@@ -37,5 +65,71 @@ def scrape_url():
         logging.error(f"API error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/scrape/batch', methods=['POST'])
+def scrape_batch():
+    data = request.get_json()
+    if not data or not isinstance(data.get('urls'), list) or not data['urls']:
+        return jsonify({"error": "No URLs provided"}), 400
+        
+    structuring = data.get('structuring')
+    if structuring is not None and structuring not in ENGINES:
+        return jsonify({"error": f"structuring must be one of {list(ENGINES)}"}), 400
+    explain = data.get('explain')
+    if explain is not None and not isinstance(explain, bool):
+        return jsonify({"error": "explain must be true or false"}), 400
+        
+    def generate():
+        try:
+            for result in scraper.scrape_many(
+                data['urls'],
+                max_concurrency=data.get('max_concurrency'),
+                per_host_concurrency=data.get('per_host_concurrency'),
+                structuring=structuring,
+                explain=explain
+            ):
+                yield json.dumps(result, default=str) + '\n'
+        except Exception as e:
+            logging.error(f"Batch API error: {str(e)}")
+            yield json.dumps({"error": str(e)}) + '\n'
+            
+    # One NDJSON line per site, flushed as soon as that site finishes
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    try:
+        data = request.get_json()
+        if not data or 'url' not in data:
+            return jsonify({"error": "No URL provided"}), 400
+            
+        structuring = data.get('structuring')
+        if structuring is not None and structuring not in ENGINES:
+            return jsonify({"error": f"structuring must be one of {list(ENGINES)}"}), 400
+        explain = data.get('explain')
+        if explain is not None and not isinstance(explain, bool):
+            return jsonify({"error": "explain must be true or false"}), 400
+            
+        job_id = job_queue.submit(data['url'], use_tor=data.get('use_tor', True), structuring=structuring,
+                                  explain=explain)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+        
+    except Exception as e:
+        logging.error(f"API error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
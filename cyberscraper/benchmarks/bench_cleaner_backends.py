@@ -0,0 +1,115 @@
+"""
+Latency and agreement of the structuring engines.
+
+Structures the same pages with the Gemini path and the local (spaCy + finbert-esg)
+engine, with caching disabled. Reports per-page latency and how closely the local
+E/S/G lists match Gemini's. Sentences are matched by token overlap, since Gemini may
+rephrase them. Agreement is precision/recall/F1 of the local sentences per section,
+with Gemini as the reference.
+
+    python benchmarks/bench_cleaner_backends.py pages/*.txt
+    CLEANER_BACKEND=stub python benchmarks/bench_cleaner_backends.py   # offline, built-in sample
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('CLEANER_CACHE', 'false')
+
+from data_cleaner import DataCleaner, ESG_SECTIONS  # noqa: E402
+
+SAMPLE_PAGE = (
+    "Our protocol migrated to proof of stake, cutting energy use by over 99 percent. "
+    "We retire carbon credits every quarter to offset the emissions of our validators. "
+    "Token holders vote on every treasury proposal through on-chain governance. "
+    "An independent firm audits the smart contracts before each release. "
+    "The foundation funds developer education programs in emerging markets. "
+    "We publish a diversity and inclusion report for all contributors every year. "
+    "Trading volume reached a new high this month across major exchanges. "
+)
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _tokens(sentence: str) -> set:
+    return set(_TOKEN.findall(sentence.lower()))
+
+
+def _matches(sentence: str, reference: list, threshold: float) -> bool:
+    tokens = _tokens(sentence)
+    for other in reference:
+        other_tokens = _tokens(other)
+        union = tokens | other_tokens
+        if union and len(tokens & other_tokens) / len(union) >= threshold:
+            return True
+    return False
+
+
+def agreement(local: dict, reference: dict, threshold: float) -> dict:
+    scores = {}
+    for section in ESG_SECTIONS:
+        predicted, expected = local.get(section) or [], reference.get(section) or []
+        true_positives = sum(_matches(s, expected, threshold) for s in predicted)
+        found = sum(_matches(s, predicted, threshold) for s in expected)
+        precision = true_positives / len(predicted) if predicted else float(not expected)
+        recall = found / len(expected) if expected else float(not predicted)
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        scores[section] = (precision, recall, f1)
+    return scores
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='text files, one page each (default: built-in sample)')
+    parser.add_argument('--repeat', type=int, default=3, help='copies of the sample page when no files are given')
+    parser.add_argument('--match-threshold', type=float, default=0.6, help='token Jaccard for matching sentences')
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf-8') as f:
+                pages.append(f.read())
+    else:
+        pages = [SAMPLE_PAGE * args.repeat]
+
+    cleaner = DataCleaner(os.getenv('GEMINI_API_KEY'))
+    # Load the local models before timing
+    cleaner.structure_scraped_data(SAMPLE_PAGE, 'local')
+
+    latencies = {'gemini': [], 'local': []}
+    section_scores = {section: [] for section in ESG_SECTIONS}
+    for page in pages:
+        reference, gemini_s = timed(cleaner.structure_scraped_data, page, 'gemini')
+        local, local_s = timed(cleaner.structure_scraped_data, page, 'local')
+        latencies['local'].append(local_s)
+        if reference is None:
+            print("Gemini path returned nothing (no API key? try CLEANER_BACKEND=stub)")
+            continue
+        latencies['gemini'].append(gemini_s)
+        for section, scores in agreement(local or {}, reference, args.match_threshold).items():
+            section_scores[section].append(scores)
+
+    print(f"pages: {len(pages)}")
+    for engine, values in latencies.items():
+        if values:
+            print(f"{engine:<7} latency s: median={statistics.median(values):.3f} "
+                  f"max={max(values):.3f} total={sum(values):.3f}")
+    for section, scores in section_scores.items():
+        if scores:
+            precision, recall, f1 = (statistics.mean(column) for column in zip(*scores))
+            print(f"{section:<14} precision={precision:.2f} recall={recall:.2f} f1={f1:.2f}")
+
+
+if __name__ == '__main__':
+    main()
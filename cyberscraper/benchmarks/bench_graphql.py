@@ -0,0 +1,137 @@
+"""
+Wall time of fetching every page of a subgraph's token list, against a local stub endpoint.
+
+The stub serves a graphql-core schema with --tokens tokens (introspection included) from a
+local aiohttp server, adding a fixed latency to every request. Modes:
+  - per-call client: a new Client with fetch_schema_from_transport per page (the old
+    behaviour: a connection and an introspection round trip before every query)
+  - shared client: GraphQLClient.paginate, with pages fetched concurrently over one
+    session and one cached schema
+  - cached: the same pagination again, answered from the result cache
+
+    python benchmarks/bench_graphql.py --tokens 1000 --page-size 100 --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+from gql import Client, gql
+from gql.transport.aiohttp import AIOHTTPTransport
+from graphql import (GraphQLArgument, GraphQLField, GraphQLInt, GraphQLList, GraphQLNonNull, GraphQLObjectType,
+                     GraphQLSchema, GraphQLString, graphql)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graphql_client import GraphQLClient  # noqa: E402
+
+QUERY = """
+query Tokens($first: Int!, $skip: Int!) {
+  tokens(first: $first, skip: $skip) {
+    id
+    name
+    symbol
+    totalSupply
+  }
+}
+"""
+
+
+def build_schema(token_count: int) -> GraphQLSchema:
+    token = GraphQLObjectType('Token', {
+        'id': GraphQLField(GraphQLString),
+        'name': GraphQLField(GraphQLString),
+        'symbol': GraphQLField(GraphQLString),
+        'totalSupply': GraphQLField(GraphQLString),
+    })
+    tokens = [{'id': f'0x{i:040x}', 'name': f'Token {i}', 'symbol': f'T{i}', 'totalSupply': str(10 ** 18 * i)}
+              for i in range(token_count)]
+
+    def resolve_tokens(root, info, first=100, skip=0):
+        return tokens[skip:skip + first]
+
+    return GraphQLSchema(GraphQLObjectType('Query', {
+        'tokens': GraphQLField(
+            GraphQLList(token),
+            args={'first': GraphQLArgument(GraphQLNonNull(GraphQLInt)),
+                  'skip': GraphQLArgument(GraphQLNonNull(GraphQLInt))},
+            resolve=resolve_tokens
+        )
+    }))
+
+
+def build_endpoint(schema: GraphQLSchema, latency: float, counts: dict) -> web.Application:
+    async def handle(request):
+        body = await request.json()
+        kind = 'introspection' if '__schema' in body['query'] else 'query'
+        counts[kind] += 1
+        await asyncio.sleep(latency)
+        result = await graphql(schema, body['query'], variable_values=body.get('variables'))
+        payload = {'data': result.data}
+        if result.errors:
+            payload['errors'] = [{'message': error.message} for error in result.errors]
+        return web.json_response(payload)
+
+    app = web.Application()
+    app.router.add_post('/subgraph', handle)
+    return app
+
+
+async def per_call_client(endpoint: str, page_size: int) -> int:
+    items, skip = [], 0
+    while True:
+        async with Client(transport=AIOHTTPTransport(url=endpoint), fetch_schema_from_transport=True) as session:
+            page = (await session.execute(gql(QUERY), variable_values={'first': page_size, 'skip': skip}))['tokens']
+        items.extend(page)
+        skip += page_size
+        if len(page) < page_size:
+            return len(items)
+
+
+async def main_async(args):
+    counts = {'introspection': 0, 'query': 0}
+    runner = web.AppRunner(build_endpoint(build_schema(args.tokens), args.latency, counts))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+    endpoint = f'http://127.0.0.1:{args.port}/subgraph'
+    max_pages = args.tokens // args.page_size + 1
+    client = GraphQLClient(max_concurrency=args.concurrency)
+    rows = []
+    try:
+        for mode in ('per-call client', 'shared client', 'cached'):
+            before = dict(counts)
+            start = time.perf_counter()
+            if mode == 'per-call client':
+                fetched = await per_call_client(endpoint, args.page_size)
+            else:
+                result = await client.paginate(endpoint, QUERY, 'tokens', page_size=args.page_size,
+                                               max_pages=max_pages)
+                fetched = len(result['tokens'])
+            rows.append((mode, time.perf_counter() - start, fetched,
+                         counts['introspection'] - before['introspection'], counts['query'] - before['query']))
+    finally:
+        client.close()
+        await runner.cleanup()
+
+    print(f"{args.tokens} tokens, {args.page_size} per page, {args.latency * 1000:.0f} ms latency, "
+          f"concurrency {args.concurrency}")
+    print(f"{'mode':<16} {'wall_s':>7} {'tokens':>7} {'introspections':>15} {'queries':>8}")
+    for mode, seconds, fetched, introspections, queries in rows:
+        print(f"{mode:<16} {seconds:>7.2f} {fetched:>7} {introspections:>15} {queries:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=1000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds added to every request')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8768)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
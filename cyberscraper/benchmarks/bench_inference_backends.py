@@ -0,0 +1,106 @@
+"""
+Latency, memory and accuracy drift of the FinBERT inference backends.
+
+Each backend runs in a fresh interpreter and reports:
+  - load time
+  - peak RSS after loading and after inference
+  - per-batch latency over the same padded windows
+  - class-probability drift from the fp32 torch backend on those windows
+ONNX models are exported in a separate run first, so export time is not counted as load time.
+
+    python benchmarks/bench_inference_backends.py                       # finbert-esg, all backends
+    python benchmarks/bench_inference_backends.py --model-id ProsusAI/finbert --key finbert
+    python benchmarks/bench_inference_backends.py --backends torch onnx-int8 --batch-size 16
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from inference_backends import available_backends, softmax  # noqa: E402
+
+PROBE = r'''
+import json, random, resource, time
+import numpy as np
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from inference_backends import CALIBRATION_TEXTS, load_backend
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+baseline = rss_mb()
+start = time.perf_counter()
+backend = load_backend(BACKEND, KEY, MODEL_ID, tokenizer,
+                       lambda: AutoModelForSequenceClassification.from_pretrained(MODEL_ID).eval(),
+                       max_drift=float('inf'))
+result = {"load_s": time.perf_counter() - start, "baseline_rss_mb": baseline, "loaded_rss_mb": rss_mb()}
+if MEASURE:
+    rng = random.Random(0)
+    words = ' '.join(CALIBRATION_TEXTS).split()
+    windows = [' '.join(rng.choice(words) for _ in range(WORDS)) for _ in range(BATCHES * BATCH_SIZE)]
+    batches = [tokenizer(windows[i:i + BATCH_SIZE], padding=True, truncation=True, max_length=512, return_tensors='pt')
+               for i in range(0, len(windows), BATCH_SIZE)]
+    backend.logits(batches[0])
+    latencies, logits = [], []
+    for inputs in batches:
+        start = time.perf_counter()
+        logits.append(backend.logits(inputs))
+        latencies.append(time.perf_counter() - start)
+    result.update(latencies=latencies, logits=np.concatenate(logits).tolist(), peak_rss_mb=rss_mb())
+print("RESULT" + json.dumps(result))
+'''
+
+
+def run_probe(backend: str, args, measure: bool = True) -> dict:
+    settings = (f'BACKEND = {backend!r}\nKEY = {args.key!r}\nMODEL_ID = {args.model_id!r}\n'
+                f'MEASURE = {measure}\nBATCHES = {args.batches}\nBATCH_SIZE = {args.batch_size}\nWORDS = {args.words}\n')
+    output = subprocess.run(
+        [sys.executable, '-c', settings + PROBE],
+        cwd=APP_DIR, env=dict(os.environ), capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith('RESULT'))
+    return json.loads(line[len('RESULT'):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-id', default='yiyanghkust/finbert-esg')
+    parser.add_argument('--key', default='finbert_esg', help='directory name under NLP_ONNX_DIR')
+    parser.add_argument('--backends', nargs='+', default=available_backends())
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--words', type=int, default=300, help='words per window (~1.3 tokens each)')
+    args = parser.parse_args()
+
+    if any(backend.startswith('onnx') for backend in args.backends):
+        run_probe('onnx', args, measure=False)
+
+    results = {backend: run_probe(backend, args) for backend in args.backends}
+    reference = softmax(np.array(results['torch']['logits'])) if 'torch' in results else None
+
+    print(f"{args.model_id}: {args.batches} batches x {args.batch_size} windows of {args.words} words")
+    print(f"{'backend':<11} {'load_s':>7} {'model MB':>9} {'peak MB':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'max drift':>10} {'agree':>6}")
+    for backend, result in results.items():
+        latencies = sorted(result['latencies'])
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        drift, agreement = '-', '-'
+        if reference is not None:
+            probabilities = softmax(np.array(result['logits']))
+            drift = f"{np.abs(probabilities - reference).max():.4f}"
+            agreement = f"{(probabilities.argmax(axis=1) == reference.argmax(axis=1)).mean():.3f}"
+        print(f"{backend:<11} {result['load_s']:>7.2f} {result['loaded_rss_mb'] - result['baseline_rss_mb']:>9.0f} "
+              f"{result['peak_rss_mb']:>8.0f} {statistics.median(latencies) * 1000:>8.1f} {p95 * 1000:>8.1f} "
+              f"{drift:>10} {agreement:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Per-document time and peak memory of combined vs. separate FinBERT / finbert-esg analysis.
+
+Each mode runs in a fresh interpreter over the same corpus. Like the tabs of one site,
+the documents open with the same navigation boilerplate, and some are mirrors of others
+(the same storage document linked from several pages). Each mode is run twice:
+  - cold: first sight of the documents
+  - warm: the same documents again, which hits the token cache in combined mode
+Loaded RSS is the resident size after the models have loaded (a shared encoder keeps one
+copy of its weights); peak RSS is the high-water mark including inference.
+
+    python benchmarks/bench_nlp_combined.py
+    python benchmarks/bench_nlp_combined.py --docs 32 --words 2000 --boilerplate 300 --mirrors 0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, random, resource, time
+from nlp_processor import NLPProcessor
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+WORDS = ("revenue grew emissions fell the board approved a new audit committee token holders voted "
+         "renewable energy community programmes governance disclosure carbon offsets quarterly losses").split()
+rng = random.Random(0)
+nav = ' '.join(rng.choice(WORDS) for _ in range(BOILERPLATE))
+texts = []
+for _ in range(DOCS):
+    if texts and rng.random() < MIRRORS:
+        texts.append(rng.choice(texts))
+    else:
+        texts.append(nav + ' ' + ' '.join(rng.choice(WORDS) for _ in range(DOC_WORDS)))
+
+processor = NLPProcessor()
+processor.analysis_mode = MODE
+processor.analyze_many(["Warm-up sentence about renewable energy."])
+loaded = rss_mb()
+timings = []
+for _ in range(2):
+    start = time.perf_counter()
+    processor.analyze_many(texts)
+    timings.append(time.perf_counter() - start)
+windows, rows, _ = processor._unique_windows(texts, processor.finbert_tokenizer)
+print("RESULT" + json.dumps({
+    "cold_s": timings[0], "warm_s": timings[1], "loaded_rss_mb": loaded, "peak_rss_mb": peak_rss_mb(),
+    "windows": len(rows), "unique_windows": len(windows)
+}))
+'''
+
+
+def run_probe(mode: str, args) -> dict:
+    settings = (f'MODE = {mode!r}\nDOCS = {args.docs}\nDOC_WORDS = {args.words}\n'
+                f'BOILERPLATE = {args.boilerplate}\nMIRRORS = {args.mirrors}\n')
+    output = subprocess.run(
+        [sys.executable, '-c', settings + PROBE],
+        cwd=APP_DIR, env=dict(os.environ), capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith('RESULT'))
+    return json.loads(line[len('RESULT'):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=16)
+    parser.add_argument('--words', type=int, default=1500, help='page-specific words per document')
+    parser.add_argument('--boilerplate', type=int, default=600, help='words of navigation shared by every document')
+    parser.add_argument('--mirrors', type=float, default=0.25, help='share of documents that repeat an earlier one')
+    parser.add_argument('--modes', nargs='+', default=['separate', 'combined'])
+    args = parser.parse_args()
+
+    print(f"{args.docs} documents of {args.words} words after {args.boilerplate} words of shared navigation, "
+          f"{args.mirrors:.0%} mirrors")
+    print(f"{'mode':<10} {'cold ms/doc':>12} {'warm ms/doc':>12} {'loaded MB':>10} {'peak MB':>8} "
+          f"{'windows':>8} {'unique':>7}")
+    for mode in args.modes:
+        result = run_probe(mode, args)
+        print(f"{mode:<10} {result['cold_s'] * 1000 / args.docs:>12.1f} {result['warm_s'] * 1000 / args.docs:>12.1f} "
+              f"{result['loaded_rss_mb']:>10.0f} {result['peak_rss_mb']:>8.0f} "
+              f"{result['windows']:>8} {result['unique_windows']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+NLPProcessor throughput: documents per second, and per core, for one-at-a-time
+analyze_text calls vs. batched analyze_many, at several torch thread counts.
+
+    python benchmarks/bench_nlp_throughput.py --docs 64 --threads 1 2 4
+    python benchmarks/bench_nlp_throughput.py --corpus pages/   # *.txt files
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlp_processor import NLPProcessor  # noqa: E402
+
+SENTENCES = [
+    "The protocol moved to proof of stake and cut its energy use by more than 99 percent.",
+    "Token holders approved the treasury proposal with a 64 percent majority in March 2024.",
+    "An independent auditor reviewed the smart contracts before the mainnet launch.",
+    "The foundation funds developer education programmes in emerging markets.",
+    "Quarterly carbon offsets are retired on chain through a public registry.",
+    "Trading volume rose sharply after the listing on two major exchanges.",
+]
+
+
+def synthetic_corpus(count: int, sentences_per_doc: int) -> list:
+    rng = random.Random(0)
+    return [' '.join(rng.choice(SENTENCES) for _ in range(rng.randint(sentences_per_doc // 2, sentences_per_doc)))
+            for _ in range(count)]
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='directory of .txt documents')
+    parser.add_argument('--docs', type=int, default=32, help='synthetic documents when no corpus is given')
+    parser.add_argument('--sentences', type=int, default=60, help='maximum sentences per synthetic document')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    if args.corpus:
+        texts = []
+        for path in sorted(glob.glob(os.path.join(args.corpus, '*.txt'))):
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+    else:
+        texts = synthetic_corpus(args.docs, args.sentences)
+
+    processor = NLPProcessor()
+    # Load every model before timing
+    processor.analyze_text(texts[0])
+
+    print(f"{len(texts)} documents, {sum(len(text) for text in texts) / len(texts):.0f} chars on average")
+    print(f"{'threads':>7} {'mode':<14} {'docs/s':>8} {'docs/s/core':>12}")
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        modes = (
+            ('analyze_text', lambda: [processor.analyze_text(text) for text in texts]),
+            ('analyze_many', lambda: processor.analyze_many(texts)),
+        )
+        for mode, run in modes:
+            rate = len(texts) / timed(run)
+            print(f"{threads:>7} {mode:<14} {rate:>8.2f} {rate / threads:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
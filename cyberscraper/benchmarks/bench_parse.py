@@ -0,0 +1,106 @@
+"""
+HTML parse throughput: one ParsedDocument per page vs. the previous per-stage parses.
+
+"legacy" repeats what the pipeline did before, for each page:
+  - html.parser for the tab content
+  - a second parse for render detection
+  - a third for the NLP text
+  - a fourth for the storage links
+Every other row is a single parse_document() call with the given parser.
+
+    python benchmarks/bench_parse.py --corpus saved_pages/   # *.html files
+    python benchmarks/bench_parse.py --pages 200             # synthetic corpus
+"""
+import argparse
+import glob
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from html_document import available_parsers, parse_document  # noqa: E402
+
+WORDS = ("carbon neutral governance token holders vote proposal treasury community grants "
+         "renewable energy validators audit transparency report staking rewards protocol").split()
+
+
+def synthetic_page(rng: random.Random) -> str:
+    def sentence():
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+
+    nav = ''.join(f'<li><a href="/page{i}">Link {i}</a></li>' for i in range(30))
+    sections = []
+    for s in range(rng.randint(5, 15)):
+        paragraphs = ''.join(f'<div class="row"><div class="col"><p>{sentence()} <b>{sentence()}</b></p></div></div>'
+                             for _ in range(rng.randint(3, 8)))
+        sections.append(f'<section><h2>Section {s}</h2>{paragraphs}'
+                        f'<a href="ipfs://Qm{rng.getrandbits(64):x}">report</a></section>')
+    return (f'<!DOCTYPE html><html><head><title>Project</title><style>.row{{}}</style>'
+            f'<script>window.data = {{"x": 1}};</script></head><body><header><nav><ul>{nav}</ul></nav></header>'
+            f'<main>{"".join(sections)}</main><footer><p>Copyright. All rights reserved.</p></footer></body></html>')
+
+
+def legacy(html: str) -> None:
+    soup = BeautifulSoup(html, 'html.parser')
+    ' '.join(p.get_text() for p in soup.find_all(['p', 'div', 'section']))
+    [h.get_text() for h in soup.find_all(['h1', 'h2', 'h3'])]
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+    len(' '.join(soup.get_text(' ').split()))
+
+    soup = BeautifulSoup(html, 'html.parser')
+    ' '.join(p.get_text() for p in soup.find_all(['p', 'div', 'section', 'article']))
+
+    soup = BeautifulSoup(html, 'html.parser')
+    [a['href'] for a in soup.find_all('a', href=True) if 'ipfs://' in a['href'] or 'ar://' in a['href']]
+
+
+def measure(func, pages, runs):
+    per_page = []
+    total = 0.0
+    for _ in range(runs):
+        start = time.perf_counter()
+        for html in pages:
+            page_start = time.perf_counter()
+            func(html)
+            per_page.append(time.perf_counter() - page_start)
+        total += time.perf_counter() - start
+    return total / runs, statistics.median(per_page)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='directory of saved .html pages')
+    parser.add_argument('--pages', type=int, default=100, help='synthetic pages when no corpus is given')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.corpus, '*.html'))):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+    else:
+        rng = random.Random(0)
+        pages = [synthetic_page(rng) for _ in range(args.pages)]
+    megabytes = sum(len(html.encode('utf-8')) for html in pages) / 1e6
+    print(f"{len(pages)} pages, {megabytes:.1f} MB")
+
+    candidates = [('legacy (4x html.parser)', legacy)]
+    candidates += [(name, lambda html, name=name: parse_document(html, parser=name)) for name in available_parsers()]
+
+    print(f"{'parser':<24} {'pages/s':>9} {'MB/s':>7} {'median ms':>10}")
+    for name, func in candidates:
+        total, median = measure(func, pages, args.runs)
+        print(f"{name:<24} {len(pages) / total:>9.1f} {megabytes / total:>7.2f} {median * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
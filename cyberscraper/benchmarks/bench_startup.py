@@ -0,0 +1,74 @@
+"""
+Cold-start cost of the API process.
+
+Each measurement runs in a fresh interpreter:
+  - import: `import api` with lazy models (MODEL_WARMUP=none), i.e. time until the
+    app can serve /health
+  - warm-up: loading every registered model, with per-model load times, i.e. time
+    until /ready returns 200
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, resource, time
+start = time.perf_counter()
+import api
+imported = time.perf_counter() - start
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+result = {"import_s": imported, "import_rss_mb": import_rss / 1024}
+if WARM:
+    start = time.perf_counter()
+    api.registry.warm_up()
+    result["warmup_s"] = time.perf_counter() - start
+    result["warm_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result["models"] = {name: info["load_seconds"] for name, info in api.registry.status().items()}
+print("RESULT" + json.dumps(result))
+'''
+
+
+def run_probe(warm: bool) -> dict:
+    env = dict(os.environ, MODEL_WARMUP='none', PRELOAD_MODELS='false')
+    output = subprocess.run(
+        [sys.executable, '-c', f'WARM = {warm}\n' + PROBE],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(line for line in output.splitlines() if line.startswith('RESULT'))
+    return json.loads(line[len('RESULT'):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--skip-warmup', action='store_true', help='only measure the lazy import')
+    args = parser.parse_args()
+
+    runs = [run_probe(warm=not args.skip_warmup) for _ in range(args.runs)]
+
+    def summary(key):
+        values = [run[key] for run in runs]
+        return f"median={statistics.median(values):.2f} min={min(values):.2f} max={max(values):.2f}"
+
+    print(f"import (ready for /health)  s:  {summary('import_s')}")
+    print(f"import peak RSS            MB:  {summary('import_rss_mb')}")
+    if not args.skip_warmup:
+        print(f"warm-up (ready for /ready)  s:  {summary('warmup_s')}")
+        print(f"warm peak RSS              MB:  {summary('warm_rss_mb')}")
+        for name in runs[0]['models']:
+            loads = [run['models'][name] for run in runs if run['models'][name] is not None]
+            if loads:
+                print(f"  {name:<40} {statistics.median(loads):.2f}s")
+            else:
+                print(f"  {name:<40} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Wall time of fetching a page's IPFS / Arweave documents, against local stub gateways.
+
+Two stub IPFS gateways and one Arweave gateway are served from a local aiohttp server,
+each adding a fixed latency. The first IPFS gateway fails every other CID with a 503, so
+half the documents exercise the gateway fallback. One document is a PDF, which is
+rejected, and some links are mirrors (the same CID under another URL form). Modes:
+  - serial: one link at a time, no cache (the old behaviour)
+  - concurrent: StorageFetcher with a cold cache
+  - cached: the same links again, served from the content-addressed cache
+The local IPFS node is disabled, so only the gateways are measured.
+
+    python benchmarks/bench_storage_fetch.py --links 32 --latency 0.2
+    python benchmarks/bench_storage_fetch.py --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+os.environ['IPFS_NODE'] = 'false'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage_fetch import StorageFetcher  # noqa: E402
+from streaming_fetch import StreamingFetcher  # noqa: E402
+
+BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def cid(index: int) -> str:
+    return 'Qm' + ''.join(BASE58[(index * 7 + k) % len(BASE58)] for k in range(44))
+
+
+def arweave_id(index: int) -> str:
+    return ''.join(BASE58[(index * 5 + k) % len(BASE58)] for k in range(43))
+
+
+def build_gateway(latency: float) -> web.Application:
+    async def ipfs(request, flaky: bool):
+        await asyncio.sleep(latency)
+        name = request.match_info['cid']
+        if flaky and BASE58.index(name[2]) % 2:
+            raise web.HTTPServiceUnavailable()
+        if name == cid(0):
+            return web.Response(body=b'%PDF-1.7 binary', content_type='application/pdf')
+        return web.Response(text=f'Governance proposal {name}: token holders vote on treasury funding. ' * 50,
+                            content_type='text/plain')
+
+    async def primary(request):
+        return await ipfs(request, flaky=True)
+
+    async def fallback(request):
+        return await ipfs(request, flaky=False)
+
+    async def arweave(request):
+        await asyncio.sleep(latency)
+        return web.Response(text='Quarterly emissions report stored permanently on Arweave. ' * 50,
+                            content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/primary/ipfs/{cid}', primary)
+    app.router.add_get('/fallback/ipfs/{cid}', fallback)
+    app.router.add_get('/arweave/{id}', arweave)
+    return app
+
+
+def build_links(count: int) -> list:
+    links = []
+    for index in range(count):
+        if index % 8 == 7:
+            links.append(f'https://example.org/ipfs://{cid(index - 7)}?download=1')
+        elif index % 4 == 3:
+            links.append(f'ar://{arweave_id(index)}')
+        else:
+            links.append(f'ipfs://{cid(index)}')
+    return links
+
+
+def build_fetcher(port: int, concurrency: int, latency: float) -> StorageFetcher:
+    base = f'http://127.0.0.1:{port}'
+    return StorageFetcher(
+        fetcher=StreamingFetcher(),
+        max_concurrency=concurrency,
+        timeout=max(5.0, latency * 10),
+        ipfs_gateways=[f'{base}/primary/ipfs/', f'{base}/fallback/ipfs/'],
+        arweave_gateways=[f'{base}/arweave/']
+    )
+
+
+async def timed(fetcher: StorageFetcher, links: list, serial: bool = False):
+    start = time.perf_counter()
+    if serial:
+        contents = [(await fetcher.fetch_many([link]))[0] for link in links]
+    else:
+        contents = await fetcher.fetch_many(links)
+    return time.perf_counter() - start, sum(1 for content in contents if content)
+
+
+async def main_async(args):
+    runner = web.AppRunner(build_gateway(args.latency))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+    links = build_links(args.links)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            os.environ['STORAGE_CACHE_PATH'] = os.path.join(cache_dir, 'storage.sqlite')
+            os.environ['STORAGE_CACHE'] = 'false'
+            serial = await timed(build_fetcher(args.port, 1, args.latency), links, serial=True)
+            os.environ['STORAGE_CACHE'] = 'true'
+            fetcher = build_fetcher(args.port, args.concurrency, args.latency)
+            concurrent = await timed(fetcher, links)
+            cached = await timed(fetcher, links)
+            stats = fetcher.stats()
+    finally:
+        await runner.cleanup()
+
+    print(f"{len(links)} links, {args.latency * 1000:.0f} ms gateway latency, concurrency {args.concurrency}")
+    print(f"{'mode':<11} {'wall_s':>7} {'documents':>10}")
+    for mode, (seconds, documents) in (('serial', serial), ('concurrent', concurrent), ('cached', cached)):
+        print(f"{mode:<11} {seconds:>7.2f} {documents:>10}")
+    print(f"gateway fetches {stats.get('gateway', 0)}, gateway errors {stats.get('gateway_errors', 0)}, "
+          f"cache {stats['cache']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds added to every gateway response')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8767)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Wall time of CyberScraper._scrape_all_tabs as the number of tabs grows.
+
+Serves a synthetic site from a local aiohttp server and replaces Chrome, the NLP
+models, Gemini and the ESG scorer with stubs that block for a fixed time, so the
+numbers isolate how well the pipeline overlaps blocking stages across tabs. Every
+tab is forced through the browser path.
+
+    python benchmarks/bench_tab_scaling.py --tabs 1 2 4 8 16
+    python benchmarks/bench_tab_scaling.py --inline   # old behaviour: blocking calls on the loop
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import advanced_scraper  # noqa: E402
+import scraper  # noqa: E402
+import streaming_fetch  # noqa: E402
+from advanced_scraper import AdvancedScraper  # noqa: E402
+from scraper import CyberScraper  # noqa: E402
+from storage_fetch import StorageFetcher  # noqa: E402
+from streaming_fetch import StreamingFetcher  # noqa: E402
+from text_extraction import ExtractionStats  # noqa: E402
+
+RENDER_S = 0.5
+MODEL_S = 0.1
+LLM_S = 0.3
+SCORE_S = 0.1
+
+
+class StubDriver:
+    def __init__(self):
+        self.page_source = ''
+
+    def get(self, url):
+        time.sleep(RENDER_S)
+        self.page_source = f'<html><body><p>Rendered {url}</p></body></html>'
+
+    def implicitly_wait(self, seconds):
+        pass
+
+
+class StubDriverPool:
+    @contextmanager
+    def driver(self, timeout=None):
+        yield StubDriver()
+
+
+class StubNLPProcessor:
+    def analyze_many(self, texts):
+        time.sleep(MODEL_S)
+        return [{'summary': text[:50]} for text in texts]
+
+
+class StubRenderDetector:
+    def needs_js(self, url, html):
+        return True, 'bench'
+
+
+class StubContentAnalyzer:
+    def filter_contents(self, contents, categories):
+        time.sleep(MODEL_S)
+        return [
+            {'text_content': {'text': content['text_content'], 'category': 'sustainability', 'confidence': 0.9}}
+            for content in contents
+        ]
+
+    def score_document(self, sections, categories):
+        time.sleep(MODEL_S)
+        return {'document': {'category': 'sustainability'}, 'sections': {}}
+
+
+class StubDataCleaner:
+    engine = 'gemini'
+
+    def structure_scraped_data(self, raw_text, engine=None):
+        time.sleep(LLM_S)
+        return {'clean_text': 'text', 'environmental': [], 'social': [], 'governance': []}
+
+
+class StubESGScorer:
+    explain_by_default = False
+
+    def calculate_esg_scores(self, batch, explain=False):
+        time.sleep(SCORE_S)
+        return [{'esg_score': 50.0} for _ in batch]
+
+
+def build_scraper() -> CyberScraper:
+    advanced = AdvancedScraper.__new__(AdvancedScraper)
+    advanced.nlp_processor = StubNLPProcessor()
+    advanced.driver_pool = StubDriverPool()
+    advanced.render_detector = StubRenderDetector()
+    advanced.storage_fetcher = StorageFetcher()
+
+    cyber = CyberScraper.__new__(CyberScraper)
+    cyber.user_agent = type('UA', (), {'random': 'bench'})()
+    cyber.advanced_scraper = advanced
+    cyber.content_analyzer = StubContentAnalyzer()
+    cyber.data_cleaner = StubDataCleaner()
+    cyber.esg_scorer = StubESGScorer()
+    cyber.categories = ['sustainability']
+    cyber.extraction_stats = ExtractionStats()
+    cyber.fetcher = StreamingFetcher()
+    cyber.analysis_store = None
+    return cyber
+
+
+def build_site(tab_count: int) -> web.Application:
+    async def index(request):
+        links = ''.join(f'<a href="/sustainability-{i}">tab {i}</a>' for i in range(tab_count))
+        return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+
+    async def tab(request):
+        body = '<p>Our sustainability programme reduces emissions.</p>' * 20
+        return web.Response(text=f'<html><title>Tab</title><body>{body}</body></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', index)
+    app.router.add_get('/{name}', tab)
+    return app
+
+
+async def run_inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def measure(cyber: CyberScraper, tab_count: int, port: int) -> float:
+    runner = web.AppRunner(build_site(tab_count))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', port)
+    await site.start()
+    try:
+        start = time.perf_counter()
+        results = await cyber._scrape_all_tabs(f'http://127.0.0.1:{port}/')
+        elapsed = time.perf_counter() - start
+        assert len(results) == tab_count, f"expected {tab_count} tabs, got {len(results)}"
+        return elapsed
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tabs', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--inline', action='store_true', help='run blocking stages on the event loop')
+    args = parser.parse_args()
+
+    if args.inline:
+        for module in (scraper, advanced_scraper, streaming_fetch):
+            for name in ('run_io', 'run_model', 'run_parse'):
+                if hasattr(module, name):
+                    setattr(module, name, run_inline)
+
+    cyber = build_scraper()
+    per_tab = RENDER_S + MODEL_S * 2 + LLM_S + SCORE_S
+    print(f"mode={'inline' if args.inline else 'executors'} "
+          f"io_workers={os.getenv('IO_WORKERS', 16)} model_workers={os.getenv('MODEL_WORKERS', 2)}")
+    print(f"{'tabs':>6} {'wall_s':>8} {'serial_s':>9} {'speedup':>8}")
+    for tab_count in args.tabs:
+        elapsed = asyncio.run(measure(cyber, tab_count, args.port))
+        serial = per_tab * tab_count
+        print(f"{tab_count:>6} {elapsed:>8.2f} {serial:>9.2f} {serial / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
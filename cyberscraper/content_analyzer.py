@@ -3,37 +3,100 @@ import numpy as np
 import logging
 from pathlib import Path
 import json
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, List
 import time
-from functools import lru_cache
+import os
+from embedding_cache import EmbeddingCache
+from text_chunker import iter_windows, WindowAggregator
+from model_registry import registry
 
 class ContentAnalyzer:
     def __init__(self, model_name="paraphrase-MiniLM-L3-v2"):
-        """Initialize with a very lightweight model (~50MB)"""
-        try:
-            self.model = SentenceTransformer(model_name)
-            # Reduce model memory usage
-            self.model.max_seq_length = 128
-            print("Initialized lightweight content analyzer...")
-        except Exception as e:
-            logging.error(f"Model initialization failed: {str(e)}")
-            self.model = None
+        """Initialize with a very lightweight model (~50MB), loaded on first use"""
+        self.model_name = model_name
+        self.batch_size = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+        self._category_matrices = {}
+        self.embedding_cache = EmbeddingCache()
+        # Long documents are scored as overlapping token windows instead of being truncated
+        self.window_overlap = int(os.getenv('RELEVANCE_WINDOW_OVERLAP', 32))
+        self.aggregation = os.getenv('RELEVANCE_AGGREGATION', 'max')
+        self._model_key = f'sentence_transformer:{model_name}'
+        registry.register(self._model_key, self._load_model)
+
+    def _load_model(self) -> SentenceTransformer:
+        model = SentenceTransformer(self.model_name)
+        # Reduce model memory usage
+        model.max_seq_length = 128
+        print("Initialized lightweight content analyzer...")
+        return model
+
+    @property
+    def model(self) -> Optional[SentenceTransformer]:
+        """Shared SentenceTransformer; None if it failed to load"""
+        return registry.get(self._model_key)
 
     def _clean_text(self, text: str) -> str:
         """Clean and prepare text for analysis."""
-        text = ' '.join(text.split())
-        return text[:512]  # Limit text length for memory
+        return ' '.join(text.split())
+
+    def _score_windows(self, texts: List[str], categories: list) -> List[WindowAggregator]:
+        """
+        Split every text into token windows and score them all against the categories.
+        
+        Windows from all texts are encoded in shared batches; only one batch of
+        embeddings is held at a time and per-text scores are folded into aggregators.
+        """
+        category_matrix = self._get_category_matrix(categories)
+        aggregators = [WindowAggregator(categories) for _ in texts]
+        # Leave room for the [CLS]/[SEP] tokens the model adds
+        window_tokens = max(16, self.model.max_seq_length - 2)
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        chunk_size = self.batch_size * 4
+        
+        def flush(batch):
+            similarities = self._get_embeddings([window for _, window in batch]) @ category_matrix.T
+            for (index, _), scores in zip(batch, similarities):
+                aggregators[index].update(scores)
+        
+        batch = []
+        for index, text in enumerate(texts):
+            for window in iter_windows(text, tokenizer, window_tokens, self.window_overlap):
+                batch.append((index, window))
+                if len(batch) >= chunk_size:
+                    flush(batch)
+                    batch = []
+        if batch:
+            flush(batch)
+        return aggregators
 
-    @lru_cache(maxsize=1000)
-    def _get_embedding(self, text: str) -> np.ndarray:
-        """Get text embedding with caching"""
-        return self.model.encode(text, convert_to_tensor=True).cpu().numpy()
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """L2-normalized embeddings, encoding only texts missing from the shared cache in one batch"""
+        keys = [
+            EmbeddingCache.make_key(self.model_name, self.model.max_seq_length, text)
+            for text in texts
+        ]
+        vectors = self.embedding_cache.get_many(keys)
+        
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            encoded = self.model.encode(
+                list(missing.values()),
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            new_vectors = dict(zip(missing.keys(), np.asarray(encoded, dtype=np.float32)))
+            self.embedding_cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+        
+        return np.stack([vectors[key] for key in keys])
 
-    def _compute_similarity(self, text_emb: np.ndarray, category: str) -> float:
-        """Compute cosine similarity between text and category"""
-        category_emb = self._get_embedding(category)
-        return float(np.dot(text_emb, category_emb) / 
-                    (np.linalg.norm(text_emb) * np.linalg.norm(category_emb)))
+    def _get_category_matrix(self, categories: list) -> np.ndarray:
+        """Normalized (n_categories, dim) matrix, computed once per category list"""
+        key = tuple(categories)
+        if key not in self._category_matrices:
+            self._category_matrices[key] = self._get_embeddings(list(key))
+        return self._category_matrices[key]
 
     def _extract_main_content(self, content: Any) -> str:
         """Extract main content from different data types."""
@@ -52,45 +115,100 @@ class ContentAnalyzer:
             logging.error(f"Content extraction failed: {str(e)}")
             return ""
 
-    def is_relevant_content(self, text: str, categories: list) -> Tuple[bool, Optional[str], float]:
-        if not self.model:
-            return False, None, 0.0, ""
+    def filter_many(self, texts: List[str], categories: list) -> List[Tuple[bool, Optional[str], float, str]]:
+        """
+        Classify many texts against the categories with batched encoding and matrix multiplies.
+        Each text is scored over its full length and aggregated with RELEVANCE_AGGREGATION.
+        
+        Returns:
+            One (is_relevant, category, confidence, summary) tuple per input text
+        """
+        empty = (False, None, 0.0, "")
+        if not self.model or not texts:
+            return [empty] * len(texts)
         
         try:
-            text = self._clean_text(text)
-            text_emb = self._get_embedding(text)
+            cleaned = [self._clean_text(text) for text in texts]
+            non_empty = [i for i, text in enumerate(cleaned) if text]
+            results = [empty] * len(texts)
+            if not non_empty:
+                return results
             
-            # Find best matching category
-            similarities = [(cat, self._compute_similarity(text_emb, cat)) 
-                          for cat in categories]
-            best_category, confidence = max(similarities, key=lambda x: x[1])
+            aggregators = self._score_windows([cleaned[i] for i in non_empty], categories)
             
-            is_relevant = confidence > 0.3  # Lower threshold for lightweight model
-            
-            return (
-                is_relevant,
-                best_category if is_relevant else None,
-                confidence,
-                text[:200] + "..." if len(text) > 200 else text  # Simple summary
-            )
+            for aggregator, i in zip(aggregators, non_empty):
+                scores = aggregator.vector(self.aggregation)
+                best_index = int(scores.argmax())
+                confidence = float(scores[best_index])
+                is_relevant = confidence > 0.3  # Lower threshold for lightweight model
+                text = cleaned[i]
+                results[i] = (
+                    is_relevant,
+                    categories[best_index] if is_relevant else None,
+                    confidence,
+                    text[:200] + "..." if len(text) > 200 else text  # Simple summary
+                )
+            return results
             
         except Exception as e:
             logging.error(f"Classification failed: {str(e)}")
-            return False, None, 0.0, ""
+            return [empty] * len(texts)
 
-    def filter_content(self, content_dict: Dict[str, Any], categories: list) -> Dict[str, Any]:
-        filtered_content = {}
+    def score_document(self, sections: Dict[str, str], categories: list) -> Dict[str, Any]:
+        """
+        Chunked relevance scores for a whole document and each of its sections
+        
+        Args:
+            sections: Section name to text, e.g. {'title': ..., 'text_content': ...}
+            
+        Returns:
+            {'document': {...}, 'sections': {name: {...}}} where each entry holds
+            max / mean / attention category scores, the best category and the window count
+        """
+        if not self.model:
+            return {'document': {}, 'sections': {}}
+        
+        try:
+            names = [name for name, text in sections.items() if text and self._clean_text(str(text))]
+            aggregators = self._score_windows([self._clean_text(str(sections[name])) for name in names], categories)
+            
+            document = WindowAggregator(categories)
+            for aggregator in aggregators:
+                document.merge(aggregator)
+            
+            def describe(aggregator):
+                result = aggregator.result()
+                scores = aggregator.vector(self.aggregation)
+                result['category'] = categories[int(scores.argmax())] if aggregator.count else None
+                return result
+            
+            return {
+                'document': describe(document),
+                'sections': {name: describe(aggregator) for name, aggregator in zip(names, aggregators)}
+            }
+        except Exception as e:
+            logging.error(f"Document scoring failed: {str(e)}")
+            return {'document': {}, 'sections': {}}
+
+    def is_relevant_content(self, text: str, categories: list) -> Tuple[bool, Optional[str], float]:
+        return self.filter_many([text], categories)[0]
+
+    def filter_contents(self, content_dicts: List[Dict[str, Any]], categories: list) -> List[Dict[str, Any]]:
+        """Filter several content dicts (e.g. all tabs of a site) in a single classification batch"""
+        filtered = [{} for _ in content_dicts]
         
         try:
-            for key, content in content_dict.items():
-                main_text = self._extract_main_content(content)
-                if not main_text:  # Skip empty content
-                    continue
-                    
-                is_relevant, category, confidence, summary = self.is_relevant_content(main_text, categories)
-                
+            entries = []
+            for index, content_dict in enumerate(content_dicts):
+                for key, content in content_dict.items():
+                    main_text = self._extract_main_content(content)
+                    if main_text:  # Skip empty content
+                        entries.append((index, key, main_text))
+            
+            classifications = self.filter_many([text for _, _, text in entries], categories)
+            for (index, key, main_text), (is_relevant, category, confidence, summary) in zip(entries, classifications):
                 if is_relevant and confidence > 0.3:  # Lowered threshold for better recall
-                    filtered_content[key] = {
+                    filtered[index][key] = {
                         'text': main_text,
                         'category': category,
                         'confidence': confidence,
@@ -99,4 +217,7 @@ class ContentAnalyzer:
         except Exception as e:
             logging.error(f"Content filtering failed: {str(e)}")
             
-        return filtered_content
\ No newline at end of file
+        return filtered
+
+    def filter_content(self, content_dict: Dict[str, Any], categories: list) -> Dict[str, Any]:
+        return self.filter_contents([content_dict], categories)[0]
@@ -1,17 +1,102 @@
 import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from local_structurer import LocalESGStructurer
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from text_chunker import iter_blocks
+
+# Bump whenever _create_prompt changes, so cached responses to the old prompt are not reused
+PROMPT_VERSION = '1'
+
+ENGINES = ('gemini', 'local')
+
+ESG_SECTIONS = ('environmental', 'social', 'governance')
+
+STUB_KEYWORDS = {
+    'environmental': ('carbon', 'climate', 'emission', 'energy', 'renewable', 'environment', 'sustainab'),
+    'social': ('community', 'social', 'employee', 'diversity', 'inclusion', 'education', 'health'),
+    'governance': ('governance', 'dao', 'vote', 'voting', 'proposal', 'transparen', 'audit')
+}
+
+
+class GeminiBackend:
+    """Gemini text generation with a per-request timeout"""
+
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-pro-latest", timeout: float = None):
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout or float(os.getenv('CLEANER_TIMEOUT', 60))
+
+    def generate(self, prompt: str) -> str:
+        response = self.model.generate_content(prompt, request_options={'timeout': self.timeout})
+        return response.text
+
+
+class StubBackend:
+    """Offline stand-in for Gemini: sorts sentences into ESG sections by keyword"""
+
+    model_name = 'stub'
+
+    def generate(self, prompt: str) -> str:
+        raw_text = prompt.split("**Now process this text:**", 1)[-1].strip()
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', raw_text) if s.strip()]
+        result = {"clean_text": ' '.join(raw_text.split())}
+        for section, keywords in STUB_KEYWORDS.items():
+            result[section] = [s for s in sentences if any(k in s.lower() for k in keywords)]
+        return "```json\n" + json.dumps(result) + "\n```"
+
 
 class DataCleaner:
-    def __init__(self, api_key: str):
-        """Initialize the DataCleaner with Gemini API key."""
-        try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel("gemini-1.5-pro-latest")
-        except Exception as e:
-            logging.error(f"Failed to initialize Gemini AI: {e}")
-            self.model = None
+    def __init__(self, api_key: str, backend=None, cache: Optional[ResponseCache] = None):
+        """
+        Initialize the DataCleaner with Gemini API key.
+
+        Args:
+            api_key: Gemini API key
+            backend: Object with generate(prompt) -> str; chosen by CLEANER_BACKEND env
+                ('gemini' or 'stub') when omitted
+            cache: Response cache; CLEANER_CACHE=false disables caching
+        """
+        self.engine = os.getenv('CLEANER_ENGINE', 'gemini')
+        self._local_structurer = None
+        self.max_input_chars = int(os.getenv('CLEANER_MAX_INPUT_CHARS', 200000))
+        self.chunk_tokens = int(os.getenv('CLEANER_CHUNK_TOKENS', 4000))
+        self.chars_per_token = int(os.getenv('CLEANER_CHARS_PER_TOKEN', 4))
+        self.prompt_overhead_tokens = len(self._create_prompt('')) // self.chars_per_token
+        self.max_retries = int(os.getenv('CLEANER_MAX_RETRIES', 3))
+        self.backoff_base = float(os.getenv('CLEANER_BACKOFF_BASE', 1.0))
+        self.backoff_max = float(os.getenv('CLEANER_BACKOFF_MAX', 30.0))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=float(os.getenv('CLEANER_RPM', 60)),
+            tokens_per_minute=float(os.getenv('CLEANER_TPM', 0)) or None
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CLEANER_CONCURRENCY', 4)),
+            thread_name_prefix='cleaner-chunk'
+        )
+        self.model = backend
+        if self.model is None:
+            try:
+                if os.getenv('CLEANER_BACKEND', 'gemini') == 'stub':
+                    self.model = StubBackend()
+                else:
+                    self.model = GeminiBackend(api_key)
+            except Exception as e:
+                logging.error(f"Failed to initialize Gemini AI: {e}")
+                self.model = None
+
+        self.cache = cache
+        if self.cache is None and os.getenv('CLEANER_CACHE', 'true').lower() == 'true':
+            self.cache = ResponseCache()
+        self.cache_namespace = f"{getattr(self.model, 'model_name', 'unknown')}:{PROMPT_VERSION}"
 
     def _create_prompt(self, raw_text: str) -> str:
         """Create the cleaning prompt for the AI model."""
@@ -35,20 +120,108 @@ You are an AI assistant specializing in structuring messy web scraped text into
 {raw_text}
 """
 
-    def structure_scraped_data(self, raw_text: str) -> Optional[Dict[str, Any]]:
-        """Clean and structure the raw scraped text."""
-        if not self.model or not raw_text:
-            return None
+    def _generate_with_retries(self, prompt: str, tokens: int) -> Dict[str, Any]:
+        """Call the backend under the rate limiter, retrying with exponential backoff and full jitter"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            try:
+                cleaned_json_str = self.model.generate(prompt).strip()
 
-        try:
-            response = self.model.generate_content(self._create_prompt(raw_text))
-            cleaned_json_str = response.text.strip()
+                if cleaned_json_str.startswith("```json"):
+                    cleaned_json_str = cleaned_json_str[7:-3]  
 
-            if cleaned_json_str.startswith("```json"):
-                cleaned_json_str = cleaned_json_str[7:-3]  
+                return json.loads(cleaned_json_str)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logging.warning(f"Structuring attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
 
-            return json.loads(cleaned_json_str)
+    def _structure_chunk(self, chunk: str) -> Optional[Dict[str, Any]]:
+        if self.cache is not None:
+            cached = self.cache.get(self.cache_namespace, chunk)
+            if cached is not None:
+                return cached
 
+        try:
+            cleaned_data = self._generate_with_retries(self._create_prompt(chunk), self._estimate_tokens(chunk))
         except Exception as e:
             logging.error(f"Data Cleaning Failed: {e}")
             return None
+
+        if self.cache is not None:
+            self.cache.put(self.cache_namespace, chunk, cleaned_data)
+        return cleaned_data
+
+    def _estimate_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + self.prompt_overhead_tokens
+
+    @staticmethod
+    def _merge_chunks(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Concatenate per-chunk results, dropping sentences repeated across chunks"""
+        merged = {"clean_text": ' '.join(r.get("clean_text", "") for r in results if r.get("clean_text"))}
+        for section in ESG_SECTIONS:
+            seen = set()
+            merged[section] = []
+            for result in results:
+                for sentence in result.get(section) or []:
+                    key = ' '.join(str(sentence).lower().split()).rstrip('.!? ')
+                    if key and key not in seen:
+                        seen.add(key)
+                        merged[section].append(sentence)
+        return merged
+
+    @property
+    def local_structurer(self) -> LocalESGStructurer:
+        if self._local_structurer is None:
+            self._local_structurer = LocalESGStructurer()
+        return self._local_structurer
+
+    def _structure_locally(self, raw_text: str) -> Optional[Dict[str, Any]]:
+        namespace = self.local_structurer.model_name
+        if self.cache is not None:
+            cached = self.cache.get(namespace, raw_text)
+            if cached is not None:
+                return cached
+
+        try:
+            cleaned_data = self.local_structurer.structure(raw_text)
+        except Exception as e:
+            logging.error(f"Local Data Cleaning Failed: {e}")
+            return None
+
+        if self.cache is not None:
+            self.cache.put(namespace, raw_text, cleaned_data)
+        return cleaned_data
+
+    def structure_scraped_data(self, raw_text: str, engine: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Clean and structure the raw scraped text.
+
+        Args:
+            raw_text: Page text
+            engine: 'gemini' (remote LLM) or 'local' (spaCy + finbert-esg on CPU);
+                defaults to CLEANER_ENGINE env
+        """
+        engine = engine or self.engine
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown structuring engine: {engine}")
+        if not raw_text:
+            return None
+
+        raw_text = ' '.join(raw_text.split())[:self.max_input_chars]
+        if engine == 'local':
+            return self._structure_locally(raw_text)
+        if not self.model:
+            return None
+
+        chunks = list(iter_blocks(raw_text, self.chunk_tokens * self.chars_per_token, sentences=True))
+        if len(chunks) == 1:
+            return self._structure_chunk(chunks[0])
+
+        # Chunks are independent prompts; the rate limiter keeps them within provider quotas
+        results = [r for r in self.executor.map(self._structure_chunk, chunks) if r]
+        if not results:
+            return None
+        return self._merge_chunks(results)
@@ -10,8 +10,14 @@ chmod 777 /app/sentence_transformers_cache
 # Download spaCy model
 python -m spacy download en_core_web_sm
 
+# Publish the ESG model whenever the published one is missing or no longer matches the code,
+# so workers load it instead of retraining
+python /app/esg_model_store.py publish --if-stale
+
 # Start Tor service
 service tor start
 
-# Start the application
-exec python /app/api.py
+# Start the application under gunicorn: with PRELOAD_MODELS=true the models load once in the
+# master and the forked workers share them copy-on-write
+cd /app
+exec gunicorn -c gunicorn.conf.py api:app
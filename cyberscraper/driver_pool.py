@@ -0,0 +1,170 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+
+
+class DriverPoolTimeout(TimeoutError):
+    """Raised when no driver becomes available within the checkout timeout"""
+
+
+def default_chrome_options() -> Options:
+    """Headless Chrome options shared by all pooled drivers"""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    return chrome_options
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+
+
+class DriverPool:
+    """Bounded pool of reusable Chrome drivers, local or on a Selenium Grid"""
+
+    def __init__(self, size: Optional[int] = None, max_pages: Optional[int] = None,
+                 checkout_timeout: Optional[float] = None, remote_url: Optional[str] = None,
+                 options_factory: Callable[[], Options] = default_chrome_options):
+        """
+        Args:
+            size: Maximum number of live drivers (DRIVER_POOL_SIZE env, default 2)
+            max_pages: Recycle a driver after this many page loads (DRIVER_MAX_PAGES env, default 50)
+            checkout_timeout: Seconds to wait for a free driver (DRIVER_CHECKOUT_TIMEOUT env, default 30)
+            remote_url: Selenium Grid URL, e.g. http://chrome:4444; local Chrome when empty
+            options_factory: Builds the ChromeOptions for each new driver
+        """
+        self.size = size or int(os.getenv('DRIVER_POOL_SIZE', 2))
+        self.max_pages = max_pages or int(os.getenv('DRIVER_MAX_PAGES', 50))
+        self.checkout_timeout = checkout_timeout or float(os.getenv('DRIVER_CHECKOUT_TIMEOUT', 30))
+        self.remote_url = remote_url
+        self.options_factory = options_factory
+
+        self._idle = []
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {'created': 0, 'recycled': 0, 'discarded': 0, 'checkouts': 0, 'timeouts': 0}
+        atexit.register(self.close)
+
+    def _create_driver(self):
+        options = self.options_factory()
+        if self.remote_url:
+            return webdriver.Remote(command_executor=self.remote_url, options=options)
+        return webdriver.Chrome(options=options)
+
+    def _is_healthy(self, pooled: _PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def _quit(self, pooled: _PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logging.error(f"Driver quit failed: {e}")
+
+    def _release_slot(self, stat: str) -> None:
+        with self._cond:
+            self._total -= 1
+            self._stats[stat] += 1
+            self._cond.notify()
+
+    def checkout(self, timeout: Optional[float] = None) -> _PooledDriver:
+        """Take a healthy driver from the pool, starting one if below capacity"""
+        deadline = time.monotonic() + (self.checkout_timeout if timeout is None else timeout)
+
+        while True:
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._total < self.size:
+                        self._total += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise DriverPoolTimeout(f"No Chrome driver available after {timeout or self.checkout_timeout}s")
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    pooled = _PooledDriver(self._create_driver())
+                except Exception:
+                    self._release_slot('discarded')
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif not self._is_healthy(pooled):
+                logging.warning("Discarding unhealthy Chrome driver")
+                self._quit(pooled)
+                self._release_slot('discarded')
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+            return pooled
+
+    def checkin(self, pooled: _PooledDriver, broken: bool = False) -> None:
+        """Return a driver, recycling it when broken or past its page budget"""
+        pooled.pages += 1
+        if broken or self._closed or pooled.pages >= self.max_pages:
+            self._quit(pooled)
+            self._release_slot('discarded' if broken else 'recycled')
+            return
+
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """Check out a driver for the duration of the block; it is recycled if the block crashes it"""
+        pooled = self.checkout(timeout)
+        broken = False
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            # Page-level errors (timeouts, stale elements) leave the browser usable
+            broken = not self._is_healthy(pooled)
+            raise
+        finally:
+            self.checkin(pooled, broken=broken)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'size': self.size,
+                'live': self._total,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+                **self._stats
+            }
+
+    def close(self) -> None:
+        """Quit all idle drivers; drivers in use are quit on checkin"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
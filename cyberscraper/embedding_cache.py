@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+from sqlite_store import SQLiteStore, cache_path
+
+
+class EmbeddingCache(SQLiteStore):
+    """
+    Persistent, size-bounded embedding cache shared by all worker processes.
+
+    Vectors are stored as float16 blobs in a SQLite file in WAL mode, so any number of
+    gunicorn workers can read concurrently while one writes. Entries are keyed by a hash
+    of (model name, max_seq_length, normalized text) and evicted least-recently-used once
+    the stored vectors exceed max_bytes.
+    """
+
+    table = 'embeddings'
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        """
+        Args:
+            path: SQLite file (EMBEDDING_CACHE_PATH env, default $CACHE_DIR/embeddings.sqlite)
+            max_bytes: Vector storage budget (EMBEDDING_CACHE_MAX_MB env, default 256 MB)
+        """
+        super().__init__(path or cache_path('EMBEDDING_CACHE_PATH', 'embeddings.sqlite'))
+        self.max_bytes = max_bytes or int(float(os.getenv('EMBEDDING_CACHE_MAX_MB', 256)) * 1024 * 1024)
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)')
+
+    @staticmethod
+    def make_key(model_name: str, max_seq_length: int, text: str) -> str:
+        normalized = ' '.join(text.split())
+        return hashlib.sha256(f"{model_name}\x00{max_seq_length}\x00{normalized}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return cached float32 vectors for whichever keys are present"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        if not keys:
+            return found
+
+        try:
+            conn = self._connection()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for key, blob in conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+            if found:
+                now = time.time()
+                with conn:
+                    conn.executemany(
+                        'UPDATE embeddings SET last_access = ? WHERE key = ?',
+                        [(now, key) for key in found]
+                    )
+        except sqlite3.Error as e:
+            logging.error(f"Embedding cache read failed: {e}")
+
+        with self._lock:
+            self._hits += len(found)
+            self._misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Store vectors as float16, evicting old entries when over budget"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float16).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_access) VALUES (?, ?, ?, ?)',
+                    rows
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Embedding cache write failed: {e}")
+            return
+        self._wrote(len(rows))
+
+    def evict(self) -> int:
+        """Drop least-recently-used vectors until storage is back under 90% of the budget"""
+        try:
+            conn = self._connection()
+            total = conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM embeddings').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            keys = []
+            for key, nbytes in conn.execute('SELECT key, nbytes FROM embeddings ORDER BY last_access'):
+                if total <= target:
+                    break
+                keys.append((key,))
+                total -= nbytes
+                removed += 1
+            with conn:
+                conn.executemany('DELETE FROM embeddings WHERE key = ?', keys)
+        except sqlite3.Error as e:
+            logging.error(f"Embedding cache eviction failed: {e}")
+            return 0
+
+        with self._lock:
+            self._evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions}
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        try:
+            entries, size = self._connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings'
+            ).fetchone()
+            stats.update({'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes})
+        except sqlite3.Error as e:
+            logging.error(f"Embedding cache stats failed: {e}")
+        return stats
@@ -0,0 +1,230 @@
+"""
+Versioned on-disk artifacts for the XGBoost ESG model.
+
+    python esg_model_store.py publish [--output models/esg]   # retrain and publish
+    python esg_model_store.py publish --if-stale              # only if missing or out of date
+    python esg_model_store.py info    [--model-dir models/esg]  # show the published version
+
+A published model directory contains:
+    manifest.json         version hash, training config, feature names, file checksums,
+                          and the release directory it describes
+    <release>/            one directory per publish, never modified once written:
+        esg_model.ubj         XGBoost model (UBJSON)
+        training_sample.npy   training matrix, memory-mapped to seed the LIME explainer
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import xgboost as xgb
+
+FEATURE_NAMES = [
+    'energy_efficiency',
+    'carbon_offset_ratio',
+    'renewable_energy_usage',
+    'waste_management_score',
+    'social_impact_score',
+    'employee_welfare_index',
+    'community_engagement_rate',
+    'governance_score',
+    'dao_participation',
+    'transparency_score'
+]
+
+TRAINING_CONFIG = {
+    'objective': 'reg:squarederror',
+    'n_estimators': 100,
+    'max_depth': 4,
+    'learning_rate': 0.1,
+    'seed': 42,
+    'rows': 1000,
+    'weights': [0.15, 0.15, 0.12, 0.12, 0.10, 0.10, 0.08, 0.08, 0.05, 0.05]  # Sum = 1.0
+}
+
+MODEL_FILE = 'esg_model.ubj'
+TRAINING_SAMPLE_FILE = 'training_sample.npy'
+MANIFEST_FILE = 'manifest.json'
+
+# <version hash>-<microseconds>; only directories like this are pruned after a publish
+_RELEASE_PATTERN = re.compile(r'^[0-9a-f]{16}-\d+$')
+
+
+def default_model_dir() -> str:
+    return os.getenv('ESG_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'esg'))
+
+
+def model_version(feature_names: List[str] = FEATURE_NAMES, config: Dict[str, Any] = TRAINING_CONFIG) -> str:
+    """Hash of everything that determines the trained model"""
+    payload = json.dumps({
+        'features': feature_names,
+        'config': config,
+        'xgboost': xgb.__version__.split('.')[0]
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def train_model(feature_names: List[str] = FEATURE_NAMES,
+                config: Dict[str, Any] = TRAINING_CONFIG) -> Tuple[xgb.XGBRegressor, np.ndarray]:
+    """Fit the regressor on synthetic data with realistic ESG patterns"""
+    model = xgb.XGBRegressor(
+        objective=config['objective'],
+        n_estimators=config['n_estimators'],
+        max_depth=config['max_depth'],
+        learning_rate=config['learning_rate']
+    )
+
+    # Generate synthetic training data with realistic ESG patterns
+    np.random.seed(config['seed'])
+    X_train = np.random.rand(config['rows'], len(feature_names))
+
+    # Add realistic correlations
+    X_train[:, 0] = X_train[:, 4] * 0.8 + X_train[:, 0] * 0.2  # L2 adoption affects energy efficiency
+    X_train[:, 1] = X_train[:, 2] * 0.6 + X_train[:, 1] * 0.4  # Governance affects carbon offsets
+
+    # Generate target values with weighted importance - ensure weights match feature count
+    y_train = np.dot(X_train, config['weights']) * 100
+
+    model.fit(X_train, y_train)
+    return model, X_train
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def publish(output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Retrain the model and publish its artifacts to output_dir. The files go to a new
+    release directory, then manifest.json is atomically replaced to point at it, so a
+    reader always finds a complete release.
+    """
+    output_dir = output_dir or default_model_dir()
+    version = model_version()
+    release = f"{version}-{time.time_ns() // 1000}"
+    target_dir = os.path.join(output_dir, release)
+    staging_dir = f"{target_dir}.tmp"
+    os.makedirs(staging_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    model, X_train = train_model()
+    model.save_model(os.path.join(staging_dir, MODEL_FILE))
+    np.save(os.path.join(staging_dir, TRAINING_SAMPLE_FILE), X_train.astype(np.float32))
+
+    manifest = {
+        'version': version,
+        'release': release,
+        'feature_names': FEATURE_NAMES,
+        'config': TRAINING_CONFIG,
+        'xgboost_version': xgb.__version__,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'train_seconds': round(time.perf_counter() - start, 3),
+        'files': {
+            name: _sha256(os.path.join(staging_dir, name))
+            for name in (MODEL_FILE, TRAINING_SAMPLE_FILE)
+        }
+    }
+    os.replace(staging_dir, target_dir)
+    previous = read_manifest(output_dir)
+    manifest_tmp = os.path.join(output_dir, f"{MANIFEST_FILE}.tmp-{os.getpid()}")
+    with open(manifest_tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_tmp, os.path.join(output_dir, MANIFEST_FILE))
+
+    # Keep the previous release for readers that loaded its manifest just before the swap
+    keep = {release, (previous or {}).get('release')}
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if _RELEASE_PATTERN.match(name) and name not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+def release_dir(manifest: Dict[str, Any], model_dir: Optional[str] = None) -> str:
+    """Directory holding a manifest's files (artifacts published before releases sit next to it)"""
+    model_dir = model_dir or default_model_dir()
+    return os.path.join(model_dir, manifest['release']) if manifest.get('release') else model_dir
+
+
+def read_manifest(model_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    path = os.path.join(model_dir or default_model_dir(), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load(model_dir: Optional[str] = None,
+         feature_names: List[str] = FEATURE_NAMES) -> Optional[Tuple[xgb.XGBRegressor, np.ndarray, Dict[str, Any]]]:
+    """
+    Load published artifacts, or None if they are missing, from another model version, or
+    do not match the checksums in the manifest.
+
+    XGBoost reads the model file directly into its native booster, with no copy held in a
+    Python buffer. The training sample stays a read-only mmap shared between processes.
+    """
+    model_dir = model_dir or default_model_dir()
+    try:
+        manifest = read_manifest(model_dir)
+        if manifest is None:
+            return None
+        if manifest['feature_names'] != feature_names or manifest['version'] != model_version(feature_names):
+            logging.warning(f"ESG model in {model_dir} is version {manifest['version']}, "
+                            f"expected {model_version(feature_names)}; ignoring it")
+            return None
+
+        files_dir = release_dir(manifest, model_dir)
+        for name, checksum in manifest['files'].items():
+            if _sha256(os.path.join(files_dir, name)) != checksum:
+                logging.error(f"ESG model file {name} in {model_dir} does not match its manifest checksum; "
+                              f"ignoring the published model")
+                return None
+
+        model = xgb.XGBRegressor()
+        model.load_model(os.path.join(files_dir, MODEL_FILE))
+        training_sample = np.load(os.path.join(files_dir, TRAINING_SAMPLE_FILE), mmap_mode='r')
+        return model, training_sample, manifest
+    except Exception as e:
+        logging.error(f"Loading ESG model from {model_dir} failed: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    publish_parser = subparsers.add_parser('publish', help='retrain and publish the model')
+    publish_parser.add_argument('--output', default=None, help='model directory (default: $ESG_MODEL_DIR)')
+    publish_parser.add_argument('--if-stale', action='store_true',
+                                help='only publish when the published model is missing, stale or corrupt')
+    info_parser = subparsers.add_parser('info', help='show the published model')
+    info_parser.add_argument('--model-dir', default=None, help='model directory (default: $ESG_MODEL_DIR)')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        if args.if_stale and load(args.output) is not None:
+            print(f"ESG model {model_version()} in {args.output or default_model_dir()} is current")
+            return
+        manifest = publish(args.output)
+        print(f"Published ESG model {manifest['version']} to {args.output or default_model_dir()}")
+    else:
+        manifest = read_manifest(args.model_dir)
+        if manifest is None:
+            print("No published ESG model")
+        else:
+            current = 'current' if manifest['version'] == model_version() else f"stale, expected {model_version()}"
+            print(json.dumps(manifest, indent=2))
+            print(f"Version {manifest['version']} ({current})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+# Blocking work is split by what it waits on:
+#  - io: Selenium page loads, Gemini and other HTTP calls. Threads mostly sleep on sockets,
+#    so this pool can be wide.
+#  - model: spaCy / transformer / sentence-embedding inference. The models are far too large
+#    to copy into a process pool, and torch releases the GIL inside its kernels, so a few
+#    dedicated threads sharing the loaded weights give real parallelism without extra memory.
+#  - classifier: the second classifier of a paired FinBERT / finbert-esg forward pass, so a
+#    model worker never waits on its own (possibly full) pool.
+#  - parse: building a ParsedDocument from a whole body (cache replays, rendered HTML, the
+#    end of a stream), kept apart so page fetches never queue behind model inference.
+
+_executors = {}
+_lock = threading.Lock()
+
+_SIZES = {
+    'io': lambda: int(os.getenv('IO_WORKERS', 16)),
+    'model': lambda: int(os.getenv('MODEL_WORKERS', 2)),
+    'classifier': lambda: int(os.getenv('MODEL_WORKERS', 2)),
+    'parse': lambda: int(os.getenv('PARSE_WORKERS', 2)),
+}
+
+
+def get_executor(kind: str) -> ThreadPoolExecutor:
+    """Return the shared executor for 'io', 'model', 'classifier' or 'parse' work, creating it on first use"""
+    with _lock:
+        if kind not in _executors:
+            _executors[kind] = ThreadPoolExecutor(
+                max_workers=_SIZES[kind](),
+                thread_name_prefix=f'{kind}-worker'
+            )
+        return _executors[kind]
+
+
+async def run_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking I/O-bound call (browser, HTTP) without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor('io'), partial(func, *args, **kwargs))
+
+
+async def run_model(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a CPU-bound model inference call on the dedicated model threads"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor('model'), partial(func, *args, **kwargs))
+
+
+async def run_parse(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a CPU-bound HTML parse on the parse threads"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor('parse'), partial(func, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,290 @@
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from gql import Client, gql
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import TransportClosed
+
+
+@lru_cache(maxsize=256)
+def _document(query: str):
+    """Parsed query, so a repeated query string is parsed once"""
+    return gql(query)
+
+
+def result_key(endpoint: str, query: str, variables: Optional[Dict[str, Any]]) -> str:
+    """Cache key for one query: whitespace-insensitive query text, variables in canonical order"""
+    return hashlib.sha256(
+        json.dumps([endpoint, ' '.join(query.split()), variables or {}], sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+
+
+class _Endpoint:
+    """A connected gql session for one endpoint and when its schema was introspected"""
+
+    def __init__(self, client: Client, session):
+        self.client = client
+        self.session = session
+        self.schema_fetched_at = None
+
+
+class GraphQLClient:
+    """
+    GraphQL queries over persistent per-endpoint sessions.
+
+    All queries run on one background event loop per process. Each endpoint's gql
+    session (and its aiohttp connection pool) therefore outlives the short-lived loop of
+    a single scrape. An endpoint's schema is introspected once per GRAPHQL_SCHEMA_TTL
+    instead of before every query. When introspection is disabled, queries go out
+    unvalidated. Results are cached by (endpoint, query, variables) for GRAPHQL_RESULT_TTL,
+    and identical queries already in flight are coalesced. execute_many and paginate run
+    several queries at once, at most GRAPHQL_MAX_CONCURRENCY at a time.
+    """
+
+    def __init__(self, schema_ttl: float = None, result_ttl: float = None, max_concurrency: int = None,
+                 timeout: int = None, max_results: int = None, max_sessions: int = None):
+        """
+        Args:
+            schema_ttl: Seconds before an endpoint's schema is introspected again
+                (GRAPHQL_SCHEMA_TTL env, default 3600)
+            result_ttl: Seconds a query result is reused; 0 disables the result cache
+                (GRAPHQL_RESULT_TTL env, default 300)
+            max_concurrency: Queries in flight at once (GRAPHQL_MAX_CONCURRENCY env, default 4)
+            timeout: Seconds per request (GRAPHQL_TIMEOUT env, default 30)
+            max_results: Results kept in memory (GRAPHQL_RESULT_CACHE_SIZE env, default 1024)
+            max_sessions: Endpoints kept connected; the least recently used is closed
+                beyond this (GRAPHQL_MAX_SESSIONS env, default 16)
+        """
+        self.schema_ttl = schema_ttl if schema_ttl is not None else float(os.getenv('GRAPHQL_SCHEMA_TTL', 3600))
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv('GRAPHQL_RESULT_TTL', 300))
+        self.max_concurrency = max_concurrency or int(os.getenv('GRAPHQL_MAX_CONCURRENCY', 4))
+        self.timeout = timeout or int(os.getenv('GRAPHQL_TIMEOUT', 30))
+        self.max_results = max_results or int(os.getenv('GRAPHQL_RESULT_CACHE_SIZE', 1024))
+        self.max_sessions = max_sessions or int(os.getenv('GRAPHQL_MAX_SESSIONS', 16))
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        self._loop = None
+        self._pid = None
+        # Only touched from the background loop
+        self._endpoints: 'OrderedDict[str, _Endpoint]' = OrderedDict()
+        self._results: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._semaphore = None
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[stat] += amount
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        # Threads don't survive fork, so each worker process starts its own loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                self._endpoints = OrderedDict()
+                self._in_flight = {}
+                self._semaphore = None
+                self._connect_locks = {}
+                threading.Thread(target=self._loop.run_forever, name='graphql-loop', daemon=True).start()
+            return self._loop
+
+    async def _on_loop(self, coroutine):
+        """Run a coroutine on the background loop and await it from the caller's loop"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self._background_loop()))
+
+    async def _endpoint(self, endpoint: str) -> _Endpoint:
+        # One connect / introspection per endpoint even when its first queries arrive together;
+        # a slow endpoint does not hold up connecting to the others
+        lock = self._connect_locks.get(endpoint)
+        if lock is None:
+            lock = self._connect_locks[endpoint] = asyncio.Lock()
+        async with lock:
+            return await self._connect(endpoint)
+
+    async def _connect(self, endpoint: str) -> _Endpoint:
+        connected = self._endpoints.get(endpoint)
+        if connected is None:
+            client = Client(transport=AIOHTTPTransport(url=endpoint, timeout=self.timeout),
+                            fetch_schema_from_transport=False, execute_timeout=self.timeout)
+            connected = _Endpoint(client, await client.connect_async(reconnecting=False))
+            self._endpoints[endpoint] = connected
+            self._count('sessions_opened')
+            while len(self._endpoints) > self.max_sessions:
+                evicted_endpoint, evicted = self._endpoints.popitem(last=False)
+                lock = self._connect_locks.get(evicted_endpoint)
+                if lock is not None and not lock.locked():
+                    del self._connect_locks[evicted_endpoint]
+                await self._close(evicted)
+        self._endpoints.move_to_end(endpoint)
+
+        now = time.monotonic()
+        if connected.schema_fetched_at is None or now - connected.schema_fetched_at >= self.schema_ttl:
+            connected.schema_fetched_at = now
+            try:
+                await connected.session.fetch_schema()
+                self._count('schema_fetches')
+            except Exception as e:
+                # Introspection is often disabled in production; skip validation until the TTL passes
+                connected.client.schema = None
+                self._count('schema_errors')
+                logging.info(f"GraphQL introspection unavailable for {endpoint}: {e}")
+        return connected
+
+    async def _close(self, connected: _Endpoint) -> None:
+        try:
+            await connected.client.close_async()
+        except Exception as e:
+            logging.error(f"Closing GraphQL session failed: {e}")
+
+    async def _drop(self, endpoint: str) -> None:
+        connected = self._endpoints.pop(endpoint, None)
+        if connected is not None:
+            await self._close(connected)
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[0]:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return entry[1]
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        if self.result_ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.result_ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    async def _query(self, endpoint: str, query: str, variables: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            connected = await self._endpoint(endpoint)
+            try:
+                result = await connected.session.execute(_document(query), variable_values=variables)
+            except (TransportClosed, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                # A dead connection: reconnect on the next query
+                await self._drop(endpoint)
+                raise
+        self._count('queries')
+        return result
+
+    async def _execute(self, endpoint: str, query: str, variables: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        key = result_key(endpoint, query, variables)
+        cached = self._cached(key)
+        if cached is not None:
+            self._count('result_hits')
+            return cached
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self._count('coalesced')
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = pending
+        try:
+            result = await self._query(endpoint, query, variables)
+            self._remember(key, result)
+            pending.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            self._count('errors')
+            pending.set_exception(e)
+            # Mark the exception retrieved when no other caller was waiting on it
+            pending.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def execute(self, endpoint: str, query: str, variables: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Result of one query; raises on transport or GraphQL errors"""
+        return copy.deepcopy(await self._on_loop(self._execute(endpoint, query, variables)))
+
+    async def _execute_many(self, endpoint: str, requests: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+                            ) -> List[Any]:
+        return await asyncio.gather(*[self._execute(endpoint, query, variables) for query, variables in requests],
+                                    return_exceptions=True)
+
+    async def execute_many(self, endpoint: str, requests: Sequence[Tuple[str, Optional[Dict[str, Any]]]],
+                           ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Run (query, variables) pairs concurrently, at most GRAPHQL_MAX_CONCURRENCY at a
+        time. Results are aligned with requests, with None (logged) where a query failed.
+        """
+        results = await self._on_loop(self._execute_many(endpoint, requests))
+        aligned = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logging.error(f"GraphQL query error: {result}")
+                aligned.append(None)
+            else:
+                aligned.append(copy.deepcopy(result))
+        return aligned
+
+    async def paginate(self, endpoint: str, query: str, field: str, variables: Dict[str, Any] = None,
+                       page_size: int = None, max_pages: int = None) -> Dict[str, Any]:
+        """
+        Every page of a list field, for queries taking $first / $skip (The Graph style).
+        Pages are requested a batch of GRAPHQL_MAX_CONCURRENCY at a time. Paging stops at
+        the first short page, or after max_pages (GRAPHQL_MAX_PAGES env, default 10).
+
+        Returns:
+            {field: all items in order}
+        """
+        page_size = page_size or int(os.getenv('GRAPHQL_PAGE_SIZE', 100))
+        max_pages = max_pages or int(os.getenv('GRAPHQL_MAX_PAGES', 10))
+        items = []
+        for first_page in range(0, max_pages, self.max_concurrency):
+            pages = range(first_page, min(first_page + self.max_concurrency, max_pages))
+            requests = [(query, {**(variables or {}), 'first': page_size, 'skip': page * page_size}) for page in pages]
+            results = await self._on_loop(self._execute_many(endpoint, requests))
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+                page_items = result.get(field) or []
+                items.extend(page_items)
+                if len(page_items) < page_size:
+                    return {field: copy.deepcopy(items)}
+        return {field: copy.deepcopy(items)}
+
+    async def _close_all(self) -> None:
+        while self._endpoints:
+            _, connected = self._endpoints.popitem()
+            await self._close(connected)
+
+    def close(self) -> None:
+        """Close every session and stop the background loop"""
+        with self._lock:
+            loop, self._loop = (self._loop, None) if self._pid == os.getpid() else (None, None)
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_all(), loop).result(timeout=self.timeout)
+        loop.call_soon_threadsafe(loop.stop)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(sessions=len(self._endpoints), cached_results=len(self._results))
+        return stats
+
+
+# Shared so every scrape reuses the same sessions, schemas and results
+graphql_client = GraphQLClient()
@@ -0,0 +1,17 @@
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 300))
+
+# Import the app, and with PRELOAD_MODELS=true every model, in the master before forking,
+# so workers share the weights copy-on-write instead of loading their own copies.
+preload_app = os.getenv('PRELOAD_MODELS', 'false').lower() == 'true'
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach: collections in the workers
+    # would otherwise touch (and so copy) every page holding a preloaded object
+    gc.freeze()
@@ -0,0 +1,342 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+try:
+    import lxml.html as lxml_html
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_html = lxml_etree = None
+
+# Elements that start a new block of text; everything else is inline
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'body', 'dd', 'details', 'dialog', 'div', 'dl',
+    'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5',
+    'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'summary', 'table',
+    'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul', 'br'
+}
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'head', 'title', 'button', 'select'}
+
+STORAGE_SCHEMES = ('ipfs://', 'ar://')
+
+MAIN_CONTENT_SELECTORS = ('article', 'main', '[role="main"]')
+
+# Block boundary markers in the text event stream
+_BLOCK = object()
+
+
+@dataclass
+class ParsedDocument:
+    """Everything the pipeline stages need from one HTML page, extracted in a single parse"""
+    url: str
+    html: str
+    parser: str
+    title: str = ''
+    headings: List[str] = field(default_factory=list)
+    main_content: str = ''
+    paragraphs: List[str] = field(default_factory=list)
+    blocks: List[str] = field(default_factory=list)
+    links: List[str] = field(default_factory=list)
+    noscript_text: str = ''
+    text_length: int = 0
+    # sha256 of the fetched body, set by StreamingFetcher
+    content_hash: str = ''
+
+    @property
+    def text_content(self) -> str:
+        return ' '.join(self.blocks)
+
+    @property
+    def storage_uris(self) -> List[str]:
+        """IPFS and Arweave links, deduplicated in document order"""
+        return [href for href in self.links if any(scheme in href for scheme in STORAGE_SCHEMES)]
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def _collect_blocks(events: Iterator[object]) -> Tuple[List[str], int]:
+    """Turn a stream of text pieces and block boundaries into deduplicated blocks"""
+    blocks, seen, buffer = [], set(), []
+    visible_chars = 0
+
+    def flush():
+        nonlocal visible_chars
+        text = _normalize(''.join(buffer))
+        buffer.clear()
+        if text:
+            visible_chars += len(text) + 1
+            if text not in seen:
+                seen.add(text)
+                blocks.append(text)
+
+    for event in events:
+        if event is _BLOCK:
+            flush()
+        else:
+            buffer.append(event)
+    flush()
+    return blocks, max(visible_chars - 1, 0)
+
+
+def _bs4_events(root: Tag) -> Iterator[object]:
+    stack = [(iter(root.children), False)]
+    while stack:
+        children, is_block = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if is_block:
+                yield _BLOCK
+        elif isinstance(child, NavigableString):
+            if type(child) is NavigableString:  # skips comments, CDATA, doctype
+                yield str(child)
+        elif isinstance(child, Tag) and child.name not in SKIP_TAGS:
+            block = child.name in BLOCK_TAGS
+            if block:
+                yield _BLOCK
+            stack.append((iter(child.children), block))
+
+
+def _lxml_events(root) -> Iterator[object]:
+    if root.text:
+        yield root.text
+    stack = [(iter(root), None, False)]
+    while stack:
+        children, element, is_block = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if is_block:
+                yield _BLOCK
+            if element is not None and element.tail:
+                yield element.tail
+            continue
+        if not isinstance(child.tag, str) or child.tag in SKIP_TAGS:
+            # Comments, processing instructions and skipped elements only contribute their tail
+            if child.tail:
+                yield child.tail
+            continue
+        block = child.tag in BLOCK_TAGS
+        if block:
+            yield _BLOCK
+        if child.text:
+            yield child.text
+        stack.append((iter(child), child, block))
+
+
+def _selectolax_events(root) -> Iterator[object]:
+    stack = [(root.iter(include_text=True), False)]
+    while stack:
+        children, is_block = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if is_block:
+                yield _BLOCK
+        elif child.tag == '-text':
+            yield child.text(deep=False)
+        elif child.tag not in SKIP_TAGS and not child.tag.startswith('_') and not child.tag.startswith('!'):
+            block = child.tag in BLOCK_TAGS
+            if block:
+                yield _BLOCK
+            stack.append((child.iter(include_text=True), block))
+
+
+def _parse_selectolax(html: str, url: str) -> ParsedDocument:
+    tree = SelectolaxParser(html)
+
+    def text(node, separator: str = '') -> str:
+        return _normalize(node.text(separator=separator))
+
+    main = next((node for node in map(tree.css_first, MAIN_CONTENT_SELECTORS) if node is not None), None)
+    root = tree.body or tree.root
+    blocks, text_length = _collect_blocks(_selectolax_events(root)) if root is not None else ([], 0)
+    title = tree.css_first('title')
+    return ParsedDocument(
+        url=url, html=html, parser='selectolax',
+        title=text(title) if title is not None else '',
+        headings=[t for t in map(text, tree.css('h1, h2, h3')) if t],
+        main_content=text(main, ' ') if main is not None else '',
+        paragraphs=[t for t in map(text, tree.css('p')) if t],
+        blocks=blocks,
+        links=list(dict.fromkeys(node.attributes.get('href') for node in tree.css('a[href]')
+                                 if node.attributes.get('href'))),
+        noscript_text=' '.join(text(node) for node in tree.css('noscript')),
+        text_length=text_length
+    )
+
+
+def _parse_lxml(html: str, url: str) -> ParsedDocument:
+    if not html.strip():
+        return ParsedDocument(url=url, html=html, parser='lxml')
+    return _document_from_lxml(lxml_html.document_fromstring(html), html, url)
+
+
+def _document_from_lxml(tree, html: str, url: str) -> ParsedDocument:
+    def text(element, separator: str = '') -> str:
+        return _normalize(separator.join(element.itertext()))
+
+    def first(xpath: str):
+        found = tree.xpath(xpath)
+        return found[0] if found else None
+
+    main = next((e for e in map(first, ('//article', '//main', '//*[@role="main"]')) if e is not None), None)
+    body = first('//body')
+    blocks, text_length = _collect_blocks(_lxml_events(body if body is not None else tree))
+    title = first('//title')
+    return ParsedDocument(
+        url=url, html=html, parser='lxml',
+        title=text(title) if title is not None else '',
+        headings=[t for t in map(text, tree.xpath('//h1|//h2|//h3')) if t],
+        main_content=text(main, ' ') if main is not None else '',
+        paragraphs=[t for t in map(text, tree.xpath('//p')) if t],
+        blocks=blocks,
+        links=list(dict.fromkeys(href for href in tree.xpath('//a/@href') if href)),
+        noscript_text=' '.join(text(e) for e in tree.xpath('//noscript')),
+        text_length=text_length
+    )
+
+
+def _parse_bs4(html: str, url: str) -> ParsedDocument:
+    soup = BeautifulSoup(html, 'html.parser')
+
+    def text(tag, separator: str = '') -> str:
+        return _normalize(tag.get_text(separator))
+
+    main = next((tag for tag in map(soup.select_one, MAIN_CONTENT_SELECTORS) if tag is not None), None)
+    blocks, text_length = _collect_blocks(_bs4_events(soup.body or soup))
+    return ParsedDocument(
+        url=url, html=html, parser='html.parser',
+        title=text(soup.title) if soup.title else '',
+        headings=[t for t in map(text, soup.find_all(['h1', 'h2', 'h3'])) if t],
+        main_content=text(main, ' ') if main is not None else '',
+        paragraphs=[t for t in map(text, soup.find_all('p')) if t],
+        blocks=blocks,
+        links=list(dict.fromkeys(a['href'] for a in soup.find_all('a', href=True) if a['href'])),
+        noscript_text=' '.join(text(tag) for tag in soup.find_all('noscript')),
+        text_length=text_length
+    )
+
+
+PARSERS: Dict[str, Tuple[object, Callable[[str, str], ParsedDocument]]] = {
+    'selectolax': (SelectolaxParser, _parse_selectolax),
+    'lxml': (lxml_html, _parse_lxml),
+    'html.parser': (BeautifulSoup, _parse_bs4)
+}
+
+
+def available_parsers() -> List[str]:
+    return [name for name, (module, _) in PARSERS.items() if module is not None]
+
+
+def _select_parser(name: Optional[str] = None) -> str:
+    name = name or os.getenv('HTML_PARSER', 'auto')
+    if name != 'auto':
+        if name not in PARSERS or PARSERS[name][0] is None:
+            raise ValueError(f"HTML parser '{name}' is not available (installed: {available_parsers()})")
+        return name
+    # Fastest installed parser first
+    return available_parsers()[0]
+
+
+def parse_document(html: str, url: str = '', parser: Optional[str] = None) -> ParsedDocument:
+    """
+    Parse a page once into a ParsedDocument.
+
+    Uses selectolax, then lxml, then the stdlib html.parser, whichever is installed first
+    (HTML_PARSER env forces one). A parser failure falls back to html.parser.
+    """
+    name = _select_parser(parser)
+    try:
+        return PARSERS[name][1](html or '', url)
+    except Exception as e:
+        if name == 'html.parser':
+            raise
+        logging.error(f"{name} failed to parse {url or 'page'}: {e}; falling back to html.parser")
+        return _parse_bs4(html or '', url)
+
+
+class _TextMeter(HTMLParser):
+    """Counts visible text as markup is fed, for parsers that cannot build a tree incrementally"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.visible_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.visible_chars += len(data.strip())
+
+
+class IncrementalDocumentParser:
+    """
+    Builds a ParsedDocument from markup fed in pieces as it arrives.
+
+    With lxml the tree is built while the response streams in and reused for the
+    ParsedDocument, so the page is still parsed only once. Otherwise a tokenizer tracks
+    visible text and the selected parser runs on the collected markup at close().
+    feed() returns the visible text seen so far, so callers can stop reading early.
+    """
+
+    def __init__(self, url: str = '', parser: Optional[str] = None):
+        self.url = url
+        self.parser = parser
+        self.visible_chars = 0
+        self._pieces: List[str] = []
+        self._skip_depth = 0
+        requested = parser or os.getenv('HTML_PARSER', 'auto')
+        if lxml_etree is not None and requested in ('auto', 'lxml'):
+            self._pull = lxml_etree.HTMLPullParser(events=('start', 'end'))
+            self._meter = None
+        else:
+            self._pull = None
+            self._meter = _TextMeter()
+
+    def feed(self, markup: str) -> int:
+        self._pieces.append(markup)
+        if self._meter is not None:
+            self._meter.feed(markup)
+            self.visible_chars = self._meter.visible_chars
+            return self.visible_chars
+
+        self._pull.feed(markup)
+        for event, element in self._pull.read_events():
+            if element.tag in SKIP_TAGS:
+                self._skip_depth += 1 if event == 'start' else -1
+            elif event == 'end' and not self._skip_depth and isinstance(element.tag, str):
+                # Text directly inside the element plus the tails of its children
+                self.visible_chars += len((element.text or '').strip())
+                self.visible_chars += sum(len((child.tail or '').strip()) for child in element)
+        return self.visible_chars
+
+    def close(self) -> ParsedDocument:
+        html = ''.join(self._pieces)
+        if self._pull is None or not html.strip():
+            return parse_document(html, self.url, self.parser)
+        try:
+            return _document_from_lxml(self._pull.close(), html, self.url)
+        except Exception as e:
+            logging.error(f"Incremental parse of {self.url or 'page'} failed: {e}; parsing again")
+            return parse_document(html, self.url, self.parser)
@@ -0,0 +1,314 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from sqlite_store import SQLiteStore, cache_path
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: float
+    content_type: str
+    body: bytes
+    body_hash: str
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def _cache_control(headers: Mapping[str, str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in (headers.get('Cache-Control') or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def freshness_lifetime(headers: Mapping[str, str], default_ttl: float = 0) -> Optional[float]:
+    """
+    Seconds a response may be reused without revalidation, from Cache-Control max-age or
+    Expires; None if it must not be stored at all (no-store).
+    """
+    directives = _cache_control(headers)
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0.0
+    age = headers.get('Age') or ''
+    age = float(age) if age.isdigit() else 0.0
+    if directives.get('max-age') and directives['max-age'].isdigit():
+        return max(float(directives['max-age']) - age, 0.0)
+    if headers.get('Expires'):
+        try:
+            expires = parsedate_to_datetime(headers['Expires']).timestamp()
+            return max(expires - time.time(), 0.0)
+        except (TypeError, ValueError):
+            # An invalid Expires means already expired
+            return 0.0
+    return default_ttl
+
+
+class HTTPCache(SQLiteStore):
+    """
+    On-disk cache of fetched pages for conditional revalidation.
+
+    Stores each body with its ETag, Last-Modified and freshness lifetime. Fresh entries
+    are reused without a request; stale ones are revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged page costs a 304 instead of a full download.
+    Responses marked no-store are never written. Eviction is least-recently-used, bounded
+    both by entry count and by the total size of the stored bodies.
+    """
+
+    table = 'responses'
+
+    def __init__(self, path: str = None, max_entries: int = None, default_ttl: float = None,
+                 max_bytes: int = None):
+        """
+        Args:
+            path: SQLite file (HTTP_CACHE_PATH env, default $CACHE_DIR/http.sqlite)
+            max_entries: Pages kept before LRU eviction (HTTP_CACHE_MAX_ENTRIES env, default 20000)
+            default_ttl: Seconds to reuse a response that sends no freshness information
+                without revalidating it (HTTP_CACHE_DEFAULT_TTL env, default 0: always revalidate)
+            max_bytes: Body storage budget before LRU eviction (HTTP_CACHE_MAX_BYTES env,
+                default 536870912: 512 MB)
+        """
+        super().__init__(path or cache_path('HTTP_CACHE_PATH', 'http.sqlite'),
+                         max_entries or int(os.getenv('HTTP_CACHE_MAX_ENTRIES', 20000)))
+        self.max_bytes = max_bytes or int(os.getenv('HTTP_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv('HTTP_CACHE_DEFAULT_TTL', 0))
+        self._stats = {'fresh': 0, 'not_modified': 0, 'modified': 0, 'misses': 0, 'uncacheable': 0,
+                       'evictions': 0}
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    expires_at REAL NOT NULL,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    body_hash TEXT NOT NULL,
+                    nbytes INTEGER NOT NULL DEFAULT 0,
+                    last_access REAL NOT NULL
+                )
+            """)
+            # Caches written before the byte budget existed
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(responses)')}
+            if 'nbytes' not in columns:
+                conn.execute('ALTER TABLE responses ADD COLUMN nbytes INTEGER NOT NULL DEFAULT 0')
+                conn.execute('UPDATE responses SET nbytes = LENGTH(body)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT url, etag, last_modified, expires_at, content_type, body, body_hash '
+                'FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is not None:
+                with conn:
+                    conn.execute('UPDATE responses SET last_access = ? WHERE url = ?', (time.time(), url))
+        except sqlite3.Error as e:
+            logging.error(f"HTTP cache read failed: {e}")
+            return None
+        if row is None:
+            self._count('misses')
+            return None
+        entry = CachedResponse(*row)
+        if entry.fresh:
+            self._count('fresh')
+        return entry
+
+    def store(self, url: str, headers: Mapping[str, str], body: bytes, body_hash: str,
+              previous: Optional[CachedResponse] = None) -> None:
+        """Save a 200 response, unless its headers forbid storing it"""
+        if previous is not None:
+            self._count('modified' if previous.body_hash != body_hash else 'not_modified')
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        if lifetime is None:
+            self._count('uncacheable')
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO responses '
+                    '(url, etag, last_modified, expires_at, content_type, body, body_hash, nbytes, last_access) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (url, headers.get('ETag'), headers.get('Last-Modified'), now + lifetime,
+                     headers.get('Content-Type', ''), body, body_hash, len(body), now)
+                )
+        except sqlite3.Error as e:
+            logging.error(f"HTTP cache write failed: {e}")
+            return
+        self._wrote()
+
+    def revalidated(self, url: str, headers: Mapping[str, str]) -> None:
+        """Record a 304: extend freshness and pick up any new validators"""
+        self._count('not_modified')
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        now = time.time()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'UPDATE responses SET expires_at = ?, etag = COALESCE(?, etag), '
+                    'last_modified = COALESCE(?, last_modified), last_access = ? WHERE url = ?',
+                    (now + (lifetime or 0), headers.get('ETag'), headers.get('Last-Modified'), now, url)
+                )
+        except sqlite3.Error as e:
+            logging.error(f"HTTP cache update failed: {e}")
+
+    def evict(self) -> int:
+        """
+        Drop least-recently-used pages until back under 90% of max_entries and of max_bytes.
+        """
+        removed = super().evict()
+        try:
+            conn = self._connection()
+            total = conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                rowids = []
+                for rowid, nbytes in conn.execute('SELECT rowid, nbytes FROM responses ORDER BY last_access'):
+                    if total <= target:
+                        break
+                    rowids.append((rowid,))
+                    total -= nbytes
+                with conn:
+                    conn.executemany('DELETE FROM responses WHERE rowid = ?', rowids)
+                removed += len(rowids)
+        except sqlite3.Error as e:
+            logging.error(f"HTTP cache eviction failed: {e}")
+        with self._lock:
+            self._stats['evictions'] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats['entries'], stats['bytes'] = self._connection().execute(
+                'SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM responses'
+            ).fetchone()
+            stats['max_bytes'] = self.max_bytes
+        except sqlite3.Error:
+            stats['entries'] = None
+        return stats
+
+
+def _jsonable(value: Any) -> Any:
+    # numpy scalars and arrays in model outputs
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class AnalysisStore(SQLiteStore):
+    """
+    Previously computed analysis results, keyed by a fingerprint of everything they were
+    computed from (page content hashes, engine, categories). A re-scrape whose pages all
+    come back unchanged returns the stored result without running any models. Results
+    older than the TTL are recomputed even if their inputs did not change, since remote
+    models and external data behind them can.
+    """
+
+    table = 'analyses'
+
+    def __init__(self, path: str = None, max_entries: int = None, ttl: float = None):
+        """
+        Args:
+            path: SQLite file (ANALYSIS_STORE_PATH env, default $CACHE_DIR/analyses.sqlite)
+            max_entries: Results kept before LRU eviction (ANALYSIS_STORE_MAX_ENTRIES env, default 5000)
+            ttl: Seconds a stored result is reused; 0 keeps results until evicted
+                (ANALYSIS_STORE_TTL env, default 604800)
+        """
+        super().__init__(path or cache_path('ANALYSIS_STORE_PATH', 'analyses.sqlite'),
+                         max_entries or int(os.getenv('ANALYSIS_STORE_MAX_ENTRIES', 5000)))
+        self.ttl = ttl if ttl is not None else float(os.getenv('ANALYSIS_STORE_TTL', 604800))
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0}
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    fingerprint TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    stored_at REAL NOT NULL DEFAULT 0,
+                    last_access REAL NOT NULL
+                )
+            """)
+            # Stores written before the TTL existed: their rows count as expired
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(analyses)')}
+            if 'stored_at' not in columns:
+                conn.execute('ALTER TABLE analyses ADD COLUMN stored_at REAL NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS analyses_last_access ON analyses (last_access)')
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, fingerprint: str) -> Optional[Any]:
+        result = None
+        outcome = 'misses'
+        try:
+            conn = self._connection()
+            row = conn.execute('SELECT result, stored_at FROM analyses WHERE fingerprint = ?',
+                               (fingerprint,)).fetchone()
+            now = time.time()
+            if row is not None and self.ttl > 0 and now - row[1] >= self.ttl:
+                outcome = 'expired'
+                with conn:
+                    conn.execute('DELETE FROM analyses WHERE fingerprint = ?', (fingerprint,))
+            elif row is not None:
+                result = json.loads(row[0])
+                outcome = 'hits'
+                with conn:
+                    conn.execute('UPDATE analyses SET last_access = ? WHERE fingerprint = ?', (now, fingerprint))
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Analysis store read failed: {e}")
+        with self._lock:
+            self._stats[outcome] += 1
+        return result
+
+    def put(self, fingerprint: str, result: Any) -> None:
+        now = time.time()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO analyses (fingerprint, result, stored_at, last_access) '
+                    'VALUES (?, ?, ?, ?)',
+                    (fingerprint, json.dumps(result, default=_jsonable), now, now)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.error(f"Analysis store write failed: {e}")
+            return
+        self._wrote()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,256 @@
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from transformers import AutoConfig
+
+try:
+    import onnxruntime
+    from onnxruntime.quantization import QuantType, quantize_dynamic as quantize_onnx
+except ImportError:
+    onnxruntime = None
+
+BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+ONNX_FORMAT_VERSION = '1'
+ONNX_OPSET = 17
+
+# Financial / ESG sentences the quantized outputs are compared on before a backend is used
+CALIBRATION_TEXTS = [
+    "Revenue grew 12 percent year over year, beating analyst expectations.",
+    "The company reported a net loss after a large impairment charge.",
+    "Shares were flat as investors awaited the central bank decision.",
+    "We reduced scope 1 and 2 greenhouse gas emissions by 30 percent since 2019.",
+    "The board adopted a new anti-corruption policy and an independent audit committee.",
+    "Employee volunteering hours in local communities doubled this year.",
+    "Our data centres now run entirely on renewable electricity.",
+    "Token holders voted to fund an independent security audit of the protocol.",
+]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class TorchBackend:
+    """The transformers model in PyTorch, fp32 or with int8 dynamically quantized Linear layers"""
+
+    def __init__(self, model, quantize: bool = False):
+        model.eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.config = model.config
+        self.name = 'torch-int8' if quantize else 'torch'
+
+    def logits(self, inputs: Dict[str, Any]) -> np.ndarray:
+        with torch.inference_mode():
+            return self.model(**inputs).logits.float().numpy()
+
+
+class ONNXBackend:
+    """An exported model run by ONNX Runtime on CPU; the PyTorch weights are not loaded"""
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        path = os.path.join(model_dir, 'model.int8.onnx' if quantized else 'model.onnx')
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.config = AutoConfig.from_pretrained(model_dir)
+        self.name = 'onnx-int8' if quantized else 'onnx'
+
+    def logits(self, inputs: Dict[str, Any]) -> np.ndarray:
+        feed = {
+            name: np.asarray(inputs[name].numpy() if hasattr(inputs[name], 'numpy') else inputs[name], dtype=np.int64)
+            for name in self.input_names
+        }
+        return self.session.run(['logits'], feed)[0]
+
+
+class SharedEncoderBackend:
+    """
+    Two fp32 classifiers fine-tuned from the same frozen encoder: the encoder runs once
+    per batch and its pooled output feeds both classification heads. The second model is
+    pointed at the first one's encoder so only one copy of its weights stays in memory.
+    """
+
+    def __init__(self, first: TorchBackend, second: TorchBackend):
+        self.encoder = first.model.base_model
+        setattr(second.model, second.model.base_model_prefix, self.encoder)
+        self.models = (first.model, second.model)
+        self.name = 'torch-shared'
+
+    def logits(self, inputs: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        with torch.inference_mode():
+            pooled = self.encoder(**inputs).pooler_output
+            return tuple(model.classifier(model.dropout(pooled)).float().numpy() for model in self.models)
+
+
+def can_share_encoder(first, second) -> bool:
+    """True when two fp32 torch BERT classifiers have identical encoder weights"""
+    if not all(isinstance(backend, TorchBackend) and backend.name == 'torch' for backend in (first, second)):
+        return False
+    if not all(backend.config.model_type == 'bert' for backend in (first, second)):
+        return False
+    ours, theirs = first.model.base_model.state_dict(), second.model.base_model.state_dict()
+    return ours.keys() == theirs.keys() and all(
+        ours[name].shape == theirs[name].shape and torch.equal(ours[name], theirs[name]) for name in ours
+    )
+
+
+def available_backends() -> List[str]:
+    return [name for name in BACKENDS if onnxruntime is not None or not name.startswith('onnx')]
+
+
+def drift(tokenizer, reference, candidate, texts: List[str] = None) -> Dict[str, float]:
+    """How far a candidate backend's class probabilities are from the fp32 reference"""
+    inputs = tokenizer(texts or CALIBRATION_TEXTS, padding=True, truncation=True, return_tensors='pt')
+    expected, actual = softmax(reference.logits(inputs)), softmax(candidate.logits(inputs))
+    return {
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+        'mean_abs_diff': float(np.abs(expected - actual).mean()),
+        'label_agreement': float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+    }
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Positional inputs and a plain logits tensor, which is what the ONNX exporter needs"""
+
+    def __init__(self, model, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *args):
+        return self.model(**dict(zip(self.input_names, args))).logits
+
+
+def _torchscript_exporter() -> Dict[str, Any]:
+    # torch 2.1 has only the TorchScript exporter and no `dynamo` argument; newer releases
+    # default to the dynamo exporter, so ask for TorchScript explicitly there
+    return {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+
+def default_onnx_dir() -> str:
+    return os.getenv('NLP_ONNX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'onnx'))
+
+
+def _manifest(model_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(model_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_onnx(model, tokenizer, model_id: str, model_dir: str) -> Dict[str, Any]:
+    """
+    Export a sequence classifier to model_dir as model.onnx plus an int8 model.int8.onnx,
+    with its config and a manifest. Written to a staging directory and swapped in, so
+    concurrent workers never load a half-written model.
+    """
+    model.eval()
+    sample = tokenizer(CALIBRATION_TEXTS[:2], padding=True, return_tensors='pt')
+    input_names = list(sample.keys())
+    parent = os.path.dirname(os.path.abspath(model_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.export-', dir=parent)
+    try:
+        fp32_path = os.path.join(staging, 'model.onnx')
+        with torch.inference_mode():
+            torch.onnx.export(
+                _LogitsOnly(model, input_names),
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=['logits'],
+                dynamic_axes={**{name: {0: 'batch', 1: 'sequence'} for name in input_names}, 'logits': {0: 'batch'}},
+                opset_version=ONNX_OPSET,
+                **_torchscript_exporter()
+            )
+        quantize_onnx(fp32_path, os.path.join(staging, 'model.int8.onnx'), weight_type=QuantType.QInt8)
+        model.config.save_pretrained(staging)
+        reference = TorchBackend(model)
+        manifest = {
+            'model_id': model_id,
+            'format_version': ONNX_FORMAT_VERSION,
+            'input_names': input_names,
+            'drift': {
+                quantized: drift(tokenizer, reference, ONNXBackend(staging, quantized == 'onnx-int8'))
+                for quantized in ('onnx', 'onnx-int8')
+            }
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        previous = model_dir + '.previous'
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(model_dir):
+            os.replace(model_dir, previous)
+        os.replace(staging, model_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+        return manifest
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def load_backend(name: str, key: str, model_id: str, tokenizer, load_model: Callable[[], Any],
+                 max_drift: float = None, threads: int = None):
+    """
+    Build the inference backend for one classifier.
+
+    Args:
+        name: One of BACKENDS (NLP_BACKEND env)
+        key: Directory name for the exported model under NLP_ONNX_DIR
+        model_id: Hugging Face id (or path) the model was loaded from
+        tokenizer: The model's tokenizer, for export and the drift check
+        load_model: Loads the fp32 transformers model; for ONNX only called when exporting
+        max_drift: Largest class-probability difference from fp32 on the calibration
+            sentences before falling back to fp32 (NLP_BACKEND_MAX_DRIFT env, default 0.05)
+        threads: ONNX Runtime intra-op threads (NLP_TORCH_THREADS env, 0 = runtime default)
+    """
+    if name not in available_backends():
+        raise ValueError(f"Inference backend '{name}' is not available (available: {available_backends()})")
+    max_drift = max_drift if max_drift is not None else float(os.getenv('NLP_BACKEND_MAX_DRIFT', 0.05))
+    threads = threads if threads is not None else int(os.getenv('NLP_TORCH_THREADS', 0))
+
+    if name == 'torch':
+        return TorchBackend(load_model())
+
+    reference = None
+    try:
+        if name == 'torch-int8':
+            model = load_model()
+            reference = TorchBackend(model)
+            candidate = TorchBackend(model, quantize=True)
+            measured = drift(tokenizer, reference, candidate)
+        else:
+            model_dir = os.path.join(default_onnx_dir(), key)
+            manifest = _manifest(model_dir)
+            if (manifest is None or manifest.get('model_id') != model_id
+                    or manifest.get('format_version') != ONNX_FORMAT_VERSION):
+                logging.info(f"Exporting {model_id} to ONNX in {model_dir}")
+                manifest = export_onnx(load_model(), tokenizer, model_id, model_dir)
+            candidate = ONNXBackend(model_dir, quantized=name == 'onnx-int8', threads=threads)
+            measured = manifest['drift'][name]
+    except Exception as e:
+        # A failed quantization or export must not take the classifier down with it
+        logging.error(f"{name} backend for {model_id} failed ({e}); using fp32 torch")
+        return reference or TorchBackend(load_model())
+
+    if measured['max_abs_diff'] > max_drift:
+        logging.error(f"{name} backend for {model_id} drifts {measured['max_abs_diff']:.4f} from fp32 "
+                      f"(limit {max_drift}); using fp32 torch")
+        return reference if name == 'torch-int8' else TorchBackend(load_model())
+    logging.info(f"{name} backend for {model_id}: drift from fp32 {measured}")
+    return candidate
@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from sqlite_store import cache_path
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested"""
+
+
+def _owner() -> str:
+    """Host and pid of this process, recorded on its jobs for diagnostics"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobStore:
+    """SQLite-backed job records, safe to share across threads"""
+
+    def __init__(self, db_path: str = ':memory:'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn_pid = None
+        if db_path != ':memory:' and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # A connection inherited across fork (gunicorn preload) must not be reused
+        if self._conn_pid != os.getpid():
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._connection.row_factory = sqlite3.Row
+            if self.db_path != ':memory:':
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            with self._connection:
+                self._connection.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        options TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        progress TEXT NOT NULL,
+                        results TEXT NOT NULL,
+                        error TEXT,
+                        cancel_requested INTEGER NOT NULL DEFAULT 0,
+                        owner TEXT,
+                        heartbeat_at REAL,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                """)
+                columns = {row['name'] for row in self._connection.execute('PRAGMA table_info(jobs)')}
+                if 'owner' not in columns:
+                    self._connection.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+                if 'heartbeat_at' not in columns:
+                    self._connection.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at REAL')
+            self._conn_pid = os.getpid()
+        return self._connection
+
+    def create(self, url: str, options: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO jobs '
+                '(id, url, options, status, progress, results, owner, heartbeat_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, url, json.dumps(options), QUEUED, '{}', '{}', _owner(), now, now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        if not fields:
+            return
+        for key in ('options', 'progress', 'results'):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], default=str)
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'UPDATE jobs SET {assignments} WHERE id = ?',
+                (*fields.values(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ('options', 'progress', 'results'):
+            job[key] = json.loads(job[key])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def heartbeat(self, job_ids) -> None:
+        """Record that the process owning these jobs is still alive"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        placeholders = ','.join('?' * len(job_ids))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'UPDATE jobs SET heartbeat_at = ? WHERE id IN ({placeholders})',
+                (time.time(), *job_ids)
+            )
+
+    def fail_orphaned(self, stale_after: float) -> int:
+        """
+        Mark queued and running jobs with no heartbeat for stale_after seconds as failed;
+        returns how many. Heartbeats rather than pids tell whether the owner is alive, so
+        this works across containers and hosts sharing the database.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? '
+                'WHERE status IN (?, ?) AND COALESCE(heartbeat_at, updated_at) < ?',
+                (FAILED, 'Interrupted: the process running this job stopped responding', now,
+                 QUEUED, RUNNING, now - stale_after)
+            )
+        return cursor.rowcount
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        return bool(row and row['cancel_requested'])
+
+
+class JobQueue:
+    """Runs scrape jobs on a bounded in-process worker pool"""
+
+    def __init__(self, runner: Callable[..., Optional[Dict[str, Any]]],
+                 max_workers: Optional[int] = None, db_path: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = None, stale_after: Optional[float] = None):
+        """
+        Args:
+            runner: Callable invoked as runner(url, progress_callback=..., cancel_event=..., **options)
+            max_workers: Number of concurrent jobs (JOB_WORKERS env, default 2)
+            db_path: SQLite file for job records, shared by every worker process
+                (JOB_DB_PATH env, default $CACHE_DIR/jobs.sqlite; ':memory:' for one process)
+            heartbeat_interval: Seconds between heartbeats on this process's jobs
+                (JOB_HEARTBEAT_INTERVAL env, default 15)
+            stale_after: Seconds without a heartbeat before a queued or running job counts as
+                orphaned and is failed (JOB_STALE_AFTER env, default 120)
+        """
+        self.runner = runner
+        self.max_workers = max_workers or int(os.getenv('JOB_WORKERS', 2))
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv('JOB_HEARTBEAT_INTERVAL', 15))
+        self.stale_after = stale_after or float(os.getenv('JOB_STALE_AFTER', 120))
+        self.store = JobStore(db_path or cache_path('JOB_DB_PATH', 'jobs.sqlite'))
+        # Jobs left queued or running by a process that crashed or was restarted never finish
+        self._fail_orphaned()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scrape-job')
+        self._futures = {}
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat_pid = None
+
+    def _fail_orphaned(self) -> None:
+        try:
+            orphaned = self.store.fail_orphaned(self.stale_after)
+        except sqlite3.Error as e:
+            logging.error(f"Failing orphaned jobs failed: {e}")
+            return
+        if orphaned:
+            logging.info(f"Marked {orphaned} jobs without a heartbeat as failed")
+
+    def _ensure_heartbeat(self) -> None:
+        # Threads don't survive fork, so each worker process starts its own on first submit
+        with self._lock:
+            if self._heartbeat_pid == os.getpid():
+                return
+            self._heartbeat_pid = os.getpid()
+        threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._futures)
+            try:
+                self.store.heartbeat(job_ids)
+            except sqlite3.Error as e:
+                logging.error(f"Job heartbeat failed: {e}")
+            # Also catches jobs of processes on other hosts that died after this one started
+            self._fail_orphaned()
+
+    def submit(self, url: str, **options) -> str:
+        """Queue a scrape job and return its ID"""
+        self._ensure_heartbeat()
+        job_id = self.store.create(url, options)
+        cancel_event = threading.Event()
+        with self._lock:
+            self._cancel_events[job_id] = cancel_event
+            self._futures[job_id] = self.executor.submit(self._run, job_id, url, options, cancel_event)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return job status, per-tab progress and (partial) results"""
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; queued jobs never start, running jobs stop between tabs"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] in FINISHED_STATES:
+            return job
+
+        self.store.update(job_id, cancel_requested=1)
+        with self._lock:
+            future = self._futures.get(job_id)
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event:
+            cancel_event.set()
+        if future and future.cancel():
+            self._finish(job_id, status=CANCELLED)
+        return self.store.get(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            events = list(self._cancel_events.values())
+        for event in events:
+            event.set()
+        self._stopped.set()
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _finish(self, job_id: str, **fields) -> None:
+        self.store.update(job_id, **fields)
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+
+    def _run(self, job_id: str, url: str, options: Dict[str, Any], cancel_event: threading.Event) -> None:
+        if cancel_event.is_set() or self.store.is_cancel_requested(job_id):
+            self._finish(job_id, status=CANCELLED)
+            return
+
+        self.store.update(job_id, status=RUNNING)
+        progress = {}
+        partial_results = {}
+        progress_lock = threading.Lock()
+
+        def progress_callback(tab_url: str, status: str, result: Optional[Dict[str, Any]] = None) -> None:
+            # Cancellation may have been requested through another worker process sharing the store
+            if not cancel_event.is_set() and self.store.is_cancel_requested(job_id):
+                cancel_event.set()
+            with progress_lock:
+                progress[tab_url] = status
+                if result:
+                    partial_results[tab_url] = result
+                self.store.update(job_id, progress=progress, results=partial_results)
+
+        try:
+            result = self.runner(url, progress_callback=progress_callback, cancel_event=cancel_event, **options)
+            if cancel_event.is_set():
+                self._finish(job_id, status=CANCELLED)
+            elif result is None:
+                self._finish(job_id, status=FAILED, error='Scraping failed')
+            else:
+                self._finish(job_id, status=COMPLETED, results=result.get('relevant_content', result))
+        except JobCancelled:
+            self._finish(job_id, status=CANCELLED)
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {str(e)}")
+            self._finish(job_id, status=FAILED, error=str(e))
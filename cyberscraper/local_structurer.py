@@ -0,0 +1,91 @@
+import logging
+import os
+from typing import Any, Dict, List
+
+from inference_backends import softmax
+from nlp_processor import NLPProcessor
+from text_chunker import iter_blocks
+
+# Bump whenever the output for a given text changes, so cached results are not reused
+LOCAL_STRUCTURER_VERSION = '1'
+
+SECTION_LABELS = {
+    'Environmental': 'environmental',
+    'Social': 'social',
+    'Governance': 'governance'
+}
+
+
+class LocalESGStructurer:
+    """
+    Offline replacement for the Gemini structuring step.
+
+    Splits the page into sentences with spaCy and sorts them into the environmental /
+    social / governance lists with the finbert-esg classifier, in padded CPU batches on
+    the NLP_BACKEND inference backend.
+    The output has the same schema as DataCleaner.structure_scraped_data.
+    """
+
+    def __init__(self, nlp_processor: NLPProcessor = None):
+        # Shares the spaCy and finbert-esg models registered by NLPProcessor
+        self.nlp_processor = nlp_processor or NLPProcessor()
+        self.batch_size = int(os.getenv('LOCAL_ESG_BATCH_SIZE', 32))
+        self.threshold = float(os.getenv('LOCAL_ESG_THRESHOLD', 0.5))
+        self.max_sentence_tokens = int(os.getenv('LOCAL_ESG_MAX_SENTENCE_TOKENS', 128))
+        self.min_sentence_words = int(os.getenv('LOCAL_ESG_MIN_SENTENCE_WORDS', 4))
+        # Quantized backends score slightly differently, so each gets its own cache entries
+        self.model_name = f"local-finbert-esg:{LOCAL_STRUCTURER_VERSION}:{self.nlp_processor.backend}"
+
+    def _sentences(self, text: str) -> List[str]:
+        nlp = self.nlp_processor.nlp
+        # Sentence boundaries come from the parser; entities and lemmas aren't needed
+        disabled = [name for name in ('ner', 'lemmatizer') if name in nlp.pipe_names]
+        blocks = iter_blocks(text[:self.nlp_processor.spacy_max_chars], self.nlp_processor.spacy_block_chars)
+        sentences = []
+        for doc in nlp.pipe(blocks, disable=disabled):
+            for sent in doc.sents:
+                sentence = sent.text.strip()
+                if len(sentence.split()) >= self.min_sentence_words:
+                    sentences.append(sentence)
+        return list(dict.fromkeys(sentences))
+
+    def _classify(self, sentences: List[str]) -> List[Dict[str, float]]:
+        tokenizer = self.nlp_processor.esg_tokenizer
+        backend = self.nlp_processor.esg_backend
+        id2label = backend.config.id2label
+
+        # Length-sorted batches keep padding (and wasted compute) small
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        scores = [None] * len(sentences)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            inputs = tokenizer(
+                [sentences[i] for i in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_sentence_tokens,
+                return_tensors="pt"
+            )
+            probabilities = softmax(backend.logits(inputs))
+            for i, row in zip(batch, probabilities):
+                scores[i] = {id2label[j]: float(p) for j, p in enumerate(row)}
+        return scores
+
+    def structure(self, raw_text: str) -> Dict[str, Any]:
+        """Clean and structure raw scraped text into the ESG JSON schema"""
+        text = ' '.join(raw_text.split())
+        sentences = self._sentences(text)
+        result = {"clean_text": ' '.join(sentences)}
+        for section in SECTION_LABELS.values():
+            result[section] = []
+        if not sentences:
+            return result
+
+        try:
+            for sentence, scores in zip(sentences, self._classify(sentences)):
+                label = max(scores, key=scores.get)
+                if label in SECTION_LABELS and scores[label] >= self.threshold:
+                    result[SECTION_LABELS[label]].append(sentence)
+        except Exception as e:
+            logging.error(f"Local ESG classification failed: {e}")
+        return result
@@ -0,0 +1,258 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import numpy as np
+import requests
+from web3 import Web3
+
+ENERGY_PER_GAS_KWH = 0.000000392  # kWh per gas unit (estimate)
+
+KLIMA_QUERY = """
+{
+  klimaStakings(first: 1) {
+    totalSupply
+    rebaseRate
+    carbonLocked
+  }
+}
+"""
+
+SNAPSHOT_QUERY = """
+{
+  proposals(first: 100, orderBy: "created", orderDirection: desc) {
+    votes
+    quorum
+    executed
+  }
+}
+"""
+
+DEFAULTS = {
+    'energy': {"l1_energy_kWh": 0, "l2_energy_kWh": 0, "l2_efficiency": 0},
+    'klima': {"carbon_locked": 0, "offset_rate": 0},
+    'dao': {"proposal_count": 0, "execution_rate": 0, "participation_rate": 0}
+}
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'expires_at', 'stale_until', 'refreshing', 'ready')
+
+    def __init__(self):
+        self.value = None
+        self.fetched_at = None
+        self.expires_at = 0.0
+        self.stale_until = 0.0
+        self.refreshing = False
+        self.ready = threading.Event()
+
+
+class MetricsProvider:
+    """
+    Cached access to global on-chain and subgraph metrics.
+
+    The metrics are the same for every page, so each is fetched at most once per TTL no
+    matter how many tabs are scored. Concurrent misses share one in-flight request, and
+    expired values are served while a single background refresh runs. Failed fetches
+    keep serving the last good value, or the default for a short error TTL.
+    """
+
+    def __init__(self, ttl: float = None, stale_ttl: float = None, error_ttl: float = None,
+                 refresh_interval: float = None, timeout: float = None,
+                 l1_rpc_url: str = None, l2_rpc_url: str = None,
+                 klima_url: str = None, snapshot_url: str = None):
+        """
+        Args:
+            ttl: Seconds a fetched value is fresh (METRICS_TTL env, default 300)
+            stale_ttl: Seconds past expiry a value may still be served while refreshing
+                (METRICS_STALE_TTL env, default 3600)
+            error_ttl: Seconds before retrying a fetch that failed with no value to fall
+                back on (METRICS_ERROR_TTL env, default 30)
+            refresh_interval: Refresh all metrics in the background every N seconds;
+                0 disables (METRICS_REFRESH_INTERVAL env, default 0)
+            timeout: HTTP timeout per remote call (METRICS_TIMEOUT env, default 10)
+            l1_rpc_url, l2_rpc_url, klima_url, snapshot_url: Endpoint overrides, e.g. local stubs
+        """
+        infura_key = os.getenv('INFURA_API_KEY')
+        self.ttl = ttl if ttl is not None else float(os.getenv('METRICS_TTL', 300))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv('METRICS_STALE_TTL', 3600))
+        self.error_ttl = error_ttl if error_ttl is not None else float(os.getenv('METRICS_ERROR_TTL', 30))
+        self.refresh_interval = (refresh_interval if refresh_interval is not None
+                                 else float(os.getenv('METRICS_REFRESH_INTERVAL', 0)))
+        self.timeout = timeout or float(os.getenv('METRICS_TIMEOUT', 10))
+        self.l1_rpc_url = l1_rpc_url or os.getenv('L1_RPC_URL', f'https://mainnet.infura.io/v3/{infura_key}')
+        self.l2_rpc_url = l2_rpc_url or os.getenv('L2_RPC_URL', f'https://optimism-mainnet.infura.io/v3/{infura_key}')
+        self.klima_url = klima_url or os.getenv(
+            'KLIMA_SUBGRAPH_URL', 'https://api.thegraph.com/subgraphs/name/klimadao/klimadao')
+        self.snapshot_url = snapshot_url or os.getenv('SNAPSHOT_GRAPHQL_URL', 'https://hub.snapshot.org/graphql')
+
+        self._fetchers: Dict[str, Callable[[], Dict[str, float]]] = {
+            'energy': self._fetch_energy,
+            'klima': self._fetch_klima,
+            'dao': self._fetch_dao
+        }
+        self._entries = {name: _Entry() for name in self._fetchers}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._web3 = {}
+        self._refresher_pid = None
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0,
+                       'fetches': 0, 'errors': 0}
+
+    def get(self, name: str) -> Dict[str, float]:
+        """Return the named metrics ('energy', 'klima' or 'dao'), fetching only when needed"""
+        self._ensure_refresher()
+        entry = self._entries[name]
+        now = time.monotonic()
+
+        with self._lock:
+            if entry.value is not None and now < entry.expires_at:
+                self._stats['hits'] += 1
+                return entry.value
+            if entry.value is not None and now < entry.stale_until:
+                # Stale-while-revalidate: answer now, refresh once in the background
+                self._stats['stale_hits'] += 1
+                if not entry.refreshing:
+                    entry.refreshing = True
+                    threading.Thread(target=self._refresh, args=(name,),
+                                     name=f'metrics-{name}', daemon=True).start()
+                return entry.value
+            if entry.refreshing:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                self._stats['misses'] += 1
+                entry.refreshing = True
+                entry.ready.clear()
+                leader = True
+
+        if leader:
+            self._refresh(name)
+        else:
+            entry.ready.wait(self.timeout * 3)
+        with self._lock:
+            return entry.value if entry.value is not None else dict(DEFAULTS[name])
+
+    def energy(self) -> Dict[str, float]:
+        return self.get('energy')
+
+    def klima(self) -> Dict[str, float]:
+        return self.get('klima')
+
+    def dao(self) -> Dict[str, float]:
+        return self.get('dao')
+
+    def refresh_all(self) -> None:
+        """Fetch every metric now, unless a refresh is already running for it"""
+        for name, entry in self._entries.items():
+            with self._lock:
+                if entry.refreshing:
+                    continue
+                entry.refreshing = True
+                entry.ready.clear()
+            self._refresh(name)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['age_seconds'] = {
+                name: round(now - entry.fetched_at, 1) if entry.fetched_at is not None else None
+                for name, entry in self._entries.items()
+            }
+        return stats
+
+    def _refresh(self, name: str) -> None:
+        entry = self._entries[name]
+        try:
+            value = self._fetchers[name]()
+            failed = False
+        except Exception as e:
+            logging.error(f"Fetching {name} metrics failed: {e}")
+            value = None
+            failed = True
+
+        now = time.monotonic()
+        with self._lock:
+            self._stats['fetches'] += 1
+            if not failed:
+                entry.value = value
+                entry.fetched_at = now
+                entry.expires_at = now + self.ttl
+                entry.stale_until = entry.expires_at + self.stale_ttl
+            else:
+                self._stats['errors'] += 1
+                if entry.value is None:
+                    # Nothing to fall back on: serve defaults without hammering the endpoint
+                    entry.value = dict(DEFAULTS[name])
+                    entry.fetched_at = now
+                # Keep serving the old value, and retry after error_ttl
+                entry.expires_at = now + self.error_ttl
+                entry.stale_until = max(entry.stale_until, entry.expires_at)
+            entry.refreshing = False
+            entry.ready.set()
+
+    def _ensure_refresher(self) -> None:
+        # Threads don't survive fork, so each worker process starts its own refresher
+        if self.refresh_interval <= 0 or self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+        threading.Thread(target=self._refresh_loop, name='metrics-refresher', daemon=True).start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            try:
+                self.refresh_all()
+            except Exception as e:
+                logging.error(f"Metrics refresh failed: {e}")
+            time.sleep(self.refresh_interval)
+
+    def _rpc(self, url: str) -> Web3:
+        if url not in self._web3:
+            self._web3[url] = Web3(Web3.HTTPProvider(url, request_kwargs={'timeout': self.timeout}))
+        return self._web3[url]
+
+    def _query(self, url: str, query: str) -> Dict[str, Any]:
+        response = self._session.post(url, json={'query': query}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['data']
+
+    def _fetch_energy(self) -> Dict[str, float]:
+        # Compare L1 vs L2 gas usage
+        l1_gas = self._rpc(self.l1_rpc_url).eth.get_block('latest').gasUsed
+        l2_gas = self._rpc(self.l2_rpc_url).eth.get_block('latest').gasUsed
+
+        return {
+            "l1_energy_kWh": l1_gas * ENERGY_PER_GAS_KWH,
+            "l2_energy_kWh": l2_gas * ENERGY_PER_GAS_KWH,
+            "l2_efficiency": 1 - (l2_gas / l1_gas)
+        }
+
+    def _fetch_klima(self) -> Dict[str, float]:
+        data = self._query(self.klima_url, KLIMA_QUERY)['klimaStakings'][0]
+        return {
+            "carbon_locked": float(data['carbonLocked']),
+            "offset_rate": float(data['rebaseRate'])
+        }
+
+    def _fetch_dao(self) -> Dict[str, float]:
+        proposals = self._query(self.snapshot_url, SNAPSHOT_QUERY)['proposals']
+
+        # Calculate governance metrics
+        total_proposals = len(proposals)
+        executed_ratio = sum(1 for p in proposals if p['executed']) / total_proposals
+        avg_participation = float(np.mean([p['votes'] / p['quorum'] for p in proposals]))
+
+        return {
+            "proposal_count": total_proposals,
+            "execution_rate": executed_ratio,
+            "participation_rate": avg_participation
+        }
+
+
+metrics_provider = MetricsProvider()
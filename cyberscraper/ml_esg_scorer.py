@@ -1,36 +1,49 @@
 import json
-import requests
 import numpy as np
 import pandas as pd
-import xgboost as xgb
 from sklearn.preprocessing import MinMaxScaler
 import shap
 import logging
-from typing import Dict, Any
-from web3 import Web3
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import os
+import threading
+import time
+import esg_model_store
+from esg_model_store import FEATURE_NAMES
+from metrics_provider import metrics_provider
+from model_registry import registry
+
+# Reference range of each raw feature; values outside are clipped
+FEATURE_BOUNDS = {name: (0.0, 100.0) for name in FEATURE_NAMES}
+
+# Rows per SHAP call, so the explanation budget is checked between calls
+SHAP_CHUNK_SIZE = 64
 
 class MLESGScorer:
     def __init__(self):
-        self.w3 = Web3(Web3.HTTPProvider(f'https://mainnet.infura.io/v3/{os.getenv("INFURA_API_KEY")}'))
-        self.scaler = MinMaxScaler(feature_range=(0, 100))
+        # On-chain and subgraph metrics are global, so every scorer shares one cache
+        self.metrics = metrics_provider
         # Define ESG-related features
-        self.feature_names = [
-            'energy_efficiency',
-            'carbon_offset_ratio',
-            'renewable_energy_usage',
-            'waste_management_score',
-            'social_impact_score',
-            'employee_welfare_index',
-            'community_engagement_rate',
-            'governance_score',
-            'dao_participation',
-            'transparency_score'
-        ]
-        self.model = self._initialize_model()
-        self.explainer = None
-        self.lime_explainer = None
+        self.feature_names = list(FEATURE_NAMES)
+
+        # Map raw features onto the [0, 1] domain the model was trained on. The scaler is
+        # fitted once on fixed reference bounds so a document's score doesn't depend on
+        # what else is in its batch.
+        self.scaler = MinMaxScaler(feature_range=(0, 1), clip=True)
+        self.scaler.fit(pd.DataFrame(
+            [[FEATURE_BOUNDS[name][0] for name in self.feature_names],
+             [FEATURE_BOUNDS[name][1] for name in self.feature_names]],
+            columns=self.feature_names
+        ))
+
+        # Explanations are opt-in and cached by feature values
+        self.explain_by_default = os.getenv('ESG_EXPLAIN', 'false').lower() == 'true'
+        self.explain_budget = float(os.getenv('ESG_EXPLAIN_BUDGET', 2.0))
+        self.explain_cache_size = int(os.getenv('ESG_EXPLAIN_CACHE_SIZE', 256))
+        self._explain_cache = OrderedDict()
+        self._explain_cache_lock = threading.Lock()
         
         # Try to import LIME
         try:
@@ -39,123 +52,65 @@ class MLESGScorer:
         except ImportError:
             logging.warning("LIME not available, will skip LIME explanations")
             self.has_lime = False
+            
+        # The model is loaded on first use (or during warm-up); explainers when first needed
+        self._explainer_lock = threading.Lock()
+        registry.register('esg_xgboost', self._initialize_model)
 
-    def _initialize_model(self):
-        model = xgb.XGBRegressor(
-            objective='reg:squarederror',
-            n_estimators=100,
-            max_depth=4,
-            learning_rate=0.1
-        )
-        
-        # Generate synthetic training data with realistic ESG patterns
-        np.random.seed(42)
-        X_train = np.random.rand(1000, len(self.feature_names))
-        
-        # Add realistic correlations
-        X_train[:, 0] = X_train[:, 4] * 0.8 + X_train[:, 0] * 0.2  # L2 adoption affects energy efficiency
-        X_train[:, 1] = X_train[:, 2] * 0.6 + X_train[:, 1] * 0.4  # Governance affects carbon offsets
-        
-        # Generate target values with weighted importance - ensure weights match feature count
-        weights = [0.15, 0.15, 0.12, 0.12, 0.10, 0.10, 0.08, 0.08, 0.05, 0.05]  # Sum = 1.0
-        y_train = np.dot(X_train, weights) * 100
-        
-        model.fit(X_train, y_train)
-        self.explainer = shap.TreeExplainer(model)
-        
-        # Initialize LIME only if available
-        if self.has_lime:
-            try:
-                from lime import lime_tabular
-                self.lime_explainer = lime_tabular.LimeTabularExplainer(
-                    X_train,
-                    feature_names=self.feature_names,
-                    mode='regression'
-                )
-            except Exception as e:
-                logging.error(f"LIME initialization failed: {e}")
-                self.has_lime = False
-                
-        return model
+    @property
+    def model(self):
+        bundle = registry.get('esg_xgboost')
+        return bundle['model'] if bundle else None
+
+    @property
+    def explainer(self):
+        bundle = registry.get('esg_xgboost')
+        if not bundle:
+            return None
+        # SHAP parses every tree, so only pay for it when explanations are requested
+        with self._explainer_lock:
+            if bundle['explainer'] is None:
+                bundle['explainer'] = shap.TreeExplainer(bundle['model'])
+        return bundle['explainer']
+
+    @property
+    def lime_explainer(self):
+        bundle = registry.get('esg_xgboost')
+        if not bundle or not self.has_lime:
+            return None
+        with self._explainer_lock:
+            if bundle['lime_explainer'] is None:
+                try:
+                    from lime import lime_tabular
+                    bundle['lime_explainer'] = lime_tabular.LimeTabularExplainer(
+                        bundle['training_sample'],
+                        feature_names=self.feature_names,
+                        mode='regression'
+                    )
+                except Exception as e:
+                    logging.error(f"LIME initialization failed: {e}")
+                    self.has_lime = False
+        return bundle['lime_explainer']
+
+    def _initialize_model(self) -> Dict[str, Any]:
+        loaded = esg_model_store.load(feature_names=self.feature_names)
+        if loaded is not None:
+            model, training_sample, manifest = loaded
+            logging.info(f"Loaded ESG model {manifest['version']}")
+        else:
+            logging.warning("No published ESG model found, training in-process "
+                            "(run `python esg_model_store.py publish` to avoid this)")
+            model, training_sample = esg_model_store.train_model(self.feature_names)
+        return {'model': model, 'training_sample': training_sample, 'explainer': None, 'lime_explainer': None}
 
     def _get_energy_metrics(self) -> Dict[str, float]:
-        try:
-            # Get L1 vs L2 transaction data
-            l1_gas = self.w3.eth.get_block('latest').gasUsed
-            optimism_endpoint = f"https://optimism-mainnet.infura.io/v3/{os.getenv('INFURA_API_KEY')}"
-            w3_l2 = Web3(Web3.HTTPProvider(optimism_endpoint))
-            l2_gas = w3_l2.eth.get_block('latest').gasUsed
-            
-            # Calculate efficiency metrics
-            l2_efficiency = 1 - (l2_gas / l1_gas)
-            energy_per_gas = 0.000000392  # kWh per gas unit (estimate)
-            
-            return {
-                "l1_energy_kWh": l1_gas * energy_per_gas,
-                "l2_energy_kWh": l2_gas * energy_per_gas,
-                "l2_efficiency": l2_efficiency
-            }
-        except Exception as e:
-            logging.error(f"Energy metrics error: {e}")
-            return {"l1_energy_kWh": 0, "l2_energy_kWh": 0, "l2_efficiency": 0}
+        return self.metrics.energy()
 
     def _get_klima_metrics(self) -> Dict[str, float]:
-        try:
-            # Query KlimaDAO subgraph
-            query = """
-            {
-              klimaStakings(first: 1) {
-                totalSupply
-                rebaseRate
-                carbonLocked
-              }
-            }
-            """
-            response = requests.post(
-                'https://api.thegraph.com/subgraphs/name/klimadao/klimadao',
-                json={'query': query}
-            )
-            data = response.json()['data']['klimaStakings'][0]
-            
-            return {
-                "carbon_locked": float(data['carbonLocked']),
-                "offset_rate": float(data['rebaseRate'])
-            }
-        except Exception as e:
-            logging.error(f"KlimaDAO metrics error: {e}")
-            return {"carbon_locked": 0, "offset_rate": 0}
+        return self.metrics.klima()
 
     def _get_dao_metrics(self) -> Dict[str, float]:
-        try:
-            # Query Snapshot for governance data
-            query = """
-            {
-              proposals(first: 100, orderBy: "created", orderDirection: desc) {
-                votes
-                quorum
-                executed
-              }
-            }
-            """
-            response = requests.post(
-                'https://hub.snapshot.org/graphql',
-                json={'query': query}
-            )
-            proposals = response.json()['data']['proposals']
-            
-            # Calculate governance metrics
-            total_proposals = len(proposals)
-            executed_ratio = sum(1 for p in proposals if p['executed']) / total_proposals
-            avg_participation = np.mean([p['votes'] / p['quorum'] for p in proposals])
-            
-            return {
-                "proposal_count": total_proposals,
-                "execution_rate": executed_ratio,
-                "participation_rate": avg_participation
-            }
-        except Exception as e:
-            logging.error(f"DAO metrics error: {e}")
-            return {"proposal_count": 0, "execution_rate": 0, "participation_rate": 0}
+        return self.metrics.dao()
 
     def _extract_features(self, cleaned_data: Dict[str, Any]) -> Dict[str, float]:
         energy = self._get_energy_metrics()
@@ -198,51 +153,126 @@ class MLESGScorer:
         # Placeholder for actual GitHub API integration
         return 75.0
 
-    def calculate_esg_score(self, cleaned_data: Dict[str, Any]) -> Dict[str, Any]:
-        try:
-            features = self._extract_features(cleaned_data)
-            df_features = pd.DataFrame([features])
-            
-            # Scale features
-            df_scaled = pd.DataFrame(
-                self.scaler.fit_transform(df_features), 
-                columns=self.feature_names
-            )
-            
-            # Generate predictions and SHAP explanations
-            predicted_score = float(self.model.predict(df_scaled)[0])
-            shap_values = self.explainer(df_scaled)
-            
-            result = {
-                "esg_score": round(predicted_score, 2),
-                "features": features,
-                "feature_importance": {
-                    name: float(importance)
-                    for name, importance in zip(self.feature_names, shap_values.values[0])
-                },
-                "category_scores": {
-                    "environmental": round((features["energy_efficiency"] + features["carbon_offset_ratio"]) / 2, 2),
-                    "social": round(features["transparency_score"], 2),
-                    "governance": round((features["governance_score"] + features["dao_participation"]) / 2, 2)
-                }
-            }
-            
-            # Add LIME explanation only if available
-            if self.has_lime and self.lime_explainer:
-                try:
-                    lime_exp = self.lime_explainer.explain_instance(
-                        df_scaled.iloc[0], 
-                        self.model.predict
-                    )
-                    result["lime_explanation"] = {
-                        feat: float(imp)
-                        for feat, imp in lime_exp.as_list()
+    def _scale(self, df_features: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame(self.scaler.transform(df_features), columns=self.feature_names)
+
+    def calculate_esg_scores(self, batch: List[Dict[str, Any]], explain: bool = False) -> List[Dict[str, Any]]:
+        """
+        Score a batch of cleaned documents with a single model prediction.
+
+        Args:
+            batch: Structured ESG data per document (DataCleaner output)
+            explain: Also attach SHAP (and LIME) explanations, see explain_scores()
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+        rows, row_features = [], []
+        for i, cleaned_data in enumerate(batch):
+            try:
+                row_features.append(self._extract_features(cleaned_data))
+                rows.append(i)
+            except Exception as e:
+                logging.error(f"ESG feature extraction failed: {e}")
+                results[i] = {"error": str(e), "esg_score": 0}
+
+        if rows:
+            try:
+                df_scaled = self._scale(pd.DataFrame(row_features, columns=self.feature_names))
+                predictions = self.model.predict(df_scaled)
+                for i, features, prediction in zip(rows, row_features, predictions):
+                    results[i] = {
+                        "esg_score": round(float(prediction), 2),
+                        "features": features,
+                        "category_scores": {
+                            "environmental": round((features["energy_efficiency"] + features["carbon_offset_ratio"]) / 2, 2),
+                            "social": round(features["transparency_score"], 2),
+                            "governance": round((features["governance_score"] + features["dao_participation"]) / 2, 2)
+                        }
                     }
+            except Exception as e:
+                logging.error(f"ESG scoring failed: {e}")
+                for i in rows:
+                    results[i] = {"error": str(e), "esg_score": 0}
+                return results
+
+            if explain:
+                try:
+                    for i, explanation in zip(rows, self.explain_scores(row_features)):
+                        results[i].update(explanation)
                 except Exception as e:
-                    logging.error(f"LIME explanation failed: {e}")
-            
-            return result
-            
-        except Exception as e:
-            logging.error(f"ESG scoring failed: {e}")
-            return {"error": str(e), "esg_score": 0}
+                    logging.error(f"ESG explanation failed: {e}")
+
+        return results
+
+    def calculate_esg_score(self, cleaned_data: Dict[str, Any], explain: bool = None) -> Dict[str, Any]:
+        explain = self.explain_by_default if explain is None else explain
+        return self.calculate_esg_scores([cleaned_data], explain=explain)[0]
+
+    def explain_scores(self, batch_features: List[Dict[str, float]],
+                       budget_seconds: float = None) -> List[Dict[str, Any]]:
+        """
+        SHAP (and, if installed, LIME) explanations for already extracted features.
+
+        Explanations are cached by feature values. Uncached rows go through SHAP in chunks
+        and then LIME, which needs thousands of predictions per row. Both steps stop once
+        the time budget runs out; rows not fully explained by then are marked with
+        "explanation_truncated".
+        """
+        budget_seconds = self.explain_budget if budget_seconds is None else budget_seconds
+        deadline = time.perf_counter() + budget_seconds
+        keys = [tuple(round(features[name], 6) for name in self.feature_names) for features in batch_features]
+        explanations: List[Optional[Dict[str, Any]]] = []
+        with self._explain_cache_lock:
+            for key in keys:
+                explanation = self._explain_cache.get(key)
+                if explanation is not None:
+                    self._explain_cache.move_to_end(key)
+                explanations.append(explanation)
+
+        pending = [i for i, explanation in enumerate(explanations) if explanation is None]
+        if not pending:
+            return explanations
+
+        df_scaled = self._scale(pd.DataFrame([batch_features[i] for i in pending], columns=self.feature_names))
+        explained = 0
+        while explained < len(pending) and time.perf_counter() < deadline:
+            chunk = df_scaled.iloc[explained:explained + SHAP_CHUNK_SIZE]
+            shap_values = self.explainer(chunk)
+            for row, i in enumerate(pending[explained:explained + len(chunk)]):
+                explanations[i] = {
+                    "feature_importance": {
+                        name: float(importance)
+                        for name, importance in zip(self.feature_names, shap_values.values[row])
+                    }
+                }
+            explained += len(chunk)
+        for i in pending[explained:]:
+            explanations[i] = {"explanation_truncated": True}
+
+        lime_explainer = self.lime_explainer
+        for row, i in enumerate(pending[:explained]):
+            complete = True
+            if lime_explainer is not None:
+                if time.perf_counter() < deadline:
+                    try:
+                        lime_exp = lime_explainer.explain_instance(
+                            df_scaled.iloc[row].values,
+                            self.model.predict
+                        )
+                        explanations[i]["lime_explanation"] = {
+                            feat: float(imp)
+                            for feat, imp in lime_exp.as_list()
+                        }
+                    except Exception as e:
+                        logging.error(f"LIME explanation failed: {e}")
+                else:
+                    complete = False
+                    explanations[i]["explanation_truncated"] = True
+
+            # Rows cut short by the budget are recomputed next time
+            if complete:
+                with self._explain_cache_lock:
+                    self._explain_cache[keys[i]] = explanations[i]
+                    while len(self._explain_cache) > self.explain_cache_size:
+                        self._explain_cache.popitem(last=False)
+
+        return explanations
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+NOT_LOADED = 'not_loaded'
+LOADING = 'loading'
+LOADED = 'loaded'
+FAILED = 'failed'
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads each model once, on first use.
+
+    Components register a loader per model name and fetch the model through get(). When
+    the app is imported by a preloading server (gunicorn --preload), warming the registry
+    in the master process means every forked worker shares the loaded weights
+    copy-on-write instead of loading its own copy.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._status = {}
+        self._load_seconds = {}
+        self._errors = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Register a loader; registering the same name again keeps the first loader"""
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._status[name] = NOT_LOADED
+                self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it on first use. Returns None if loading failed."""
+        if self._status.get(name) == LOADED:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"No loader registered for model '{name}'")
+
+        with self._locks[name]:
+            status = self._status[name]
+            if status == LOADED:
+                return self._models[name]
+            if status == FAILED:
+                return None
+
+            self._status[name] = LOADING
+            start = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                logging.error(f"Loading model '{name}' failed: {e}")
+                self._errors[name] = str(e)
+                self._status[name] = FAILED
+                return None
+            self._load_seconds[name] = round(time.perf_counter() - start, 3)
+            self._models[name] = model
+            self._status[name] = LOADED
+            return model
+
+    def is_loaded(self, name: str) -> bool:
+        return self._status.get(name) == LOADED
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, background: bool = False) -> Optional[threading.Thread]:
+        """Load the given (default: all registered) models now, optionally on a daemon thread"""
+        names = list(names) if names is not None else list(self._loaders)
+
+        def load_all():
+            for name in names:
+                self.get(name)
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def ready(self, names: Optional[Iterable[str]] = None) -> bool:
+        """True once every given (default: registered) model has loaded successfully"""
+        names = list(names) if names is not None else list(self._loaders)
+        return all(self._status.get(name) == LOADED for name in names)
+
+    def failed(self) -> List[str]:
+        """Names of the models whose loader raised"""
+        return [name for name in list(self._loaders) if self._status.get(name) == FAILED]
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                'status': self._status[name],
+                'load_seconds': self._load_seconds.get(name),
+                'error': self._errors.get(name)
+            }
+            for name in list(self._loaders)
+        }
+
+
+registry = ModelRegistry()
@@ -1,102 +1,366 @@
+import numpy as np
 import spacy
 import torch
 from transformers import (
     AutoTokenizer, 
-    AutoModelForSequenceClassification,
-    pipeline
+    AutoModelForSequenceClassification
 )
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 import logging
-from concurrent.futures import ThreadPoolExecutor
-import json
-import requests
-import ipfshttpclient
+from collections import OrderedDict
+import hashlib
+import threading
 from web3.auto import w3
+import os
+from text_chunker import iter_windows, iter_token_windows, iter_blocks, WindowAggregator
+from model_registry import registry
+from storage_fetch import storage_fetcher
+from inference_backends import SharedEncoderBackend, can_share_encoder, load_backend, softmax
+from executors import get_executor
+
+FINBERT_MODEL_ID = "ProsusAI/finbert"
+FINBERT_ESG_MODEL_ID = "yiyanghkust/finbert-esg"
 
 class NLPProcessor:
     def __init__(self):
-        # Load models
-        self.nlp = spacy.load("en_core_web_sm")
-        self.finbert = pipeline("sentiment-analysis", 
-                              model="ProsusAI/finbert")
-        self.esg_tokenizer = AutoTokenizer.from_pretrained("yiyanghkust/finbert-esg")
-        self.esg_model = AutoModelForSequenceClassification.from_pretrained(
-            "yiyanghkust/finbert-esg"
-        )
+        # Models load on first use (or during warm-up) and are shared process-wide
+        # Both classifiers run on the NLP_BACKEND inference backend: torch, torch-int8, onnx or onnx-int8
+        self.backend = os.getenv('NLP_BACKEND', 'torch')
+        registry.register('spacy:en_core_web_sm', lambda: spacy.load("en_core_web_sm"))
+        registry.register('finbert', lambda: self._load_classifier('finbert', FINBERT_MODEL_ID))
+        registry.register('finbert_esg', lambda: self._load_classifier('finbert_esg', FINBERT_ESG_MODEL_ID))
         
-    def _process_ipfs_content(self, ipfs_hash: str) -> str:
-        """Fetch and process content from IPFS"""
-        try:
-            client = ipfshttpclient.connect()
-            content = client.cat(ipfs_hash)
-            return content.decode('utf-8')
-        except Exception as e:
-            logging.error(f"IPFS fetch error: {e}")
-            return ""
-
-    def _process_arweave_content(self, ar_id: str) -> str:
-        """Fetch and process content from Arweave"""
-        try:
-            response = requests.get(f"https://arweave.net/{ar_id}")
-            return response.text
-        except Exception as e:
-            logging.error(f"Arweave fetch error: {e}")
-            return ""
-
-    def analyze_text(self, text: str) -> Dict[str, Any]:
-        """Comprehensive NLP analysis of text"""
-        doc = self.nlp(text)
+        # Long documents are analyzed as overlapping windows instead of the first 512 characters
+        self.window_tokens = int(os.getenv('NLP_WINDOW_TOKENS', 510))
+        self.window_overlap = int(os.getenv('NLP_WINDOW_OVERLAP', 64))
+        self.batch_size = int(os.getenv('NLP_BATCH_SIZE', 16))
+        self.aggregation = os.getenv('NLP_AGGREGATION', 'attention')
+        self.spacy_block_chars = int(os.getenv('NLP_SPACY_BLOCK_CHARS', 10000))
+        self.spacy_max_chars = int(os.getenv('NLP_SPACY_MAX_CHARS', 200000))
+        self.spacy_batch_size = int(os.getenv('NLP_SPACY_BATCH_SIZE', 8))
+        # Only the tagger, parser and NER feed the outputs; other components are skipped
+        self.spacy_disable = [name for name in os.getenv('NLP_SPACY_DISABLE', 'lemmatizer').split(',') if name]
+        # Intra-op threads for every forward pass; 0 keeps torch's default of one per core
+        self.torch_threads = int(os.getenv('NLP_TORCH_THREADS', 0))
+        if self.torch_threads > 0:
+            torch.set_num_threads(self.torch_threads)
+        # 'combined' tokenizes each window once for both classifiers and scores identical
+        # windows once; 'separate' runs each classifier over its own tokenization
+        self.analysis_mode = os.getenv('NLP_ANALYSIS_MODE', 'combined')
+        self.token_cache_size = int(os.getenv('NLP_TOKEN_CACHE_SIZE', 256))
+        self._token_cache = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+        self._pairing = None
+        # Run the two classifiers side by side: 'true', 'false', or 'auto' when one forward
+        # pass leaves at least half the cores idle (concurrent passes raise peak memory)
+        self.concurrent_classifiers = os.getenv('NLP_CONCURRENT_CLASSIFIERS', 'auto').lower()
         
-        # Extract named entities
-        entities = {
-            ent.label_: ent.text 
-            for ent in doc.ents 
-            if ent.label_ in ['ORG', 'DATE', 'MONEY', 'PERCENT']
-        }
+    def _load_classifier(self, key: str, model_id: str):
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
         
-        # Get key phrases using noun chunks
-        key_phrases = [
-            chunk.text 
-            for chunk in doc.noun_chunks 
-            if len(chunk.text.split()) > 1
-        ]
+        def load_model():
+            model = AutoModelForSequenceClassification.from_pretrained(model_id)
+            model.eval()
+            return model
         
-        # Financial sentiment analysis
-        financial_sentiment = self.finbert(text[:512])[0]
+        return tokenizer, load_backend(self.backend, key, model_id, tokenizer, load_model)
+
+    @property
+    def nlp(self):
+        return registry.get('spacy:en_core_web_sm')
+
+    @property
+    def finbert_tokenizer(self):
+        return registry.get('finbert')[0]
+
+    @property
+    def finbert_backend(self):
+        return registry.get('finbert')[1]
+
+    @property
+    def esg_tokenizer(self):
+        return registry.get('finbert_esg')[0]
+
+    @property
+    def esg_backend(self):
+        return registry.get('finbert_esg')[1]
+
+    def _classify_windows(self, windows: List[Tuple[int, str]], tokenizer, backend,
+                          doc_count: int) -> List[WindowAggregator]:
+        """
+        Score (document index, window) pairs from any number of documents in shared
+        padded batches, and aggregate the window scores per document.
+        """
+        id2label = backend.config.id2label
+        labels = [id2label[i] for i in sorted(id2label)]
+        aggregators = [WindowAggregator(labels) for _ in range(doc_count)]
+        # Windows of similar length share a batch, so little compute goes to padding
+        order = sorted(range(len(windows)), key=lambda k: len(windows[k][1]))
+        for start in range(0, len(order), self.batch_size):
+            batch = [windows[k] for k in order[start:start + self.batch_size]]
+            inputs = tokenizer(
+                [text for _, text in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.window_tokens + 2,
+                return_tensors="pt"
+            )
+            scores = softmax(backend.logits(inputs))
+            docs = np.array([doc for doc, _ in batch])
+            for doc in np.unique(docs):
+                aggregators[doc].update(scores[docs == doc])
+        return aggregators
+
+    def _windows(self, texts: List[str], tokenizer) -> List[Tuple[int, str]]:
+        return [
+            (doc, window)
+            for doc, text in enumerate(texts)
+            for window in iter_windows(text, tokenizer, self.window_tokens, self.window_overlap)
+        ]
+
+    def _token_windows(self, text: str, tokenizer) -> List[Tuple[str, Optional[Tuple[int, ...]]]]:
+        """Windows of one document with their token ids, from an LRU cache keyed by the text hash"""
+        key = (
+            tokenizer.name_or_path, self.window_tokens, self.window_overlap,
+            hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+        )
+        with self._token_cache_lock:
+            windows = self._token_cache.get(key)
+            if windows is not None:
+                self._token_cache.move_to_end(key)
+                return windows
+        windows = [
+            (window, tuple(ids) if ids is not None else None)
+            for window, ids in iter_token_windows(text, tokenizer, self.window_tokens, self.window_overlap)
+        ]
+        with self._token_cache_lock:
+            self._token_cache[key] = windows
+            while len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        return windows
+
+    def _unique_windows(self, texts: List[str], tokenizer) -> Tuple[List[Tuple[str, Optional[Tuple[int, ...]]]],
+                                                                     np.ndarray, np.ndarray]:
+        """
+        Distinct windows across all documents, plus one (window index, document index)
+        pair per occurrence, so repeated boilerplate is scored once but counted every time.
+        """
+        index, unique, rows, docs = {}, [], [], []
+        for doc, text in enumerate(texts):
+            for window in self._token_windows(text, tokenizer):
+                key = window[1] if window[1] is not None else window[0]
+                if key not in index:
+                    index[key] = len(unique)
+                    unique.append(window)
+                rows.append(index[key])
+                docs.append(doc)
+        return unique, np.array(rows, dtype=np.int64), np.array(docs, dtype=np.int64)
+
+    def _encode(self, batch: List[Tuple[str, Optional[Tuple[int, ...]]]], tokenizer) -> Dict[str, Any]:
+        """Model inputs for a batch of windows, built from their cached token ids when possible"""
+        if tokenizer.cls_token_id is None or tokenizer.sep_token_id is None or any(ids is None for _, ids in batch):
+            return tokenizer(
+                [text for text, _ in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.window_tokens + 2,
+                return_tensors="pt"
+            )
+        length = max(len(ids) for _, ids in batch) + 2
+        input_ids = torch.full((len(batch), length), tokenizer.pad_token_id or 0, dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        for row, (_, ids) in enumerate(batch):
+            input_ids[row, :len(ids) + 2] = torch.tensor([tokenizer.cls_token_id, *ids, tokenizer.sep_token_id])
+            attention_mask[row, :len(ids) + 2] = 1
+        inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in tokenizer.model_input_names:
+            inputs['token_type_ids'] = torch.zeros_like(input_ids)
+        return inputs
+
+    def _batches(self, windows: List[Tuple[str, Optional[Tuple[int, ...]]]]) -> List[np.ndarray]:
+        # Windows of similar length share a batch, so little compute goes to padding
+        order = np.argsort([len(ids) if ids is not None else len(text) for text, ids in windows], kind='stable')
+        return [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+    def _score(self, windows, tokenizer, backend) -> np.ndarray:
+        """Class probabilities for each window, in input order"""
+        scores = np.zeros((len(windows), len(backend.config.id2label)))
+        for batch in self._batches(windows):
+            scores[batch] = softmax(backend.logits(self._encode([windows[k] for k in batch], tokenizer)))
+        return scores
+
+    def _concurrent(self) -> bool:
+        if self.concurrent_classifiers == 'auto':
+            return torch.get_num_threads() * 2 <= (os.cpu_count() or 1)
+        return self.concurrent_classifiers == 'true'
+
+    def _score_pair(self, windows, tokenizer, sentiment_backend, esg_backend, shared) -> Tuple[np.ndarray, np.ndarray]:
+        """Both classifiers on the same encoded batches: one encoder pass if shared, else side by side"""
+        concurrent = self._concurrent()
+        sentiment = np.zeros((len(windows), len(sentiment_backend.config.id2label)))
+        esg = np.zeros((len(windows), len(esg_backend.config.id2label)))
+        for batch in self._batches(windows):
+            inputs = self._encode([windows[k] for k in batch], tokenizer)
+            if shared is not None:
+                sentiment_logits, esg_logits = shared.logits(inputs)
+            elif not concurrent:
+                sentiment_logits, esg_logits = sentiment_backend.logits(inputs), esg_backend.logits(inputs)
+            else:
+                pending = get_executor('classifier').submit(esg_backend.logits, inputs)
+                sentiment_logits = sentiment_backend.logits(inputs)
+                esg_logits = pending.result()
+            sentiment[batch], esg[batch] = softmax(sentiment_logits), softmax(esg_logits)
+        return sentiment, esg
+
+    def _paired_models(self) -> Tuple[bool, Optional[SharedEncoderBackend]]:
+        """Whether both classifiers use the same tokenizer, and a shared encoder if their weights allow one"""
+        sentiment_tokenizer, esg_tokenizer = self.finbert_tokenizer, self.esg_tokenizer
+        sentiment_backend, esg_backend = self.finbert_backend, self.esg_backend
+        key = (id(sentiment_backend), id(esg_backend))
+        if self._pairing is None or self._pairing[0] != key:
+            same_tokenizer = (
+                hasattr(sentiment_tokenizer, 'backend_tokenizer') and hasattr(esg_tokenizer, 'backend_tokenizer')
+                and sentiment_tokenizer.backend_tokenizer.to_str() == esg_tokenizer.backend_tokenizer.to_str()
+            )
+            shared = None
+            if same_tokenizer and can_share_encoder(sentiment_backend, esg_backend):
+                shared = SharedEncoderBackend(sentiment_backend, esg_backend)
+            logging.info(f"Combined analysis: shared tokenizer {same_tokenizer}, shared encoder {shared is not None}")
+            self._pairing = (key, same_tokenizer, shared)
+        return self._pairing[1], self._pairing[2]
+
+    def _aggregate(self, scores: np.ndarray, rows: np.ndarray, docs: np.ndarray, labels: List[str],
+                   doc_count: int) -> List[WindowAggregator]:
+        aggregators = [WindowAggregator(labels) for _ in range(doc_count)]
+        for doc in np.unique(docs):
+            aggregators[doc].update(scores[rows[docs == doc]])
+        return aggregators
+
+    def _classify_combined(self, texts: List[str]) -> Tuple[List[WindowAggregator], List[WindowAggregator]]:
+        """
+        Sentiment and ESG window scores per document with each window tokenized once and
+        each distinct window scored once. With a common tokenizer both classifiers read the
+        same batches; otherwise each scores its own windows, concurrently if allowed.
+        """
+        same_tokenizer, shared = self._paired_models()
+        sentiment_tokenizer, esg_tokenizer = self.finbert_tokenizer, self.esg_tokenizer
+        sentiment_backend, esg_backend = self.finbert_backend, self.esg_backend
+        sentiment_labels = [sentiment_backend.config.id2label[i] for i in sorted(sentiment_backend.config.id2label)]
+        esg_labels = [esg_backend.config.id2label[i] for i in sorted(esg_backend.config.id2label)]
+
+        if same_tokenizer:
+            windows, rows, docs = self._unique_windows(texts, sentiment_tokenizer)
+            sentiment_scores, esg_scores = self._score_pair(
+                windows, sentiment_tokenizer, sentiment_backend, esg_backend, shared
+            )
+            return (self._aggregate(sentiment_scores, rows, docs, sentiment_labels, len(texts)),
+                    self._aggregate(esg_scores, rows, docs, esg_labels, len(texts)))
+
+        def classify(tokenizer, backend, labels):
+            windows, rows, docs = self._unique_windows(texts, tokenizer)
+            return self._aggregate(self._score(windows, tokenizer, backend), rows, docs, labels, len(texts))
+
+        if not self._concurrent():
+            return (classify(sentiment_tokenizer, sentiment_backend, sentiment_labels),
+                    classify(esg_tokenizer, esg_backend, esg_labels))
+        pending = get_executor('classifier').submit(classify, esg_tokenizer, esg_backend, esg_labels)
+        sentiments = classify(sentiment_tokenizer, sentiment_backend, sentiment_labels)
+        return sentiments, pending.result()
+
+    def _spacy_features(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Entities, key phrases and summary per document from one nlp.pipe stream"""
+        features = [{'entities': {}, 'key_phrases': [], 'summary': ''} for _ in texts]
+        # spaCy works block by block so multi-MB pages never become one giant Doc
+        blocks = (
+            (block, doc)
+            for doc, text in enumerate(texts)
+            for block in iter_blocks(text[:self.spacy_max_chars], self.spacy_block_chars)
+        )
+        disable = [name for name in self.spacy_disable if name in self.nlp.pipe_names]
+        for spacy_doc, doc in self.nlp.pipe(blocks, as_tuples=True, batch_size=self.spacy_batch_size,
+                                            disable=disable):
+            feature = features[doc]
+            # Extract named entities
+            feature['entities'].update({
+                ent.label_: ent.text 
+                for ent in spacy_doc.ents 
+                if ent.label_ in ['ORG', 'DATE', 'MONEY', 'PERCENT']
+            })
+            
+            # Get key phrases using noun chunks
+            if spacy_doc.has_annotation('DEP'):
+                feature['key_phrases'].extend(
+                    chunk.text 
+                    for chunk in spacy_doc.noun_chunks 
+                    if len(chunk.text.split()) > 1
+                )
+            if not feature['summary']:
+                feature['summary'] = ' '.join(sent.text for sent in spacy_doc.sents)[:200]
+        return features
+
+    def analyze_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        NLP analysis of several documents at once.
+
+        spaCy runs over all documents as one nlp.pipe stream with unused components
+        disabled. The FinBERT sentiment and finbert-esg windows of every document are
+        scored in shared padded batches on the configured inference backend; in the
+        default combined mode they are tokenized once and shared by both classifiers.
+        """
+        texts = [' '.join(text.split()) for text in texts]
+        features = self._spacy_features(texts)
         
-        # ESG classification
-        esg_inputs = self.esg_tokenizer(text[:512], return_tensors="pt")
-        esg_outputs = self.esg_model(**esg_inputs)
-        esg_scores = torch.nn.functional.softmax(esg_outputs.logits, dim=1)
+        if self.analysis_mode == 'combined':
+            sentiments, esg_aggregators = self._classify_combined(texts)
+        else:
+            # Financial sentiment analysis
+            sentiments = self._classify_windows(
+                self._windows(texts, self.finbert_tokenizer), self.finbert_tokenizer, self.finbert_backend, len(texts)
+            )
+            
+            # ESG classification
+            esg_aggregators = self._classify_windows(
+                self._windows(texts, self.esg_tokenizer), self.esg_tokenizer, self.esg_backend, len(texts)
+            )
         
         esg_categories = ['Environmental', 'Social', 'Governance']
-        esg_classification = {
-            cat: float(score)
-            for cat, score in zip(esg_categories, esg_scores[0])
-        }
-        
-        return {
-            'entities': entities,
-            'key_phrases': key_phrases,
-            'sentiment': {
-                'label': financial_sentiment['label'],
-                'score': float(financial_sentiment['score'])
-            },
-            'esg_classification': esg_classification,
-            'summary': ' '.join(sent.text for sent in doc.sents)[:200]
-        }
+        results = []
+        for feature, sentiment, esg in zip(features, sentiments, esg_aggregators):
+            sentiment_vector = sentiment.vector(self.aggregation)
+            best_sentiment = int(sentiment_vector.argmax()) if sentiment.count else 0
+            esg_result = esg.result()
+            results.append({
+                'entities': feature['entities'],
+                'key_phrases': feature['key_phrases'],
+                'sentiment': {
+                    'label': sentiment.labels[best_sentiment],
+                    'score': float(sentiment_vector[best_sentiment]) if sentiment.count else 0.0
+                },
+                'sentiment_scores': sentiment.result(),
+                'esg_classification': {
+                    cat: esg_result[self.aggregation].get(cat, 0.0)
+                    for cat in esg_categories
+                },
+                'esg_scores': esg_result,
+                'summary': feature['summary']
+            })
+        return results
+
+    def analyze_text(self, text: str) -> Dict[str, Any]:
+        """Comprehensive NLP analysis of text"""
+        return self.analyze_many([text])[0]
+
+    def fetch_decentralized_storage(self, url: str) -> Optional[str]:
+        """Fetch raw content from decentralized storage (node, then gateways, cached by address)"""
+        try:
+            return storage_fetcher.fetch(url)
+        except Exception as e:
+            logging.error(f"Storage fetch error: {e}")
+            return None
 
     def process_decentralized_storage(self, url: str) -> Dict[str, Any]:
         """Process content from decentralized storage"""
-        if 'ipfs://' in url:
-            ipfs_hash = url.replace('ipfs://', '')
-            content = self._process_ipfs_content(ipfs_hash)
-        elif 'ar://' in url:
-            ar_id = url.replace('ar://', '')
-            content = self._process_arweave_content(ar_id)
-        else:
-            return None
-            
+        content = self.fetch_decentralized_storage(url)
         if content:
             return self.analyze_text(content)
         return None
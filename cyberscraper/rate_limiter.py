@@ -0,0 +1,60 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe token buckets for provider quotas: requests per minute and, optionally,
+    prompt tokens per minute. acquire() blocks until both buckets can cover the call.
+    A limit of None or <= 0 leaves that dimension unlimited.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float], tokens_per_minute: Optional[float] = None):
+        self.requests_per_minute = requests_per_minute if requests_per_minute and requests_per_minute > 0 else None
+        self.tokens_per_minute = tokens_per_minute if tokens_per_minute and tokens_per_minute > 0 else None
+        self._requests = float(self.requests_per_minute or 0)
+        self._tokens = float(self.tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waited = 0.0
+        self._acquired = 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute,
+                                 self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of the given token cost is allowed; returns seconds waited"""
+        if self.tokens_per_minute:
+            # A call larger than the whole bucket could never proceed otherwise
+            tokens = min(tokens, self.tokens_per_minute)
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                request_wait = ((1 - self._requests) * 60 / self.requests_per_minute
+                                if self.requests_per_minute else 0.0)
+                token_wait = ((tokens - self._tokens) * 60 / self.tokens_per_minute
+                              if self.tokens_per_minute else 0.0)
+                wait = max(request_wait, token_wait, 0.0)
+                if wait == 0.0:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens
+                    waited = now - start
+                    self._waited += waited
+                    self._acquired += 1
+                    return waited
+            time.sleep(wait)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {'acquired': self._acquired, 'waited_seconds': round(self._waited, 3)}
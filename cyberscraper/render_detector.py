@@ -0,0 +1,102 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from html_document import ParsedDocument, parse_document
+
+# Empty mount points left by client-side frameworks (React, Vue, Next, Nuxt, Angular, Svelte)
+SPA_ROOT_PATTERN = re.compile(
+    r'<(div|main|app-root)[^>]*\bid=["\'](root|app|__next|__nuxt|svelte|main-app)["\'][^>]*>\s*</\1>'
+    r'|<app-root[^>]*>\s*</app-root>',
+    re.IGNORECASE
+)
+SPA_HINT_PATTERN = re.compile(r'ng-version=|data-reactroot|window\.__NUXT__|__NEXT_DATA__|data-server-rendered', re.IGNORECASE)
+NOSCRIPT_HINT_PATTERN = re.compile(
+    r'(enable|requires?|need|turn on)[^<]{0,40}javascript|javascript[^<]{0,40}(required|disabled|enabled)',
+    re.IGNORECASE
+)
+
+# Reasons that show the site itself renders client-side; a short or script-heavy page does not
+STRONG_REASONS = ('spa_root', 'noscript_hint')
+
+
+def _section(url: str) -> Tuple[str, str]:
+    """(host, first path segment): the unit a client-render decision is remembered for"""
+    parsed = urlparse(url)
+    return parsed.netloc, parsed.path.strip('/').split('/', 1)[0]
+
+
+class RenderDetector:
+    """Decides whether a page needs Chrome rendering or its static HTML is enough"""
+
+    def __init__(self, min_text_chars: int = None, min_text_ratio: float = None, host_ttl: float = None):
+        """
+        Args:
+            min_text_chars: Visible text below this means the static page is empty (RENDER_MIN_TEXT_CHARS, default 500)
+            min_text_ratio: Visible text / HTML size below this is script-heavy (RENDER_MIN_TEXT_RATIO, default 0.02)
+            host_ttl: Seconds a client-render signal is remembered for the pages under the same
+                host and first path segment (RENDER_HOST_TTL, default 3600)
+        """
+        self.min_text_chars = min_text_chars or int(os.getenv('RENDER_MIN_TEXT_CHARS', 500))
+        self.min_text_ratio = min_text_ratio or float(os.getenv('RENDER_MIN_TEXT_RATIO', 0.02))
+        self.host_ttl = host_ttl or float(os.getenv('RENDER_HOST_TTL', 3600))
+        self._host_decisions = {}
+        self._lock = threading.Lock()
+        self._stats = {'pages': 0, 'rendered': 0, 'static': 0, 'host_cache_hits': 0, 'reasons': {}}
+
+    def _analyze(self, document: ParsedDocument) -> Tuple[bool, str]:
+        html = document.html
+        noscript_text = document.noscript_text
+        text_len = document.text_length
+
+        if text_len < self.min_text_chars:
+            if SPA_ROOT_PATTERN.search(html) or SPA_HINT_PATTERN.search(html):
+                return True, 'spa_root'
+            if NOSCRIPT_HINT_PATTERN.search(noscript_text):
+                return True, 'noscript_hint'
+            return True, 'low_text'
+        if NOSCRIPT_HINT_PATTERN.search(noscript_text) and SPA_ROOT_PATTERN.search(html):
+            return True, 'noscript_hint'
+        if text_len / max(len(html), 1) < self.min_text_ratio:
+            return True, 'low_text_density'
+        return False, 'static_sufficient'
+
+    def needs_js(self, url: str, page: Optional[Union[str, ParsedDocument]]) -> Tuple[bool, str]:
+        """
+        Return (needs_rendering, reason) for a statically fetched page (HTML or parsed document).
+        The static checks always run first. Only a strong client-render signal (an empty SPA
+        root or a noscript notice) is remembered, and only for the host and first path
+        segment, so one short page cannot send the rest of the site to Chrome.
+        """
+        section = _section(url)
+        now = time.monotonic()
+
+        if not page or (isinstance(page, ParsedDocument) and not page.html):
+            decision, reason = True, 'no_static_html'
+        else:
+            document = page if isinstance(page, ParsedDocument) else parse_document(page, url)
+            decision, reason = self._analyze(document)
+            with self._lock:
+                if reason in STRONG_REASONS:
+                    self._host_decisions[section] = now
+                elif not decision:
+                    cached = self._host_decisions.get(section)
+                    if cached is not None and now - cached < self.host_ttl:
+                        # Enough static text, but this part of the site is known to render client-side
+                        decision, reason = True, 'host_cached'
+                        self._stats['host_cache_hits'] += 1
+
+        with self._lock:
+            self._stats['pages'] += 1
+            self._stats['rendered' if decision else 'static'] += 1
+            self._stats['reasons'][reason] = self._stats['reasons'].get(reason, 0) + 1
+        return decision, reason
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self._stats, 'reasons': dict(self._stats['reasons'])}
+        stats['render_avoided_ratio'] = round(stats['static'] / stats['pages'], 4) if stats['pages'] else 0.0
+        return stats
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from sqlite_store import SQLiteStore, cache_path
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def simhash(text: str, shingle_size: int = 3) -> Optional[int]:
+    """64-bit SimHash over word shingles; None when the text is too short to compare"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < shingle_size * 4:
+        return None
+
+    shingles = {' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+         for shingle in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    # Per bit position: +1 for every shingle hash with the bit set, -1 otherwise
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int(np.packbits(votes > 0, bitorder='little').view('<u8')[0])
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _bands(fingerprint: int) -> Tuple[int, ...]:
+    return tuple((fingerprint >> (band * _BAND_BITS)) & _BAND_MASK for band in range(SIMHASH_BANDS))
+
+
+class ResponseCache(SQLiteStore):
+    """
+    Persistent cache of structured LLM responses, shared by all worker processes.
+
+    Responses are keyed by a hash of (namespace, normalized input text), where the
+    namespace covers the model and prompt version. Each entry also stores a SimHash of
+    the input. A lookup that misses exactly can then reuse the response of a
+    near-duplicate page, e.g. one that differs from a cached page only in a date or a
+    counter. Near-duplicates are found through SIMHASH_BANDS indexed bands. Any
+    fingerprint within max_distance < SIMHASH_BANDS bits shares at least one band
+    exactly.
+    """
+
+    table = 'responses'
+
+    def __init__(self, path: str = None, max_entries: int = None, max_distance: int = None):
+        """
+        Args:
+            path: SQLite file (CLEANER_CACHE_PATH env, default $CACHE_DIR/cleaner.sqlite)
+            max_entries: Entries kept before LRU eviction (CLEANER_CACHE_MAX_ENTRIES env, default 50000)
+            max_distance: SimHash bits that may differ for a near-duplicate hit; 0 disables
+                near-duplicate reuse (CLEANER_SIMHASH_DISTANCE env, default 3)
+        """
+        super().__init__(path or cache_path('CLEANER_CACHE_PATH', 'cleaner.sqlite'),
+                         max_entries or int(os.getenv('CLEANER_CACHE_MAX_ENTRIES', 50000)))
+        self.max_distance = (max_distance if max_distance is not None
+                             else int(os.getenv('CLEANER_SIMHASH_DISTANCE', 3)))
+        self.max_distance = min(self.max_distance, SIMHASH_BANDS - 1)
+        self._stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0}
+        band_columns = ', '.join(f'band{band} INTEGER' for band in range(SIMHASH_BANDS))
+        with self._connection() as conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    simhash INTEGER,
+                    {band_columns},
+                    response TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            for band in range(SIMHASH_BANDS):
+                conn.execute(f'CREATE INDEX IF NOT EXISTS responses_band{band} ON responses (namespace, band{band})')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+
+    @staticmethod
+    def make_key(namespace: str, text: str) -> str:
+        return hashlib.sha256(f"{namespace}\x00{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+    def get(self, namespace: str, text: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for text, or for a near-duplicate of it"""
+        key = self.make_key(namespace, text)
+        stat = 'misses'
+        response = None
+        try:
+            conn = self._connection()
+            row = conn.execute('SELECT key, response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                stat = 'hits'
+            elif self.max_distance > 0:
+                row = self._find_near_duplicate(conn, namespace, simhash(text))
+                if row is not None:
+                    stat = 'near_hits'
+            if row is not None:
+                response = json.loads(row[1])
+                with conn:
+                    conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), row[0]))
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Response cache read failed: {e}")
+
+        with self._lock:
+            self._stats[stat] += 1
+        return response
+
+    def _find_near_duplicate(self, conn: sqlite3.Connection, namespace: str,
+                             fingerprint: Optional[int]) -> Optional[Tuple[str, str]]:
+        if fingerprint is None:
+            return None
+        conditions = ' OR '.join(f'band{band} = ?' for band in range(SIMHASH_BANDS))
+        best, best_distance = None, self.max_distance + 1
+        for key, candidate, response in conn.execute(
+            f'SELECT key, simhash, response FROM responses WHERE namespace = ? AND ({conditions})',
+            (namespace, *_bands(fingerprint))
+        ):
+            distance = bin((candidate & ((1 << 64) - 1)) ^ fingerprint).count('1')
+            if distance < best_distance:
+                best, best_distance = (key, response), distance
+        return best
+
+    def put(self, namespace: str, text: str, response: Dict[str, Any]) -> None:
+        fingerprint = simhash(text)
+        bands = _bands(fingerprint) if fingerprint is not None else (None,) * SIMHASH_BANDS
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    f'INSERT OR REPLACE INTO responses (key, namespace, simhash, '
+                    f'{", ".join(f"band{band}" for band in range(SIMHASH_BANDS))}, response, last_access) '
+                    f'VALUES (?, ?, ?, {", ".join("?" * SIMHASH_BANDS)}, ?, ?)',
+                    (self.make_key(namespace, text), namespace,
+                     _signed(fingerprint) if fingerprint is not None else None,
+                     *bands, json.dumps(response), time.time())
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Response cache write failed: {e}")
+            return
+        self._wrote()
+
+    def evict(self) -> int:
+        """Drop least-recently-used responses until back under 90% of max_entries"""
+        removed = super().evict()
+        with self._lock:
+            self._stats['evictions'] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['near_hits']) / lookups, 4) if lookups else 0.0
+        try:
+            stats['entries'] = self._connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        except sqlite3.Error as e:
+            logging.error(f"Response cache stats failed: {e}")
+        return stats
@@ -1,5 +1,4 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import random
 from fake_useragent import UserAgent
@@ -10,7 +9,7 @@ import socket
 from stem import Signal
 from stem.control import Controller
 from content_analyzer import ContentAnalyzer
-from urllib.parse import urljoin
+from urllib.parse import urldefrag, urljoin, urlsplit
 import asyncio
 import aiohttp
 from data_cleaner import DataCleaner
@@ -18,16 +17,23 @@ import os
 from dotenv import load_dotenv
 from ml_esg_scorer import MLESGScorer
 from advanced_scraper import AdvancedScraper
-from selenium import webdriver
+from driver_pool import DriverPool
+from executors import run_io, run_model
+from html_document import parse_document
+from streaming_fetch import streaming_fetcher
+from http_cache import AnalysisStore
+from text_extraction import ExtractionStats, remove_boilerplate
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from typing import Dict, Any, Optional
-from functools import lru_cache
 
 load_dotenv()
 
+# Bump whenever the pipeline's output changes, so stored analyses of unchanged pages are recomputed
+ANALYSIS_VERSION = '1'
+
 class CyberScraper:
     def __init__(self):
         self.proxy_manager = ProxyManager()
@@ -39,6 +45,13 @@ class CyberScraper:
         self.data_cleaner = DataCleaner(os.getenv('GEMINI_API_KEY'))
         self.esg_scorer = MLESGScorer()
         self.advanced_scraper = AdvancedScraper()
+        self._tor_driver_pool = None
+        self.extraction_stats = ExtractionStats()
+        self.fetcher = streaming_fetcher
+        # Re-scrapes of unchanged pages return the stored analysis (ANALYSIS_STORE=false disables)
+        self.analysis_store = AnalysisStore() if os.getenv('ANALYSIS_STORE', 'true').lower() == 'true' else None
+        self.batch_max_concurrency = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+        self.batch_per_host_concurrency = int(os.getenv('BATCH_PER_HOST_CONCURRENCY', 2))
         self.categories = [
             "sustainability",
             "environmental",
@@ -85,69 +98,330 @@ class CyberScraper:
             'Upgrade-Insecure-Requests': '1',
         }
         
-    async def _scrape_tab(self, session, url):
+    async def _fetch_tab(self, session, url):
+        """Fetch a tab without a browser and extract its basic content"""
         try:
-            # Get basic content first
-            async with session.get(url, headers=self._get_headers()) as response:
-                text = await response.text()
-                soup = BeautifulSoup(text, 'html.parser')
-                
-                content = {
-                    'url': url,
-                    'title': soup.title.string if soup.title else '',
-                    'text_content': ' '.join([p.get_text() for p in soup.find_all(['p', 'div', 'section'])]),
-                    'headers': [h.get_text() for h in soup.find_all(['h1', 'h2', 'h3'])]
-                }
-                
-                # Use advanced scraping capabilities
-                advanced_results = await self.advanced_scraper.scrape_project(url)
+            document = await self.fetcher.fetch_document(session, url, self._get_headers())
+            if document is None:
+                return None
+            content = {
+                'url': url,
+                'title': document.title,
+                'text_content': document.text_content,
+                'headers': document.headings
+            }
+            return content, document
+        except Exception as e:
+            logging.error(f"Tab fetch error: {str(e)}")
+            return None
+
+    async def _structure(self, text, structuring=None):
+        """Structuring (Gemini or local); ESG scoring runs later, batched across the site's tabs"""
+        # The local engine is model inference; Gemini is a remote call
+        run = run_model if (structuring or self.data_cleaner.engine) == 'local' else run_io
+        return await run(self.data_cleaner.structure_scraped_data, text, structuring) or None
+        
+    async def _scrape_tab(self, url, content, document, filtered_content, structuring=None, rendered=None,
+                          decision=None, session=None):
+        """Run the remaining pipeline for a tab that passed relevance filtering"""
+        try:
+            # Run the advanced (JS-rendering) pipeline alongside structuring
+            advanced_results, cleaned_data, relevance = await asyncio.gather(
+                self.advanced_scraper.scrape_project(url, static_document=document, rendered=rendered,
+                                                     decision=decision, session=session),
+                self._structure(content['text_content'], structuring),
+                run_model(self.content_analyzer.score_document, {
+                    'title': content['title'] or '',
+                    'headers': ' '.join(content['headers']),
+                    'text_content': content['text_content']
+                }, self.categories)
+            )
+            
+            # Chunked per-document and per-section category scores
+            filtered_content['relevance'] = relevance
+            if cleaned_data:
+                filtered_content['cleaned_data'] = cleaned_data
                 
-                # Merge the results
-                filtered_content = self.content_analyzer.filter_content(content, self.categories)
-                if filtered_content:
-                    cleaned_data = self.data_cleaner.structure_scraped_data(
-                        filtered_content.get('text_content', '')
-                    )
-                    if cleaned_data:
-                        filtered_content['cleaned_data'] = cleaned_data
-                        filtered_content['ml_esg_analysis'] = self.esg_scorer.calculate_esg_score(cleaned_data)
-                        
-                    # Add advanced analysis results
-                    filtered_content['advanced_analysis'] = {
-                        'nlp_results': advanced_results['web_content'],
-                        'decentralized_storage': advanced_results['decentralized_storage'],
-                        'graphql_data': advanced_results['graphql_data']
-                    }
-                    
-                return filtered_content
+            # Add advanced analysis results
+            filtered_content['advanced_analysis'] = {
+                'nlp_results': advanced_results['web_content'],
+                'decentralized_storage': advanced_results['decentralized_storage'],
+                'graphql_data': advanced_results['graphql_data'],
+                'render_path': advanced_results['render_path'],
+                'render_reason': advanced_results['render_reason'],
+                'content_hash': advanced_results['content_hash']
+            }
+            
+            return filtered_content
         except Exception as e:
             logging.error(f"Tab scraping error: {str(e)}")
             return None
 
-    async def _scrape_all_tabs(self, base_url):
-        async with aiohttp.ClientSession() as session:
-            soup = BeautifulSoup(await (await session.get(base_url)).text(), 'html.parser')
-            nav_links = [
-                urljoin(base_url, a['href']) 
-                for a in soup.find_all('a', href=True) 
-                if 'about' in a['href'].lower() or 
-                   'sustainability' in a['href'].lower() or
-                   'governance' in a['href'].lower() or
-                     'esg' in a['href'].lower() or
-                     'social' in a['href'].lower() or
-                        'environment' in a['href'].lower() or
-                        'sustainable' in a['href'].lower() or
-                        'responsibility' in a['href'].lower() or
-                        'blockchain' in a['href'].lower() or
-                        'crypto' in a['href'].lower()
-                        
-            ]
+    async def _scrape_all_tabs(self, base_url, progress_callback=None, cancel_event=None, session=None,
+                               structuring=None, explain=None):
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self._scrape_all_tabs(base_url, progress_callback, cancel_event, session, structuring,
+                                                   explain)
+        
+        document = await self.fetcher.fetch_document(session, base_url, self._get_headers())
+        if document is None:
+            return {}
+        home = self._normalize_link(base_url, base_url)
+        nav_links = [
+            self._normalize_link(base_url, href) 
+            for href in document.links 
+            if 'about' in href.lower() or 
+               'sustainability' in href.lower() or
+               'governance' in href.lower() or
+                 'esg' in href.lower() or
+                 'social' in href.lower() or
+                    'environment' in href.lower() or
+                    'sustainable' in href.lower() or
+                    'responsibility' in href.lower() or
+                    'blockchain' in href.lower() or
+                    'crypto' in href.lower()
+                    
+        ]
+        # The home page itself (e.g. an "About" anchor on it) is not a tab
+        nav_links = [link for link in nav_links if link != home]
+        
+        return await self._scrape_tabs_tracked(session, nav_links, progress_callback, cancel_event, structuring,
+                                               explain)
+
+    @staticmethod
+    def _normalize_link(base_url, href):
+        """Absolute link without fragment or trailing slash, so one tab is not scraped under several URLs"""
+        parts = urlsplit(urldefrag(urljoin(base_url, href))[0])
+        return parts._replace(path=parts.path.rstrip('/')).geturl()
+
+    async def _scrape_tabs_tracked(self, session, nav_links, progress_callback=None, cancel_event=None,
+                                   structuring=None, explain=None):
+        """Scrape tabs concurrently, reporting each one as it finishes and stopping on cancellation"""
+        def report(url, status, result=None):
+            if progress_callback:
+                progress_callback(url, status, result)
+        
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+        
+        nav_links = list(dict.fromkeys(nav_links))
+        for url in nav_links:
+            report(url, 'pending')
+        
+        fetched = await asyncio.gather(*[self._fetch_tab(session, url) for url in nav_links])
+        pages = {url: page for url, page in zip(nav_links, fetched) if page}
+        
+        # Shared headers, footers and navigation are dropped before any model sees them
+        kept_blocks, extraction = remove_boilerplate(
+            {url: document.blocks for url, (_, document) in pages.items()},
+            content_hashes={url: document.content_hash for url, (_, document) in pages.items()}
+        )
+        for url, (content, document) in pages.items():
+            document.blocks = kept_blocks[url]
+            content['text_content'] = document.text_content
+        self.extraction_stats.record(extraction)
+        logging.info(f"Boilerplate removal saved {extraction['bytes_saved']} of "
+                     f"{extraction['bytes_before']} bytes across {extraction['pages']} tabs")
+        
+        # Tabs whose page and boilerplate-free text match a previous run reuse that run's outputs.
+        # A browser-rendered tab's outputs come from Chrome's HTML, so they are keyed by its hash too.
+        engine = structuring or self.data_cleaner.engine
+        explain = self.esg_scorer.explain_by_default if explain is None else explain
+        decisions = {
+            url: self.advanced_scraper.render_detector.needs_js(url, document)
+            for url, (_, document) in pages.items()
+        }
+        fingerprints = {
+            url: self._analysis_fingerprint('tab', engine, explain, url, document.content_hash,
+                                            content['text_content'], 'browser' if decisions[url][0] else 'static')
+            for url, (content, document) in pages.items()
+        }
+        reused = {}
+        renders = {}
+        if self.analysis_store is not None:
+            to_render = []
+            for url, fingerprint in fingerprints.items():
+                stored = self.analysis_store.get(fingerprint)
+                if stored is None:
+                    continue
+                if stored.get('rendered'):
+                    to_render.append(url)
+                else:
+                    reused[url] = stored['result']
+            rendered = await asyncio.gather(*[
+                self.advanced_scraper.render(url, pages[url][1], decisions[url]) for url in to_render
+            ])
+            for url, render in zip(to_render, rendered):
+                renders[url] = render
+                if render['document'] is None:
+                    continue
+                stored = self.analysis_store.get(
+                    self._analysis_fingerprint(fingerprints[url], render['document'].content_hash)
+                )
+                if stored is not None:
+                    reused[url] = stored['result']
+        changed = {url: page for url, page in pages.items() if url not in reused}
+        if pages:
+            logging.info(f"Reusing stored analysis for {len(reused)} of {len(pages)} unchanged tabs")
+        
+        def remember(url, result):
+            if self.analysis_store is None:
+                return
+            if result is None or not decisions[url][0]:
+                self.analysis_store.put(fingerprints[url], {'result': result})
+                return
+            rendered_hash = result['advanced_analysis']['content_hash']
+            if rendered_hash is not None:
+                self.analysis_store.put(fingerprints[url], {'rendered': True})
+                self.analysis_store.put(self._analysis_fingerprint(fingerprints[url], rendered_hash),
+                                        {'result': result})
+        
+        # Classify every changed tab of the site in a single embedding batch
+        filtered = []
+        if changed and not cancelled():
+            filtered = await run_model(
+                self.content_analyzer.filter_contents,
+                [content for content, _ in changed.values()],
+                self.categories
+            )
+        
+        async def scrape_one(url, content, document, filtered_content):
+            return url, await self._scrape_tab(url, content, document, filtered_content, structuring,
+                                               renders.get(url), decisions[url], session)
+        
+        relevant_pages = []
+        for (url, (content, document)), filtered_content in zip(changed.items(), filtered):
+            if filtered_content:
+                relevant_pages.append((url, content, document, filtered_content))
+            else:
+                remember(url, None)
+        pending = {asyncio.ensure_future(scrape_one(*page)) for page in relevant_pages}
+        
+        # Reused tabs, and tabs that failed to fetch or matched no category, are done already
+        relevant = {page[0] for page in relevant_pages}
+        results = {url: result for url, result in reused.items() if result}
+        finished = set()
+        if not cancelled():
+            for url in nav_links:
+                if url not in relevant:
+                    finished.add(url)
+                    report(url, 'done' if results.get(url) else 'skipped', results.get(url))
+        
+        # Structured tabs wait for one batched ESG prediction over the whole site
+        to_score = {}
+        try:
+            while pending and not cancelled():
+                done, pending = await asyncio.wait(pending, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url, result = task.result()
+                    finished.add(url)
+                    if result and 'cleaned_data' in result:
+                        to_score[url] = result
+                        # Publish the NLP and structuring results now; the ESG score follows with the batch
+                        report(url, 'scoring', result)
+                        continue
+                    # A failed structuring call is not stored, so the next run retries it
+                    report(url, 'done' if result else 'skipped', result)
+                    if result:
+                        results[url] = result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        if to_score:
+            esg_analyses = await run_model(
+                self.esg_scorer.calculate_esg_scores,
+                [result['cleaned_data'] for result in to_score.values()],
+                explain=explain
+            )
+            for (url, result), esg_analysis in zip(to_score.items(), esg_analyses):
+                result['ml_esg_analysis'] = esg_analysis
+                results[url] = result
+                report(url, 'done', result)
+                remember(url, result)
+        
+        if cancelled():
+            for url in nav_links:
+                if url not in finished:
+                    report(url, 'cancelled')
+        return results
+
+    def _analysis_fingerprint(self, *parts) -> str:
+        """Identifies an analysis by its inputs: page content and text, engines, categories"""
+        return AnalysisStore.fingerprint(ANALYSIS_VERSION, getattr(self.data_cleaner, 'cache_namespace', None),
+                                         self.categories, *parts)
+
+    async def _scrape_many(self, urls, max_concurrency, per_host_concurrency, structuring=None, explain=None):
+        """Scrape sites over one shared connection pool, yielding each site as it finishes"""
+        connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host_concurrency)
+        site_slots = asyncio.Semaphore(max_concurrency)
+        
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def scrape_one(url):
+                async with site_slots:
+                    try:
+                        results = await self._scrape_all_tabs(url, session=session, structuring=structuring,
+                                                              explain=explain)
+                        return {'base_url': url, 'relevant_content': results}
+                    except Exception as e:
+                        logging.error(f"Batch scraping error for {url}: {str(e)}")
+                        return {'base_url': url, 'error': str(e)}
             
-            tasks = [self._scrape_tab(session, url) for url in nav_links]
-            results = await asyncio.gather(*tasks)
-            return {url: result for url, result in zip(nav_links, results) if result}
+            tasks = [asyncio.ensure_future(scrape_one(url)) for url in urls]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def scrape_many(self, urls, max_concurrency=None, per_host_concurrency=None, structuring=None, explain=None):
+        """
+        Scrape many base URLs concurrently on a single event loop
+        
+        Args:
+            urls: Base URLs of the project sites
+            max_concurrency: Global cap on sites and connections in flight (BATCH_MAX_CONCURRENCY)
+            per_host_concurrency: Cap on connections per host (BATCH_PER_HOST_CONCURRENCY)
+            structuring: 'gemini' or 'local' structuring engine (CLEANER_ENGINE by default)
+            explain: Attach SHAP/LIME explanations to the ESG scores (ESG_EXPLAIN by default)
+            
+        Yields:
+            One {'base_url', 'relevant_content'} or {'base_url', 'error'} dict per site, in completion order
+        """
+        max_concurrency = max_concurrency or self.batch_max_concurrency
+        per_host_concurrency = per_host_concurrency or self.batch_per_host_concurrency
+        
+        loop = asyncio.new_event_loop()
+        results = self._scrape_many(list(dict.fromkeys(urls)), max_concurrency, per_host_concurrency, structuring,
+                                    explain)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
 
-    def scrape(self, url, use_tor=True):
+    def scrape_site(self, url, use_tor=True, progress_callback=None, cancel_event=None, structuring=None,
+                    explain=None):
+        """
+        Crawl the ESG-related tabs of a site and run the full analysis pipeline
+        
+        Args:
+            url: Base URL of the project site
+            use_tor: Whether to route traffic through Tor
+            progress_callback: Optional callable(tab_url, status, result) invoked per tab
+            cancel_event: Optional threading.Event; remaining tabs are abandoned once set
+            structuring: 'gemini' or 'local' structuring engine (CLEANER_ENGINE by default)
+            explain: Attach SHAP/LIME explanations to the ESG scores (ESG_EXPLAIN by default)
+        """
         try:
             session = self._get_tor_session() if use_tor else self.session
             
@@ -159,10 +433,8 @@ class CyberScraper:
                         'https': f'http://{proxy}'
                     }
             
-            results = asyncio.run(self._scrape_all_tabs(url))
-            
-            # Cleanup Selenium resources
-            self.advanced_scraper.cleanup()
+            results = asyncio.run(self._scrape_all_tabs(url, progress_callback, cancel_event,
+                                                        structuring=structuring, explain=explain))
             
             return {
                 'base_url': url,
@@ -194,44 +466,60 @@ class CyberScraper:
             
         return chrome_options
 
-    def _extract_text_content(self, element) -> str:
-        """Extract clean text content from HTML element"""
-        try:
-            return ' '.join(element.stripped_strings)
-        except Exception:
-            return ""
+    def _get_driver_pool(self, use_tor: bool) -> DriverPool:
+        """Tor-proxied drivers live in their own local pool; direct ones share the AdvancedScraper pool"""
+        if not use_tor:
+            return self.advanced_scraper.driver_pool
+        if self._tor_driver_pool is None:
+            self._tor_driver_pool = DriverPool(options_factory=lambda: self._setup_chrome_options(True))
+        return self._tor_driver_pool
+
+    def metrics(self) -> Dict[str, Any]:
+        """Runtime counters for the scraping pipeline"""
+        metrics = {
+            'rendering': self.advanced_scraper.render_detector.stats(),
+            'driver_pool': self.advanced_scraper.driver_pool.stats(),
+            'chain_metrics': self.esg_scorer.metrics.stats(),
+            'text_extraction': self.extraction_stats.stats(),
+            'fetch': self.fetcher.stats(),
+            'storage': self.advanced_scraper.storage_fetcher.stats(),
+            'graphql': self.advanced_scraper.graphql_client.stats()
+        }
+        if self.analysis_store is not None:
+            metrics['analysis_store'] = self.analysis_store.stats()
+        if getattr(self.content_analyzer, 'embedding_cache', None) is not None:
+            metrics['embedding_cache'] = self.content_analyzer.embedding_cache.stats()
+        if getattr(self.data_cleaner, 'cache', None) is not None:
+            metrics['cleaner_cache'] = self.data_cleaner.cache.stats()
+        if self._tor_driver_pool is not None:
+            metrics['tor_driver_pool'] = self._tor_driver_pool.stats()
+        return metrics
+
+    def close(self):
+        """Shut down pooled Chrome drivers"""
+        self.advanced_scraper.cleanup()
+        if self._tor_driver_pool is not None:
+            self._tor_driver_pool.close()
 
     def _parse_html_content(self, html: str) -> Dict[str, Any]:
         """Parse HTML and extract relevant content"""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
+            document = parse_document(html)
             content = {}
             
             # Extract title
-            if soup.title:
-                content['title'] = self._extract_text_content(soup.title)
+            if document.title:
+                content['title'] = document.title
                 
             # Extract main content
-            for tag in ['article', 'main', '[role="main"]']:
-                main_content = soup.select_one(tag)
-                if main_content:
-                    content['main_content'] = self._extract_text_content(main_content)
-                    break
+            if document.main_content:
+                content['main_content'] = document.main_content
                     
             # Extract paragraphs
-            paragraphs = []
-            for p in soup.find_all('p'):
-                text = self._extract_text_content(p)
-                if len(text) > 50:  # Filter out short paragraphs
-                    paragraphs.append(text)
-            content['paragraphs'] = paragraphs
-            
-            # Extract headings
-            headings = []
-            for h in soup.find_all(['h1', 'h2', 'h3']):
-                text = self._extract_text_content(h)
-                if text:
-                    headings.append(text)
+            content['paragraphs'] = [
+                text for text in document.paragraphs
+                if len(text) > 50  # Filter out short paragraphs
+            ]
             return content
             
         except Exception as e:
@@ -248,7 +536,24 @@ class CyberScraper:
         except Exception as e:
             logging.error(f"Tor identity rotation failed: {str(e)}")
 
-    @lru_cache(maxsize=100)
+    def _rendered_page_fingerprint(self, url: str, use_tor: bool) -> Optional[str]:
+        """
+        Fingerprint of the page's current static HTML, or None if it cannot be fetched or
+        the stored analysis cannot be trusted from it: a client-rendered page can change in
+        Chrome while its static HTML stays the same
+        """
+        if self.analysis_store is None:
+            return None
+        try:
+            session = self._get_tor_session() if use_tor else self.session
+            document = self.fetcher.fetch_document_sync(url, self._get_headers(), session)
+        except Exception as e:
+            logging.error(f"Revalidation of {url} failed: {e}")
+            return None
+        if document is None or self.advanced_scraper.render_detector.needs_js(url, document)[0]:
+            return None
+        return self._analysis_fingerprint('rendered', url, document.content_hash)
+
     def scrape(self, url: str, use_tor: bool = True) -> Optional[Dict[str, Any]]:
         """
         Scrape URL and analyze content for cybersecurity relevance
@@ -263,11 +568,15 @@ class CyberScraper:
         try:
             if use_tor:
                 self._get_new_tor_identity()
-                
-            options = self._setup_chrome_options(use_tor)
-            driver = webdriver.Chrome(options=options)
             
-            try:
+            # A conditional request tells whether the page changed since the last analysis
+            fingerprint = self._rendered_page_fingerprint(url, use_tor)
+            if fingerprint is not None:
+                stored = self.analysis_store.get(fingerprint)
+                if stored is not None:
+                    return stored
+                
+            with self._get_driver_pool(use_tor).driver() as driver:
                 driver.get(url)
                 WebDriverWait(driver, 10).until(
                     EC.presence_of_element_located((By.TAG_NAME, "body"))
@@ -278,18 +587,18 @@ class CyberScraper:
                 
                 # Get page content
                 html_content = driver.page_source
-                parsed_content = self._parse_html_content(html_content)
-                
-                # Analyze content
-                filtered_content = self.content_analyzer.filter_content(
-                    parsed_content, 
-                    self.categories
-                )
-                
-                return filtered_content
                 
-            finally:
-                driver.quit()
+            parsed_content = self._parse_html_content(html_content)
+            
+            # Analyze content
+            filtered_content = self.content_analyzer.filter_content(
+                parsed_content, 
+                self.categories
+            )
+            
+            if fingerprint is not None and filtered_content is not None:
+                self.analysis_store.put(fingerprint, filtered_content)
+            return filtered_content
                 
         except Exception as e:
             logging.error(f"Scraping failed: {str(e)}")
@@ -0,0 +1,63 @@
+import logging
+import os
+import sqlite3
+import threading
+
+
+def cache_path(env: str, filename: str) -> str:
+    """Path from the given env variable, else the file under $CACHE_DIR"""
+    return os.getenv(env, os.path.join(os.getenv('CACHE_DIR', 'cache'), filename))
+
+
+class SQLiteStore:
+    """Per-thread, per-process WAL connections and LRU eviction shared by the on-disk caches"""
+
+    table = ''
+
+    def __init__(self, path: str, max_entries: int = 0):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _wrote(self, rows: int = 1) -> None:
+        with self._lock:
+            self._writes_since_evict += rows
+            should_evict = self._writes_since_evict >= 256
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop least-recently-used rows until back under 90% of max_entries"""
+        try:
+            conn = self._connection()
+            total = conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+            if total <= self.max_entries:
+                return 0
+            removed = total - int(self.max_entries * 0.9)
+            with conn:
+                conn.execute(
+                    f'DELETE FROM {self.table} WHERE rowid IN '
+                    f'(SELECT rowid FROM {self.table} ORDER BY last_access LIMIT ?)', (removed,)
+                )
+            return removed
+        except sqlite3.Error as e:
+            logging.error(f"{self.table} eviction failed: {e}")
+            return 0
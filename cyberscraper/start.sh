@@ -1,3 +1,3 @@
 #!/bin/bash
 service tor start
-python api.py
+exec gunicorn -c gunicorn.conf.py api:app
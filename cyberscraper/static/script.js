@@ -1,6 +1,10 @@
+let currentJobId = null;
+let pollTimer = null;
+
 function startScraping() {
     const urlInput = document.getElementById('urlInput');
     const useTor = document.getElementById('useTor');
+    const structuring = document.getElementById('structuring');
     const loading = document.getElementById('loading');
     const results = document.getElementById('results');
 
@@ -12,23 +16,25 @@ function startScraping() {
     loading.classList.remove('hidden');
     results.innerHTML = '';
 
-    fetch('/scrape', {
+    fetch('/jobs', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({
             url: urlInput.value,
-            use_tor: useTor.checked
+            use_tor: useTor.checked,
+            structuring: structuring.value
         })
     })
     .then(response => response.json())
     .then(data => {
-        loading.classList.add('hidden');
         if (data.error) {
+            loading.classList.add('hidden');
             showError(data.error);
         } else {
-            displayResults(data);
+            currentJobId = data.job_id;
+            pollJob();
         }
     })
     .catch(error => {
@@ -38,6 +44,71 @@ function startScraping() {
     });
 }
 
+function pollJob() {
+    if (!currentJobId) {
+        return;
+    }
+
+    fetch(`/jobs/${currentJobId}`)
+    .then(response => response.json())
+    .then(job => {
+        const loading = document.getElementById('loading');
+        if (job.error && !job.status) {
+            loading.classList.add('hidden');
+            showError(job.error);
+            return;
+        }
+
+        showProgress(job.progress || {});
+        displayJobResults(job.results || {});
+
+        if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+            loading.classList.add('hidden');
+            currentJobId = null;
+            if (job.status === 'failed') {
+                showError(job.error || 'Scraping failed');
+            }
+        } else {
+            pollTimer = setTimeout(pollJob, 2000);
+        }
+    })
+    .catch(error => {
+        document.getElementById('loading').classList.add('hidden');
+        showError('An error occurred while polling the job');
+        console.error('Error:', error);
+    });
+}
+
+function cancelScraping() {
+    if (!currentJobId) {
+        return;
+    }
+
+    clearTimeout(pollTimer);
+    fetch(`/jobs/${currentJobId}`, { method: 'DELETE' })
+    .then(() => pollJob())
+    .catch(error => console.error('Error:', error));
+}
+
+function showProgress(progress) {
+    const status = document.getElementById('progress');
+    const tabs = Object.entries(progress);
+    const finished = tabs.filter(([, state]) => state !== 'pending').length;
+    status.textContent = tabs.length ? `${finished}/${tabs.length} tabs processed` : '';
+}
+
+function displayJobResults(tabResults) {
+    const results = document.getElementById('results');
+    let html = '';
+
+    for (const [tabUrl, content] of Object.entries(tabResults)) {
+        html += `<h2>${tabUrl}</h2>`;
+        html += renderResultItems(content);
+    }
+
+    results.innerHTML = html;
+}
+
 function showError(message) {
     const results = document.getElementById('results');
     results.innerHTML = `<div class="error">${message}</div>`;
@@ -45,6 +116,10 @@ function showError(message) {
 
 function displayResults(data) {
     const results = document.getElementById('results');
+    results.innerHTML = renderResultItems(data) || '<div class="error">No results found</div>';
+}
+
+function renderResultItems(data) {
     let html = '';
 
     for (const [key, value] of Object.entries(data)) {
@@ -60,5 +135,5 @@ function displayResults(data) {
         }
     }
 
-    results.innerHTML = html || '<div class="error">No results found</div>';
+    return html;
 }
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import aiohttp
+import ipfshttpclient
+
+from executors import run_io
+from sqlite_store import SQLiteStore, cache_path
+from streaming_fetch import StreamingFetcher, streaming_fetcher
+
+DEFAULT_IPFS_GATEWAYS = 'https://ipfs.io/ipfs/,https://dweb.link/ipfs/,https://cloudflare-ipfs.com/ipfs/'
+DEFAULT_ARWEAVE_GATEWAYS = 'https://arweave.net/,https://ar-io.net/'
+
+# CIDv0 (base58 Qm...) or CIDv1 in any multibase; Arweave transaction ids are 43 base64url chars
+_CID = re.compile(r'^[A-Za-z0-9]{20,100}$')
+_ARWEAVE_ID = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+
+def parse_storage_uri(uri: str) -> Optional[Tuple[str, str]]:
+    """
+    ('ipfs', 'cid/path') or ('ar', 'id') for an ipfs:// or ar:// link, or None if it does
+    not name immutable content. The result is also the cache key, so equivalent links
+    share one entry.
+    """
+    for scheme, kind in (('ipfs://', 'ipfs'), ('ar://', 'ar')):
+        if scheme not in uri:
+            continue
+        address = re.split(r'[?#]', uri.split(scheme, 1)[1], maxsplit=1)[0].strip('/')
+        if kind == 'ipfs' and address.startswith('ipfs/'):
+            address = address[len('ipfs/'):]
+        root, _, path = address.partition('/')
+        if kind == 'ipfs' and _CID.match(root):
+            segments = [quote(segment) for segment in path.split('/') if segment not in ('', '.', '..')]
+            return kind, '/'.join([root] + segments)
+        if kind == 'ar' and _ARWEAVE_ID.match(root):
+            return kind, root
+        return None
+    return None
+
+
+def _gateways(env: str, default: str) -> List[str]:
+    return [gateway.rstrip('/') + '/' for gateway in os.getenv(env, default).split(',') if gateway.strip()]
+
+
+class StorageCache(SQLiteStore):
+    """
+    Decoded storage documents keyed by content address. CIDs and Arweave ids name
+    immutable content, so entries never need revalidation and only leave by LRU eviction.
+    Documents rejected as binary are stored as empty text so they are not fetched again.
+    """
+
+    table = 'storage'
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        """
+        Args:
+            path: SQLite file (STORAGE_CACHE_PATH env, default $CACHE_DIR/storage.sqlite)
+            max_entries: Documents kept before LRU eviction (STORAGE_CACHE_MAX_ENTRIES env, default 10000)
+        """
+        super().__init__(path or cache_path('STORAGE_CACHE_PATH', 'storage.sqlite'),
+                         max_entries or int(os.getenv('STORAGE_CACHE_MAX_ENTRIES', 10000)))
+        self._stats = {'hits': 0, 'misses': 0}
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS storage (
+                    address TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS storage_last_access ON storage (last_access)')
+
+    def get(self, address: str) -> Optional[str]:
+        text = None
+        try:
+            conn = self._connection()
+            row = conn.execute('SELECT text FROM storage WHERE address = ?', (address,)).fetchone()
+            if row is not None:
+                text = row[0]
+                with conn:
+                    conn.execute('UPDATE storage SET last_access = ? WHERE address = ?', (time.time(), address))
+        except sqlite3.Error as e:
+            logging.error(f"Storage cache read failed: {e}")
+        with self._lock:
+            self._stats['hits' if text is not None else 'misses'] += 1
+        return text
+
+    def put(self, address: str, text: str) -> None:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO storage (address, text, last_access) VALUES (?, ?, ?)',
+                             (address, text, time.time()))
+        except sqlite3.Error as e:
+            logging.error(f"Storage cache write failed: {e}")
+            return
+        self._wrote()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats['entries'] = self._connection().execute('SELECT COUNT(*) FROM storage').fetchone()[0]
+        except sqlite3.Error:
+            stats['entries'] = None
+        return stats
+
+
+class _IPFSNode:
+    """
+    Persistent-session clients for the local IPFS node, one per I/O thread, so a link no
+    longer costs a new connection and version handshake. After a failure the node is
+    skipped for IPFS_NODE_RETRY seconds and gateways are used instead.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('IPFS_NODE', 'true').lower() == 'true'
+        self.addr = os.getenv('IPFS_API_ADDR')
+        self.retry_after = float(os.getenv('IPFS_NODE_RETRY', 60))
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and time.time() >= self._down_until
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None or self._local.pid != os.getpid():
+            kwargs = {'addr': self.addr} if self.addr else {}
+            client = ipfshttpclient.connect(session=True, **kwargs)
+            self._local.client = client
+            self._local.pid = os.getpid()
+        return client
+
+    def cat(self, path: str, max_bytes: int, timeout: float) -> bytes:
+        try:
+            return self._client().cat(path, length=max_bytes, timeout=timeout)
+        except Exception:
+            self._local.client = None
+            self._down_until = time.time() + self.retry_after
+            raise
+
+
+class StorageFetcher:
+    """
+    Concurrent, cached fetching of IPFS and Arweave documents.
+
+    Each distinct content address is fetched at most once. IPFS content is read from the
+    local node first, then from each HTTP gateway in turn. Every attempt has its own
+    timeout and goes through the StreamingFetcher byte and text caps. At most
+    STORAGE_MAX_CONCURRENCY fetches run at once per event loop, and decoded documents are
+    cached on disk by address.
+    """
+
+    def __init__(self, fetcher: StreamingFetcher = None, max_concurrency: int = None, timeout: float = None,
+                 ipfs_gateways: Sequence[str] = None, arweave_gateways: Sequence[str] = None):
+        """
+        Args:
+            fetcher: Applies the size caps and binary check (default: the shared streaming_fetcher)
+            max_concurrency: Fetches in flight at once (STORAGE_MAX_CONCURRENCY env, default 8)
+            timeout: Seconds per node or gateway attempt (STORAGE_FETCH_TIMEOUT env, default 20)
+            ipfs_gateways: Path gateways tried in order (IPFS_GATEWAYS env, comma-separated)
+            arweave_gateways: Arweave gateways tried in order (ARWEAVE_GATEWAYS env, comma-separated)
+        """
+        self.fetcher = fetcher or streaming_fetcher
+        self.max_concurrency = max_concurrency or int(os.getenv('STORAGE_MAX_CONCURRENCY', 8))
+        self.timeout = timeout or float(os.getenv('STORAGE_FETCH_TIMEOUT', 20))
+        self.max_documents = int(os.getenv('STORAGE_MAX_DOCUMENTS', 32))
+        self.gateways = {
+            'ipfs': list(ipfs_gateways) if ipfs_gateways else _gateways('IPFS_GATEWAYS', DEFAULT_IPFS_GATEWAYS),
+            'ar': list(arweave_gateways) if arweave_gateways else _gateways('ARWEAVE_GATEWAYS',
+                                                                          DEFAULT_ARWEAVE_GATEWAYS)
+        }
+        self.node = _IPFSNode()
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._cache = None
+
+    @property
+    def cache(self) -> Optional[StorageCache]:
+        """The on-disk document cache (STORAGE_CACHE env, default on), opened on first use"""
+        if self._cache is None and os.getenv('STORAGE_CACHE', 'true').lower() == 'true':
+            with self._lock:
+                if self._cache is None:
+                    self._cache = StorageCache()
+        return self._cache
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one loop; each loop gets its own limit
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _from_node(self, path: str) -> Optional[str]:
+        content = await asyncio.wait_for(
+            run_io(self.node.cat, unquote(path), self.fetcher.max_bytes, self.timeout), self.timeout
+        )
+        return self.fetcher.decode_bytes(f"ipfs://{path}", [content]) or ''
+
+    async def _fetch(self, session: aiohttp.ClientSession, kind: str, address: str) -> Optional[str]:
+        """Text of one address, '' if it is binary, or None if every source failed"""
+        if kind == 'ipfs' and self.node.available:
+            try:
+                text = await self._from_node(address)
+                self._count('node')
+                return text
+            except Exception as e:
+                logging.info(f"IPFS node unavailable for {address}, using gateways: {e}")
+        for gateway in self.gateways[kind]:
+            try:
+                text = await asyncio.wait_for(self.fetcher.fetch_text_async(session, gateway + address),
+                                              self.timeout)
+                self._count('gateway')
+                return text or ''
+            except Exception as e:
+                self._count('gateway_errors')
+                logging.info(f"Gateway {gateway} failed for {address}: {e}")
+        logging.error(f"Storage fetch error: no source returned {kind}://{address}")
+        self._count('failed')
+        return None
+
+    async def _fetch_address(self, session: aiohttp.ClientSession, kind: str, address: str) -> Optional[str]:
+        key = f"{kind}://{address}"
+        cache = self.cache
+        if cache is not None:
+            cached = await run_io(cache.get, key)
+            if cached is not None:
+                return cached
+        async with self._semaphore():
+            text = await self._fetch(session, kind, address)
+        if text is not None and cache is not None:
+            await run_io(cache.put, key, text)
+        return text
+
+    async def fetch_many(self, uris: Sequence[str], session: aiohttp.ClientSession = None) -> List[Optional[str]]:
+        """
+        Text of each ipfs:// or ar:// link, aligned with uris; None (or '' for binary
+        content) where nothing usable was fetched. Pass the caller's session so gateway
+        requests reuse its connection pool; without one a session is opened for this call.
+        """
+        addresses = [parse_storage_uri(uri) for uri in uris]
+        distinct = list(dict.fromkeys(address for address in addresses if address is not None))
+        if not distinct:
+            return [None] * len(uris)
+        own_session = session is None
+        if own_session:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency))
+        try:
+            texts = await asyncio.gather(*[self._fetch_address(session, kind, address) for kind, address in distinct])
+        finally:
+            if own_session:
+                await session.close()
+        fetched = dict(zip(distinct, texts))
+        return [fetched.get(address) if address is not None else None for address in addresses]
+
+    def fetch(self, uri: str) -> Optional[str]:
+        """Blocking single-document fetch, for callers outside an event loop"""
+        return asyncio.run(self.fetch_many([uri]))[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update(max_concurrency=self.max_concurrency, node_available=self.node.available)
+        if self._cache is not None:
+            stats['cache'] = self._cache.stats()
+        return stats
+
+
+# Shared so concurrent scrapes respect one concurrency limit and /metrics sees every fetch
+storage_fetcher = StorageFetcher()
@@ -0,0 +1,331 @@
+import codecs
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+import aiohttp
+import requests
+
+from executors import run_io, run_parse
+from html_document import IncrementalDocumentParser, ParsedDocument
+from http_cache import CachedResponse, HTTPCache
+
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+TEXT_TYPES = HTML_TYPES + ('text/', 'application/json', 'application/xml', 'application/ld+json')
+
+# Leading bytes of formats that are never worth decoding as text
+BINARY_SIGNATURES = (b'%PDF', b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'PK\x03\x04', b'\x1f\x8b', b'RIFF', b'\x00\x00\x01\x00')
+
+BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Bytes to look at before choosing a charset
+SNIFF_BYTES = 2048
+
+
+def _valid_charset(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def sniff_charset(content_type: str, head: bytes) -> str:
+    """Charset from the BOM, then the Content-Type header, then a <meta> tag, else UTF-8"""
+    for bom, name in BOMS:
+        if head.startswith(bom):
+            return name
+    header = _HEADER_CHARSET.search(content_type or '')
+    charset = _valid_charset(header.group(1)) if header else None
+    if charset:
+        return charset
+    meta = _META_CHARSET.search(head[:SNIFF_BYTES])
+    charset = _valid_charset(meta.group(1).decode('ascii', 'ignore')) if meta else None
+    return charset or 'utf-8'
+
+
+def looks_binary(head: bytes) -> bool:
+    return head.startswith(BINARY_SIGNATURES) or b'\x00' in head[:1024]
+
+
+def _media_type(content_type: str) -> str:
+    return (content_type or '').split(';', 1)[0].strip().lower()
+
+
+class _Stream:
+    """Decodes one response chunk by chunk and decides when to stop reading"""
+
+    def __init__(self, fetcher: 'StreamingFetcher', url: str, content_type: str, html: bool,
+                 keep_body: bool = False):
+        self.fetcher = fetcher
+        self.url = url
+        self.content_type = content_type
+        self.html = html
+        self.body = [] if keep_body else None
+        self.hasher = hashlib.sha256()
+        self.bytes_read = 0
+        self.stop_reason = None
+        self.rejected = False
+        self._head = b''
+        self._decoder = None
+        self._parser = IncrementalDocumentParser(url) if html else None
+        self._text = []
+        self._chars = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume a chunk; returns False once reading should stop"""
+        self.bytes_read += len(chunk)
+        self.hasher.update(chunk)
+        if self.body is not None:
+            self.body.append(chunk)
+        if self._decoder is None:
+            # Hold the first bytes back until there is enough to sniff type and charset
+            self._head += chunk
+            if len(self._head) < SNIFF_BYTES:
+                return True
+            chunk, self._head = self._head, b''
+            if not self._start(chunk):
+                return False
+        self._consume(self._decoder.decode(chunk))
+        return self._keep_reading()
+
+    def _start(self, head: bytes) -> bool:
+        if looks_binary(head):
+            self.rejected = True
+            self.stop_reason = 'binary'
+            return False
+        charset = sniff_charset(self.content_type, head)
+        self._decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        return True
+
+    def _consume(self, text: str) -> None:
+        if not text:
+            return
+        if self._parser is not None:
+            self._chars = self._parser.feed(text)
+        else:
+            self._text.append(text)
+            self._chars += len(text)
+
+    def _keep_reading(self) -> bool:
+        if self._chars >= self.fetcher.max_text_chars:
+            self.stop_reason = 'text_limit'
+        elif self.bytes_read >= self.fetcher.max_bytes:
+            self.stop_reason = 'byte_limit'
+        return self.stop_reason is None
+
+    def finish(self):
+        """The parsed document (HTML) or decoded text, or None if the body was rejected"""
+        if self._decoder is None and not self.rejected:
+            if not self._start(self._head):
+                return None
+            self._consume(self._decoder.decode(self._head))
+        if self.rejected:
+            return None
+        self._consume(self._decoder.decode(b'', final=True))
+        if self._parser is not None:
+            document = self._parser.close()
+            document.content_hash = self.hasher.hexdigest()
+            return document
+        return ''.join(self._text)[:self.fetcher.max_text_chars]
+
+
+class StreamingFetcher:
+    """
+    Size- and type-bounded fetching for pages and decentralized storage.
+
+    Bodies are read in chunks and never held in memory past FETCH_MAX_BYTES. Responses
+    whose Content-Type (or leading bytes) show a PDF, image, archive or other binary
+    format are dropped before the body is read. The charset comes from the BOM, header or
+    <meta> tag. HTML is fed to an incremental parser as it arrives, and reading stops once
+    FETCH_MAX_TEXT_CHARS of visible text has been extracted.
+    """
+
+    def __init__(self, max_bytes: int = None, max_text_chars: int = None, chunk_size: int = None,
+                 timeout: float = None):
+        self.max_bytes = max_bytes or int(os.getenv('FETCH_MAX_BYTES', 10 * 1024 * 1024))
+        self.max_text_chars = max_text_chars or int(os.getenv('FETCH_MAX_TEXT_CHARS', 500000))
+        self.chunk_size = chunk_size or int(os.getenv('FETCH_CHUNK_SIZE', 64 * 1024))
+        self.timeout = timeout or float(os.getenv('FETCH_TIMEOUT', 30))
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._cache = None
+
+    def _record(self, stream: Optional[_Stream] = None, outcome: str = None) -> None:
+        with self._lock:
+            self._counts['responses'] += 1
+            if outcome:
+                self._counts[outcome] += 1
+            if stream is not None:
+                self._counts['bytes_read'] += stream.bytes_read
+                if stream.stop_reason:
+                    self._counts[stream.stop_reason] += 1
+
+    def _accepts(self, url: str, content_type: str, html: bool) -> bool:
+        media_type = _media_type(content_type)
+        allowed = HTML_TYPES if html else TEXT_TYPES
+        if media_type and not media_type.startswith(allowed):
+            logging.info(f"Skipping {url}: content type {media_type}")
+            self._record(outcome='content_type')
+            return False
+        return True
+
+    @property
+    def cache(self) -> Optional[HTTPCache]:
+        """The on-disk HTTP cache (HTTP_CACHE env, default on), opened on first use"""
+        if self._cache is None and os.getenv('HTTP_CACHE', 'true').lower() == 'true':
+            with self._lock:
+                if self._cache is None:
+                    self._cache = HTTPCache()
+        return self._cache
+
+    def _cached(self, url: str) -> Optional[CachedResponse]:
+        try:
+            return self.cache.lookup(url) if self.cache is not None else None
+        except Exception as e:
+            logging.error(f"HTTP cache unavailable: {e}")
+            return None
+
+    def _replay(self, entry: CachedResponse) -> Optional[ParsedDocument]:
+        """Parse a cached body exactly as if it had just been downloaded"""
+        stream = _Stream(self, entry.url, entry.content_type, html=True)
+        view = memoryview(entry.body)
+        for start in range(0, len(view), self.chunk_size):
+            if not stream.feed(bytes(view[start:start + self.chunk_size])):
+                break
+        self._record(outcome='cached')
+        return stream.finish()
+
+    def _store(self, stream: _Stream, status: int, headers, entry: Optional[CachedResponse],
+               document: Optional[ParsedDocument]) -> None:
+        # A body cut off at a size limit is not the page, so it is never replayed as one
+        if document is not None and status == 200 and stream.stop_reason is None and self.cache is not None:
+            self.cache.store(stream.url, headers, b''.join(stream.body), document.content_hash, entry)
+
+    def _finish_document(self, stream: _Stream, status: int, headers, entry: Optional[CachedResponse]):
+        document = stream.finish()
+        self._record(stream)
+        self._store(stream, status, headers, entry, document)
+        return document
+
+    async def fetch_document(self, session: aiohttp.ClientSession, url: str,
+                             headers: Dict[str, str] = None) -> Optional[ParsedDocument]:
+        """
+        Stream an HTML page into a ParsedDocument, or None if it is not HTML.
+
+        A fresh cached copy is used without a request; a stale one is revalidated with a
+        conditional request and reused on 304. Chunks are fed to the incremental parser on
+        the loop as they arrive (one chunk is cheap, and the socket keeps being read). Whole
+        body parses run on the parse threads and cache reads and writes on the I/O threads.
+        """
+        entry = await run_io(self._cached, url)
+        if entry is not None and entry.fresh:
+            return await run_parse(self._replay, entry)
+        if entry is not None:
+            headers = {**(headers or {}), **entry.conditional_headers()}
+
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            if response.status == 304 and entry is not None:
+                await run_io(self.cache.revalidated, url, response.headers)
+                return await run_parse(self._replay, entry)
+            if not self._accepts(url, response.headers.get('Content-Type', ''), True):
+                response.close()
+                return None
+            stream = _Stream(self, url, response.headers.get('Content-Type', ''), html=True,
+                             keep_body=self.cache is not None)
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                if not stream.feed(chunk):
+                    # Drop the connection rather than draining the rest of the body
+                    response.close()
+                    break
+        document = await run_parse(stream.finish)
+        self._record(stream)
+        await run_io(self._store, stream, response.status, response.headers, entry, document)
+        return document
+
+    def fetch_document_sync(self, url: str, headers: Dict[str, str] = None,
+                            session: requests.Session = None) -> Optional[ParsedDocument]:
+        """Blocking variant of fetch_document over a requests session (e.g. one routed through Tor)"""
+        entry = self._cached(url)
+        if entry is not None and entry.fresh:
+            return self._replay(entry)
+        if entry is not None:
+            headers = {**(headers or {}), **entry.conditional_headers()}
+
+        with (session or requests).get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304 and entry is not None:
+                self.cache.revalidated(url, response.headers)
+                return self._replay(entry)
+            if not self._accepts(url, response.headers.get('Content-Type', ''), True):
+                return None
+            stream = _Stream(self, url, response.headers.get('Content-Type', ''), html=True,
+                             keep_body=self.cache is not None)
+            for chunk in response.iter_content(self.chunk_size):
+                if not stream.feed(chunk):
+                    break
+        return self._finish_document(stream, response.status_code, response.headers, entry)
+
+    def fetch_text(self, url: str, headers: Dict[str, str] = None) -> Optional[str]:
+        """Blocking capped fetch of a text resource (storage gateways), or None if binary"""
+        with requests.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if not self._accepts(url, response.headers.get('Content-Type', ''), False):
+                return None
+            stream = _Stream(self, url, response.headers.get('Content-Type', ''), html=False)
+            for chunk in response.iter_content(self.chunk_size):
+                if not stream.feed(chunk):
+                    break
+        result = stream.finish()
+        self._record(stream)
+        return result
+
+    async def fetch_text_async(self, session: aiohttp.ClientSession, url: str,
+                               headers: Dict[str, str] = None) -> Optional[str]:
+        """
+        Capped fetch of a text resource, or None if it is binary. HTTP errors raise
+        aiohttp.ClientResponseError so callers can try another gateway.
+        """
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            response.raise_for_status()
+            if not self._accepts(url, response.headers.get('Content-Type', ''), False):
+                response.close()
+                return None
+            stream = _Stream(self, url, response.headers.get('Content-Type', ''), html=False)
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                if not stream.feed(chunk):
+                    response.close()
+                    break
+        result = stream.finish()
+        self._record(stream)
+        return result
+
+    def decode_bytes(self, url: str, content: Iterable[bytes], content_type: str = '') -> Optional[str]:
+        """Apply the same binary check, charset sniffing and caps to bytes from a client library"""
+        stream = _Stream(self, url, content_type, html=False)
+        for chunk in content:
+            if not stream.feed(chunk):
+                break
+        result = stream.finish()
+        self._record(stream)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update(max_bytes=self.max_bytes, max_text_chars=self.max_text_chars)
+        if self._cache is not None:
+            stats['http_cache'] = self._cache.stats()
+        return stats
+
+
+# Shared so /metrics sees page and storage fetches together
+streaming_fetcher = StreamingFetcher()
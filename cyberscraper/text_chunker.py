@@ -0,0 +1,192 @@
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+AGGREGATIONS = ('max', 'mean', 'attention')
+
+_WORD_PATTERN = re.compile(r'\S+')
+
+
+def _token_offsets(tokenizer, block: str) -> Tuple[List[Sequence[int]], Optional[List[int]]]:
+    """
+    Character offsets of each token in block, and the token ids when a tokenizer is
+    given; whitespace words (and no ids) otherwise.
+    """
+    if tokenizer is not None:
+        try:
+            encoding = tokenizer(block, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+            kept = [(span, token) for span, token in zip(encoding['offset_mapping'], encoding['input_ids'])
+                    if span[1] > span[0]]
+            return [span for span, _ in kept], [token for _, token in kept]
+        except NotImplementedError:
+            # Slow (pure Python) tokenizers have no offset mapping
+            pass
+    return [match.span() for match in _WORD_PATTERN.finditer(block)], None
+
+
+def iter_blocks(text: str, block_chars: int, sentences: bool = False) -> Iterator[str]:
+    """
+    Split text into blocks of at most block_chars characters, breaking at whitespace.
+
+    With sentences=True a block ends at the last sentence boundary in its second half,
+    when there is one, so sentences are not split between blocks.
+    """
+    pos = 0
+    while pos < len(text):
+        end = min(len(text), pos + block_chars)
+        if end < len(text):
+            boundary = -1
+            if sentences:
+                half = pos + block_chars // 2
+                boundary = max(text.rfind(mark, half, end) for mark in ('. ', '! ', '? '))
+            if boundary > pos:
+                end = boundary + 1
+            else:
+                space = text.rfind(' ', pos, end)
+                if space > pos:
+                    end = space
+        yield text[pos:end]
+        pos = end
+
+
+def iter_windows(text: str, tokenizer=None, window_tokens: int = 128, overlap_tokens: int = 32,
+                 max_windows: Optional[int] = None, block_chars: int = None) -> Iterator[str]:
+    """Yield overlapping windows of at most window_tokens tokens covering the whole text"""
+    for window, _ in iter_token_windows(text, tokenizer, window_tokens, overlap_tokens, max_windows, block_chars):
+        yield window
+
+
+def iter_token_windows(text: str, tokenizer=None, window_tokens: int = 128, overlap_tokens: int = 32,
+                       max_windows: Optional[int] = None,
+                       block_chars: int = None) -> Iterator[Tuple[str, Optional[List[int]]]]:
+    """
+    Yield overlapping windows of at most window_tokens tokens covering the whole text,
+    each with its token ids (None without a fast tokenizer), so the windows never need
+    to be tokenized a second time.
+
+    The text is tokenized one block of block_chars characters at a time, so token lists
+    stay small no matter how large the document is. Windows that straddle a block edge
+    are carried into the next block.
+
+    Args:
+        text: Document text
+        tokenizer: HuggingFace fast tokenizer (offset mapping support); whitespace words if None
+        window_tokens: Tokens per window, excluding special tokens
+        overlap_tokens: Tokens shared by consecutive windows
+        max_windows: Stop after this many windows (CHUNK_MAX_WINDOWS env, default 256)
+        block_chars: Characters tokenized at once (CHUNK_BLOCK_CHARS env, default 20000)
+    """
+    max_windows = max_windows or int(os.getenv('CHUNK_MAX_WINDOWS', 256))
+    block_chars = block_chars or int(os.getenv('CHUNK_BLOCK_CHARS', 20000))
+    step = max(1, window_tokens - overlap_tokens)
+    emitted = 0
+    pos = 0
+
+    while pos < len(text) and emitted < max_windows:
+        end = min(len(text), pos + block_chars)
+        if end < len(text):
+            # Don't cut a word in half at the block edge
+            space = text.rfind(' ', pos, end)
+            if space > pos:
+                end = space
+        block = text[pos:end]
+        is_last_block = end >= len(text)
+
+        offsets, ids = _token_offsets(tokenizer, block)
+        if not offsets:
+            pos = end
+            continue
+
+        start = 0
+        carry_from = None
+        while start < len(offsets) and emitted < max_windows:
+            stop = min(start + window_tokens, len(offsets))
+            if stop == len(offsets) and not is_last_block and start > 0:
+                # Incomplete window at the block edge: finish it in the next block
+                carry_from = offsets[start][0]
+                break
+            yield block[offsets[start][0]:offsets[stop - 1][1]], ids[start:stop] if ids is not None else None
+            emitted += 1
+            if stop == len(offsets):
+                break
+            start += step
+
+        pos = pos + carry_from if carry_from is not None else end
+
+
+class WindowAggregator:
+    """
+    Streaming aggregation of per-window class scores into document scores.
+
+    'max' and 'mean' are element-wise over windows. 'attention' weights each window by a
+    softmax over its top class score, so confident windows dominate while nav-bar style
+    noise is discounted. Only running sums are kept, so memory does not grow with the
+    number of windows.
+    """
+
+    def __init__(self, labels: Sequence[str], temperature: float = None):
+        self.labels = list(labels)
+        self.temperature = temperature or float(os.getenv('CHUNK_ATTENTION_TEMPERATURE', 0.1))
+        self.count = 0
+        self._max = np.full(len(self.labels), -np.inf)
+        self._sum = np.zeros(len(self.labels))
+        self._logit_max = -np.inf
+        self._weight_sum = 0.0
+        self._weighted = np.zeros(len(self.labels))
+
+    def update(self, scores: np.ndarray) -> None:
+        """Add a (n_windows, n_labels) block of window scores"""
+        scores = np.atleast_2d(np.asarray(scores, dtype=np.float64))
+        if scores.size == 0:
+            return
+        self.count += scores.shape[0]
+        self._max = np.maximum(self._max, scores.max(axis=0))
+        self._sum += scores.sum(axis=0)
+
+        # Running log-sum-exp keeps the softmax weights numerically stable
+        logits = scores.max(axis=1) / self.temperature
+        new_max = max(self._logit_max, logits.max())
+        rescale = np.exp(self._logit_max - new_max) if np.isfinite(self._logit_max) else 0.0
+        weights = np.exp(logits - new_max)
+        self._weight_sum = self._weight_sum * rescale + weights.sum()
+        self._weighted = self._weighted * rescale + weights @ scores
+        self._logit_max = new_max
+
+    def merge(self, other: 'WindowAggregator') -> None:
+        """Fold another aggregator over the same labels into this one"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update({key: (value.copy() if isinstance(value, np.ndarray) else value)
+                                  for key, value in other.__dict__.items()})
+            return
+        self.count += other.count
+        self._max = np.maximum(self._max, other._max)
+        self._sum += other._sum
+        new_max = max(self._logit_max, other._logit_max)
+        own, theirs = np.exp(self._logit_max - new_max), np.exp(other._logit_max - new_max)
+        self._weight_sum = self._weight_sum * own + other._weight_sum * theirs
+        self._weighted = self._weighted * own + other._weighted * theirs
+        self._logit_max = new_max
+
+    def vector(self, method: str = 'max') -> np.ndarray:
+        if self.count == 0:
+            return np.zeros(len(self.labels))
+        if method == 'max':
+            return self._max
+        if method == 'mean':
+            return self._sum / self.count
+        if method == 'attention':
+            return self._weighted / self._weight_sum
+        raise ValueError(f"Unknown aggregation: {method}")
+
+    def result(self) -> Dict[str, Any]:
+        """All aggregations as {method: {label: score}}, plus the window count"""
+        result = {
+            method: {label: float(score) for label, score in zip(self.labels, self.vector(method))}
+            for method in AGGREGATIONS
+        }
+        result['windows'] = self.count
+        return result
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+
+def block_fingerprint(block: str) -> bytes:
+    return hashlib.blake2b(' '.join(block.lower().split()).encode('utf-8'), digest_size=8).digest()
+
+
+def remove_boilerplate(pages: Dict[str, List[str]], min_share: float = None, min_pages: int = None,
+                       content_hashes: Dict[str, str] = None) -> Tuple[Dict[str, List[str]], Dict[str, int]]:
+    """
+    Drop blocks that repeat across the tabs of one site (navigation, headers, footers,
+    cookie banners) before any model sees them.
+
+    Args:
+        pages: Text blocks per tab URL
+        min_share: Fraction of tabs a block must appear on to count as boilerplate
+            (BOILERPLATE_MIN_SHARE env, default 0.5)
+        min_pages: Minimum number of tabs a block must appear on (BOILERPLATE_MIN_PAGES env, default 2)
+        content_hashes: Document hash per tab URL; tabs with the same hash (one page under
+            several URLs) count as a single tab toward the thresholds
+
+    Returns:
+        The remaining blocks per tab, and byte counts before and after
+    """
+    min_share = min_share if min_share is not None else float(os.getenv('BOILERPLATE_MIN_SHARE', 0.5))
+    min_pages = min_pages or int(os.getenv('BOILERPLATE_MIN_PAGES', 2))
+    # One URL per distinct document, so a duplicated page cannot make its own text boilerplate
+    distinct = {}
+    for url in pages:
+        distinct.setdefault((content_hashes or {}).get(url) or url, url)
+    threshold = max(min_pages, int(len(distinct) * min_share + 0.999999))
+
+    fingerprints = {url: [block_fingerprint(block) for block in blocks] for url, blocks in pages.items()}
+    page_counts = Counter(fp for url in distinct.values() for fp in set(fingerprints[url]))
+    boilerplate = {fp for fp, count in page_counts.items() if count >= threshold}
+
+    kept = {
+        url: [block for block, fp in zip(blocks, fingerprints[url]) if fp not in boilerplate]
+        for url, blocks in pages.items()
+    }
+    stats = {
+        'pages': len(pages),
+        'boilerplate_blocks': len(boilerplate),
+        'bytes_before': sum(len(block.encode('utf-8')) for blocks in pages.values() for block in blocks),
+        'bytes_after': sum(len(block.encode('utf-8')) for blocks in kept.values() for block in blocks)
+    }
+    stats['bytes_saved'] = stats['bytes_before'] - stats['bytes_after']
+    return kept, stats
+
+
+class ExtractionStats:
+    """Running totals of text removed before analysis, for the /metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = Counter()
+
+    def record(self, stats: Dict[str, int]) -> None:
+        with self._lock:
+            self._totals['sites'] += 1
+            self._totals.update(stats)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = dict(self._totals)
+        before = totals.get('bytes_before', 0)
+        totals['saved_ratio'] = round(totals.get('bytes_saved', 0) / before, 4) if before else 0.0
+        return totals